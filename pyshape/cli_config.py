@@ -1,51 +1,96 @@
 #Last modified by @recannon 10/01/2026
 
+import functools
 import logging
 import sys
-from rich.console import Console
-from rich.logging import RichHandler
-from rich.theme import Theme
+
+#Library code only logs to the 'pyshape' logger, which has a NullHandler, so importing pyshape
+#never configures logging or loads Rich. Command line tools call setup_cli (through @cli_main)
+#to get Rich output on the console
 
 #===Clean exit functions===
 def error_exit(message):
     logger.error(message)
+    if not _cli_ready:
+        #Nothing is shown by the logger in library mode, so pass the message on
+        sys.exit(f'Error: {message}')
     sys.exit(1)
-    
+
 def safe_exit(message=None):
     if message:
         logger.info(message)
     sys.exit(0)
 
 #===Consistent logger and console===
-custom_theme = Theme({
-    "logging.level.info": "cyan",
-    "logging.level.warning": "yellow",
-    "logging.level.error": "bold red",
-})
-console = Console(theme=custom_theme)
-
-logging.basicConfig(
-    level="INFO",#DON'T CHANGE THIS, CHANGE BELOW
-    format="| %(message)s",
-    datefmt="[%X]",
-    handlers=[RichHandler(console=console,
-                          show_time=False,show_path=False,
-                          markup=True,rich_tracebacks=True)]
-)
-
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-logging.getLogger("requests").setLevel(logging.WARNING)
-
-#Matplotlib spam
-logging.getLogger("matplotlib").setLevel(logging.WARNING)
-logging.getLogger("matplotlib.font_manager").setLevel(logging.WARNING)
-logging.getLogger('matplotlib.backends.backend_pdf').setLevel(logging.WARNING)
-logging.getLogger('matplotlib').setLevel(logging.INFO)
-
-#Annoying things on import
-logging.getLogger("pooch").setLevel(logging.WARNING)
-logging.getLogger("numcodecs").setLevel(logging.WARNING)
-logging.getLogger("zarr").setLevel(logging.WARNING)
-logging.getLogger("dask").setLevel(logging.WARNING)
 logger = logging.getLogger('pyshape')
 logger.setLevel(logging.INFO)
+logger.addHandler(logging.NullHandler())
+
+_console = None
+_cli_ready = False
+
+def get_console():
+    '''Rich console shared by logging and progress bars. Created on first use'''
+    global _console
+    if _console is None:
+        from rich.console import Console
+        from rich.theme import Theme
+        custom_theme = Theme({
+            "logging.level.info": "cyan",
+            "logging.level.warning": "yellow",
+            "logging.level.error": "bold red",
+        })
+        _console = Console(theme=custom_theme)
+    return _console
+
+def __getattr__(name):
+    #cli_config.console is created when first accessed
+    if name == 'console':
+        return get_console()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def setup_cli():
+    '''Sends logging to the Rich console. Only the first call does anything'''
+    global _cli_ready
+    if _cli_ready:
+        return
+    _cli_ready = True
+
+    from rich.logging import RichHandler
+    logging.basicConfig(
+        level="INFO",#DON'T CHANGE THIS, CHANGE BELOW
+        format="| %(message)s",
+        datefmt="[%X]",
+        handlers=[RichHandler(console=get_console(),
+                              show_time=False,show_path=False,
+                              markup=True,rich_tracebacks=True)]
+    )
+
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("requests").setLevel(logging.WARNING)
+
+    #Matplotlib spam
+    logging.getLogger("matplotlib").setLevel(logging.WARNING)
+    logging.getLogger("matplotlib.font_manager").setLevel(logging.WARNING)
+    logging.getLogger('matplotlib.backends.backend_pdf').setLevel(logging.WARNING)
+    logging.getLogger('matplotlib').setLevel(logging.INFO)
+
+    #Annoying things on import
+    logging.getLogger("pooch").setLevel(logging.WARNING)
+    logging.getLogger("numcodecs").setLevel(logging.WARNING)
+    logging.getLogger("zarr").setLevel(logging.WARNING)
+    logging.getLogger("dask").setLevel(logging.WARNING)
+
+def cli_main(func):
+    '''Decorator for the main() of command line tools. Sets up console logging first, and exits cleanly on library errors'''
+    from .errors import AbortError, PyshapeError
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        setup_cli()
+        try:
+            return func(*args, **kwargs)
+        except AbortError as e:
+            safe_exit(str(e))
+        except PyshapeError as e:
+            error_exit(str(e))
+    return wrapper
@@ -0,0 +1,28 @@
+#Last modified 19/10/2026
+
+#Exceptions raised by the library layer. Command line tools turn these into a clean exit
+#(see cli_config.cli_main), while batch code can catch them per file and carry on
+
+class PyshapeError(Exception):
+    '''Base class for all pyshape errors'''
+
+class ParseError(PyshapeError, ValueError):
+    '''A SHAPE file could not be understood'''
+
+class MissingBlockError(ParseError):
+    '''A required block or line is missing from a SHAPE file'''
+
+class MissingFileError(PyshapeError, FileNotFoundError):
+    '''A required file or directory does not exist'''
+
+class InputError(PyshapeError, ValueError):
+    '''An argument has the wrong type or value'''
+
+class ShapeRunError(PyshapeError, RuntimeError):
+    '''A SHAPE action did not finish successfully'''
+
+class SchedulerError(PyshapeError, RuntimeError):
+    '''A SLURM command failed'''
+
+class AbortError(PyshapeError):
+    '''The user chose not to go ahead. Command line tools exit without an error'''
@@ -3,6 +3,10 @@
 from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
 from .utils import time_astropy2shape
+from .plotting.figure_cache import figure_key
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import re
 import subprocess
 from .cli_config import logger
 
@@ -29,15 +33,46 @@ template_env.globals.update(
 )
 
 #===Making pdf with tex===
+#Figure files named in braces in the rendered tex, e.g. \includegraphics{fig.pdf}
+FIGURE_REF = re.compile(r'\{\s*([^{}#\s][^{}#]*?\.(?:pdf|png|jpe?g|eps))\s*\}')
+
+@dataclass
+class PdfBuild:
+    '''Arguments to render_and_compile_pdf, for building several pdfs at once'''
+    template_name: str
+    render_kwargs: dict
+    out_stem: str
+    work_dir: Path
+    dest_dir: Path
+    depends: list = field(default_factory=list)
+
 def render_and_compile_pdf(template_name: str, render_kwargs: dict,
-                             out_stem: str, work_dir: Path, dest_dir: Path) -> Path:
+                             out_stem: str, work_dir: Path, dest_dir: Path,
+                             depends=(), incremental=True) -> Path:
     
-    '''Render a Jinja template, compile with pdflatex, and move the result.'''
+    '''
+    Render a Jinja template, compile with pdflatex, and move the result.
+    With incremental, compilation is skipped if the rendered tex and the figures it uses
+    are unchanged since the last build and the pdf is still in dest_dir.
+    Figures are found from the tex, plus any files in depends (e.g. figures named through macros)
+    '''
     
+    work_dir, dest_dir = Path(work_dir), Path(dest_dir)
+    destination = dest_dir / f'{out_stem}.pdf'
+
     #Compiles latex template
     template = template_env.get_template(template_name)
+    tex = template.render(**render_kwargs)
+    build_key = _build_key(tex, work_dir, depends)
+    stamp_file = work_dir / f'.{out_stem}.build'
+    if incremental and destination.exists() and stamp_file.exists() \
+            and stamp_file.read_text() == build_key:
+        logger.info(f'{destination} is up to date')
+        return destination
+
     tex_file = work_dir / f'{out_stem}.tex'
-    tex_file.write_text(template.render(**render_kwargs))
+    tex_file.write_text(tex)
+    stamp_file.unlink(missing_ok=True)
     
     #Runs pdflatex in shell
     subprocess.run(["pdflatex", tex_file.name],
@@ -46,8 +81,26 @@ def render_and_compile_pdf(template_name: str, render_kwargs: dict,
 
     #Moves created pdf to dest_dir
     out_pdf = work_dir / f'{out_stem}.pdf'
-    destination = dest_dir / out_pdf.name
     out_pdf.replace(destination)
+    stamp_file.write_text(build_key)
     logger.info(f'Moved final pdf to {destination}')  # also fixes the logging bug
     
-    return destination
\ No newline at end of file
+    return destination
+
+def render_and_compile_pdfs(builds: list[PdfBuild], jobs=None, incremental=True) -> list[Path]:
+    '''
+    Builds independent pdfs concurrently, returning their destinations in order.
+    pdflatex runs as a subprocess, so threads are enough. Builds sharing a work_dir need different out_stems
+    '''
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(render_and_compile_pdf, b.template_name, b.render_kwargs,
+                               b.out_stem, b.work_dir, b.dest_dir, b.depends, incremental)
+                   for b in builds]
+        return [f.result() for f in futures]
+
+def _build_key(tex, work_dir, depends):
+    '''Hash of the tex source and the name and contents of each figure it uses'''
+    figures = {(work_dir / ref).resolve() for ref in FIGURE_REF.findall(tex)}
+    figures.update(Path(d).resolve() for d in depends)
+    #Missing figures are left for pdflatex to report
+    return figure_key(tex, [(str(f), f) for f in sorted(figures) if f.exists()])
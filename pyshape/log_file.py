@@ -1,4 +1,37 @@
-#Last modified by @recannon 04/03/2026
+#Last modified 19/10/2026
+
+#Appended to the log of a fit that finished, by launch_fitting.sbatch and scan.local (used by scan.cost)
+RUNTIME_TAG = '# pyshape runtime'
+
+def runtime_line(seconds, cores) -> str:
+    return f'{RUNTIME_TAG} {seconds:.0f} s on {cores} cores\n'
+
+def read_runtime(fname) -> tuple[float, int] | None:
+    '''(wall seconds, cores) of a fit from the runtime line at the end of its log, or None if it has none'''
+    try:
+        with open(fname, 'rb') as f:
+            f.seek(0, 2)
+            f.seek(max(f.tell() - 256, 0))
+            tail = f.read().decode(errors='replace')
+    except OSError:
+        return None
+    lines = [line for line in tail.splitlines() if line.startswith(RUNTIME_TAG)]
+    if not lines:
+        return None
+    fields = lines[-1][len(RUNTIME_TAG):].split()
+    try:
+        return float(fields[0]), int(fields[3])
+    except (IndexError, ValueError):
+        return None
+
+def read_line(fields) -> tuple[str, float] | None:
+    '''(data type, reduced chi-square) of a split chi-square line of a SHAPE log, or None for any other line'''
+    if not fields or fields[0].isnumeric() or fields[0] in ('WARNING:', '#'):
+        return None
+    try:
+        return fields[0], float(fields[10][:7])
+    except (IndexError, ValueError):
+        return None
 
 def read(fname):
     '''
@@ -10,17 +43,13 @@ def read(fname):
 
     chisqrs = {}
     for l in lines: 
-        if not l[0].isnumeric() and l[0]!='WARNING:':
-            
-            try:
-                chi2 = float(l[10][:7])
-            except:
-                continue
-            
-            chisqrs[f'{l[0]}'] = chi2
+        chi = read_line(l)
+        if chi is None:
+            continue
+
+        chisqrs[chi[0]] = chi[1]
                 
-            if l[0] == 'ALLDATA':
-                chisqrs['unreduced'] = float(l[3])
-                chisqrs['dof'] = float(l[5])
+        if l[0] == 'ALLDATA':
+            chisqrs['unreduced'] = float(l[3])
+            chisqrs['dof'] = float(l[5])
     return chisqrs
-
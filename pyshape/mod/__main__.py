@@ -1,10 +1,11 @@
 #Last modified 13/09/2025
 
-from ..cli_config import console,safe_exit
+from ..cli_config import safe_exit,get_console,cli_main
 
+@cli_main
 def main():
     
-    console.print('''Run commands with "python -m pyshape.scan.<command> <args>"
+    get_console().print('''Run commands with "python -m pyshape.scan.<command> <args>"
 
 Available commands:
     convert_type       Apply mkharmod or mkvertmod
@@ -7,7 +7,9 @@ from pathlib import Path
 import subprocess
 import numpy as np
 from . import shuffle_vertices
-from ..cli_config import logger, error_exit
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import ShapeRunError
+from ..utils import for_each_file
 
 #python -m convert_type modfiles -vmod 500 n 
 #python -m convert_type test.mod -hmod 5 30 
@@ -19,7 +21,10 @@ def convert_type(fname,command_info,shuffle):
     logger.debug(f'Applying {command} to {fname}')
 
     #Running command
-    subprocess.run([command, fname, fname, *map(str, command_args)], check=True)
+    try:
+        subprocess.run([command, fname, fname, *map(str, command_args)], check=True)
+    except subprocess.CalledProcessError as e:
+        raise ShapeRunError(f'{command} failed on {fname}') from e
 
     # Shuffle vertices if required
     if command == 'mkvertmod' and shuffle:
@@ -89,6 +94,7 @@ def validate_args(args):
     return args
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
@@ -100,8 +106,9 @@ def main():
     elif Path(args.fname).is_dir():
         logger.info(f'Running script on directory {args.fname}/*.mod')
         modfiles = glob.glob(f'{args.fname}/*.mod')
-        for mod in modfiles:
-            convert_type(mod,args.command,args.shuffle_vertices)
+        failed = for_each_file(convert_type, modfiles, args.command, args.shuffle_vertices)
+        if failed:
+            error_exit(f'{len(failed)} of {len(modfiles)} files could not be converted')
     else:
         raise error_exit('Cannot find file or directory with name [fname]')
 
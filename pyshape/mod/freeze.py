@@ -4,7 +4,9 @@ import argparse
 import glob
 import logging
 from pathlib import Path
-from ..cli_config import logger, error_exit
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import InputError
+from ..utils import for_each_file
 from .mod_io import modFile
 
 #python -m freeze_mod modfiles v 1
@@ -71,11 +73,11 @@ def _freeze_components(mod_info, freeze, components, comp_type):
     if components is None:
         components = range(no_components)
     elif max(components) >= no_components:
-        error_exit(f'File does not have {max(components) + 1} components')
+        raise InputError(f'File does not have {max(components) + 1} components')
 
     for idx in components:
         if component_list[idx].type != comp_type:
-            error_exit(f'Component {idx} is not of type {comp_type}')
+            raise InputError(f'Component {idx} is not of type {comp_type}')
 
     for idx in components:
         component_list[idx].freeze_params(freeze)
@@ -114,6 +116,7 @@ def validate_args(args):
     return args
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
@@ -125,8 +128,9 @@ def main():
     elif Path(args.fname).is_dir():
         logger.info(f'Running script on directory {args.fname}/*.mod')
         modfiles = glob.glob(f'{args.fname}/*.mod')
-        for mod in modfiles:
-            freeze_mod(mod,args.mod_type,args.freeze,args.components)
+        failed = for_each_file(freeze_mod, modfiles, args.mod_type, args.freeze, args.components)
+        if failed:
+            error_exit(f'{len(failed)} of {len(modfiles)} files could not be changed')
     else:
         raise error_exit('Cannot find file or directory with name [fname]')
 
@@ -1,14 +1,18 @@
 #Last modified by @recannon 06/03/2026
 
 from dataclasses import dataclass, field
-from typing import ClassVar, Literal
-from astropy.time import Time
-from ..cli_config import logger,error_exit
+from typing import ClassVar, Literal, TYPE_CHECKING
+from ..cli_config import logger
+from ..errors import MissingBlockError
 from ..utils import time_shape2astropy,time_astropy2shape
 import numpy as np
 from pathlib import Path
 from ..jinja_env import template_env
 
+#astropy is only imported when times are converted (see utils)
+if TYPE_CHECKING:
+    from astropy.time import Time
+
 class modFile:
     
     def __init__(self, components, phot_functions, spinstate, raw_lines=None):
@@ -39,7 +43,7 @@ class modFile:
     def _find_block_idx(name, lines):
         idx = next((i for i, line in enumerate(lines) if name in line), None)
         if idx is None: #None if not found
-            raise SystemExit(f'Error: No {name} block found in file')
+            raise MissingBlockError(f'No {name} block found in file')
         return idx
     
     def _extract_spin_state(self):
@@ -222,7 +226,7 @@ class FreezeAwareBase:
 #===SPIN STATE===
 @dataclass
 class ModSpinState(FreezeAwareBase):
-    t0: Time
+    t0: "Time"
     noimpulses: int
 
     _param_index: ClassVar[dict[str, int]] = {
@@ -5,7 +5,8 @@ import logging
 from pathlib import Path
 import numpy as np
 from . import mod_io
-from ..cli_config import logger, error_exit
+from ..cli_config import logger, error_exit, cli_main
+from ..utils import for_each_file
 
 #python -m convert_type modfiles -vmod 500 n 
 #python -m convert_type test.mod -hmod 5 30 
@@ -55,6 +56,7 @@ def validate_args(args):
     return args
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
@@ -66,8 +68,9 @@ def main():
     elif Path(args.fname).is_dir():
         logger.info(f'Running script on directory {args.fname}/*.mod')
         modfiles = glob.glob(f'{args.fname}/*.mod')
-        for mod in modfiles:
-            shuffle_vertices(mod, args.reorder)
+        failed = for_each_file(shuffle_vertices, modfiles, args.reorder)
+        if failed:
+            error_exit(f'{len(failed)} of {len(modfiles)} files could not be changed')
     else:
         raise error_exit('Cannot find file or directory with name [fname]')
 
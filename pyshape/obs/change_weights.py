@@ -1,24 +1,40 @@
 #Last modified by @recannon 10/01/2026
 
-from .obs_io import obsFile
+from .obs_io import obsFile, ObsSet, ObsDopplerFrame, ObsDelayDopplerFrame, ObsLightCurveFrame
 import argparse
 from pathlib import Path
 import glob
-from ..cli_config import logger
+from ..cli_config import logger, error_exit, cli_main
+from ..utils import _shape_time_str, for_each_file
 
 #python -m change_weights obsfiles cw 1e4 5 6 7
 #python -m change_weights obsfiles dd 0.5
 #python -m change_weights test.obs lc 100
 
-def change_weights(fname,obs_type,new_weights,sets_affected=None):
+CHANGE_TYPE = {'dd' : 'delay-doppler',
+               'lc' : 'lightcurve',
+               'cw' : 'doppler'}
+
+#Frame classes used to re-render a single frame line
+FRAME_TYPE = {'delay-doppler' : ObsDelayDopplerFrame,
+              'doppler'       : ObsDopplerFrame}
+
+def change_weights(fname,obs_type,new_weights,sets_affected=None,full_parse=False):
+
+    #Default to patching lines directly (identical output, without parsing datasets)
+    if not full_parse:
+        with open(fname) as f:
+            lines = f.readlines()
+        output_lines = patch_weight_lines(lines,obs_type,new_weights,sets_affected)
+        with open(fname, 'w') as f:
+            f.writelines(output_lines)
+        logger.debug(f'Written to {fname}')
+        return 1
 
     #Load obs file
     obs_file = obsFile.from_file(fname)
 
-    change_type = {'dd' : 'delay-doppler',
-                   'lc' : 'lightcurve',
-                   'cw' : 'doppler'}
-    obs_type = change_type[obs_type]
+    obs_type = CHANGE_TYPE[obs_type]
    
     datasets = obs_file.datasets
     
@@ -38,7 +54,66 @@ def change_weights(fname,obs_type,new_weights,sets_affected=None):
     obs_file.write(fname)
     return 1
 
+def patch_weight_lines(lines,obs_type,new_weights,sets_affected=None):
+    '''
+    Changes weights on the raw lines of an obs file, without building the dataset classes.
+    Only the frame lines of affected sets are re-rendered, using the same formatting as
+    ObsSet._update_frames, so the output matches obsFile.write after set_weights.
+    '''
+    obs_type = CHANGE_TYPE[obs_type]
+
+    idx = obsFile._find_line('{number of sets}', lines)
+    no_sets = int(lines[idx].split()[0])
+
+    if not sets_affected:
+        sets_affected = list(range(no_sets))
+
+    #Shape meta info and number of sets, as in obsFile.write
+    output_lines = [lines[0],'\n']
+    output_lines.append(f'{no_sets: >14} {{number of sets}}')
+    output_lines.append('\n\n\n')
+
+    set_starts = [obsFile._find_line(f'SET {i}', lines) for i in range(no_sets)]
+    set_ends   = set_starts[1:] + [None]
+
+    for set_start, set_end in zip(set_starts, set_ends):
+        set_lines = lines[set_start:set_end]
+        set_no = int(set_lines[0].split()[-1].rstrip('}'))
+        set_type = set_lines[ObsSet._find_line('{set type}', set_lines)].split()[0]
+
+        if set_type == obs_type and set_no in sets_affected:
+            set_lines = _patch_set_lines(set_lines, set_type, new_weights)
+        output_lines.extend(set_lines)
+
+    return output_lines
+
+def _patch_set_lines(set_lines,set_type,new_weights):
+    
+    set_lines = list(set_lines)
+
+    if set_type == 'lightcurve':
+        points_idx = ObsSet._find_line('{number of samples', set_lines)
+        frame = ObsLightCurveFrame.from_parts(set_lines[points_idx+1].split())
+        frame.weight = new_weights
+        set_lines[points_idx+1] = frame.to_line()
+        return set_lines
+
+    #Radar sets. Dates are copied from the line rather than going through astropy
+    frame_cls = FRAME_TYPE[set_type]
+    frame_idx = ObsSet._find_line('{number of frames}', set_lines)
+    no_frames = int(set_lines[frame_idx].split()[0])
+    start = frame_idx + 2
+
+    for i in range(start, start + no_frames):
+        parts = set_lines[i].split()
+        frame = frame_cls.from_parts(parts)
+        frame.weight = new_weights
+        set_lines[i] = frame.to_line(_shape_time_str(*map(int, parts[1:7])))
+
+    return set_lines
+
 
+@cli_main
 def main():
     parser = argparse.ArgumentParser(description="Freeze or unfreeze all variable factors of listed components in a modfile.")
 
@@ -49,6 +124,8 @@ def main():
 
     parser.add_argument("-c", "--components", nargs='+', type=int, default=[],
                         help="Optional list of set numbers to affect (rather than all of one type)")
+    parser.add_argument("--full-parse", action="store_true",
+                        help="Parse every dataset before rewriting, rather than patching weight lines directly")
 
     args = parser.parse_args()
 
@@ -58,9 +135,9 @@ def main():
     elif Path(args.fname).is_dir():
         logger.info(f'Changing directory of files: {args.fname}')
         obsfiles = glob.glob(f'{args.fname}/*.obs')
-        for obs in obsfiles:
-            logger.debug(f'Changing {obs}')
-            change_weights(obs,args.obs_type,args.new_weights,args.components)
+        failed = for_each_file(change_weights, obsfiles, args.obs_type, args.new_weights, args.components, args.full_parse)
+        if failed:
+            error_exit(f'{len(failed)} of {len(obsfiles)} files could not be changed')
     else:
         raise FileNotFoundError('Cannot find file or directory with name [fname]')
 
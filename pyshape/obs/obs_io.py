@@ -1,10 +1,14 @@
 #Last modified by @recannon 10/01/2026
 
 from dataclasses import dataclass
-from typing import Union, Type
-from ..utils import time_shape2astropy, time_astropy2shape
-from ..cli_config import logger, error_exit
-from astropy.time import Time
+from typing import Union, Type, TYPE_CHECKING
+from ..utils import time_astropy2shape, times_shape2astropy, times_astropy2shape
+from ..cli_config import logger
+from ..errors import MissingBlockError
+
+#astropy is only imported when times are converted (see utils)
+if TYPE_CHECKING:
+    from astropy.time import Time
 
 #These classes have less utility than the modFile class.
 #Weights can be changed with the relevant function but editing dataclass objects
@@ -42,7 +46,7 @@ class obsFile:
     def _find_line(name: str, lines: list[str]) -> int:
         idx = next((i for i, line in enumerate(lines) if name in line), None)
         if idx is None:
-            error_exit(f'Error: No {name} found in this file')
+            raise MissingBlockError(f'No {name} found in this file')
         return idx
     
     #===Factory methods===
@@ -107,7 +111,7 @@ class ObsSet():
 
     def set_weights(self, weight: float):
         if not hasattr(self, "frames") or self.frames is None:
-            error_exit(f'Cannot find frames attribute for set {self.set_no}')
+            raise MissingBlockError(f'Cannot find frames attribute for set {self.set_no}')
         for frame in self.frames:
             frame.weight = weight
         self._update_frames()
@@ -121,7 +125,7 @@ class ObsSet():
     def _find_line(name: str, lines: list[str]) -> int:
         idx = next((i for i, line in enumerate(lines) if name in line), None)
         if idx is None:
-            error_exit(f'Error: No {name} found in this set')
+            raise MissingBlockError(f'No {name} found in set')
         return idx
 
     @staticmethod
@@ -143,6 +147,15 @@ class ObsLightCurveFrame:
     calfact: float
     weight: float
     
+    @classmethod
+    def from_parts(cls, parts: list[str]) -> "ObsLightCurveFrame":
+        return cls(
+            fname=parts[0],
+            calfact_freeze=parts[1],
+            calfact=float(parts[2]),
+            weight=float(parts[3]),
+        )
+    
     def to_line(self) -> str:
         return (
             f'{self.fname: >25} '
@@ -152,13 +165,28 @@ class ObsLightCurveFrame:
 
 @dataclass
 class ObsDopplerFrame(ObsLightCurveFrame):
-    date: Time
+    date: "Time"
     sdev: float
     looks: float
     mask: int
     
-    def to_line(self) -> str:
-        date_str = time_astropy2shape(self.date)
+    #Dates are left as None here so a whole set can be converted in one call (see _parse_frames)
+    @classmethod
+    def from_parts(cls, parts: list[str]) -> "ObsDopplerFrame":
+        return cls(
+            fname=parts[0],
+            date=None,
+            sdev=float(parts[7]),
+            calfact_freeze=parts[8],
+            calfact=float(parts[9]),
+            looks=float(parts[10]),
+            weight=float(parts[11]),
+            mask=int(parts[12])
+        )
+    
+    def to_line(self, date_str: str = None) -> str:
+        if date_str is None:
+            date_str = time_astropy2shape(self.date)
         return (
             f'{self.fname: >25} {date_str} '
             f'{self.sdev:.6e} '
@@ -171,8 +199,23 @@ class ObsDopplerFrame(ObsLightCurveFrame):
 class ObsDelayDopplerFrame(ObsDopplerFrame):
     com_del_row: float
     
-    def to_line(self) -> str:
-        date_str = time_astropy2shape(self.date)
+    @classmethod
+    def from_parts(cls, parts: list[str]) -> "ObsDelayDopplerFrame":
+        return cls(
+            fname=parts[0],
+            date=None,
+            sdev=float(parts[7]),
+            calfact_freeze=parts[8],
+            calfact=float(parts[9]),
+            looks=float(parts[10]),
+            com_del_row=float(parts[11]),
+            weight=float(parts[12]),
+            mask=int(parts[13])
+        )
+    
+    def to_line(self, date_str: str = None) -> str:
+        if date_str is None:
+            date_str = time_astropy2shape(self.date)
         return (
             f'{self.fname: >25} {date_str} '
             f'{self.sdev:.6e} '
@@ -183,6 +226,22 @@ class ObsDelayDopplerFrame(ObsDopplerFrame):
             f'{self.mask: >4d}\n')
 
 
+#===Batched frame date handling===
+#Dates for a whole set are converted to/from one astropy.time array, rather than once per frame
+def _parse_frames(frame_cls, frame_lines: list[str]) -> list[ObsDopplerFrame]:
+    parts_list = [line.split() for line in frame_lines]
+    frames = [frame_cls.from_parts(parts) for parts in parts_list]
+    dates = times_shape2astropy([' '.join(parts[1:7]) for parts in parts_list])
+    for frame, date in zip(frames, dates):
+        frame.date = date
+    return frames
+
+def _frames_to_lines(frames: list[ObsDopplerFrame]) -> list[str]:
+    from astropy.time import Time
+    date_strs = times_astropy2shape(Time([frame.date for frame in frames]))
+    return [frame.to_line(date_str) for frame, date_str in zip(frames, date_strs)]
+
+
 #===DOPPLER (CW)===
 @dataclass
 class ObsDoppler(ObsSet):
@@ -201,30 +260,17 @@ class ObsDoppler(ObsSet):
         self.no_frames = int(self.set_lines[frame_idx].split()[0])
         frame_lines = self.set_lines[frame_idx+2 : frame_idx+2 + self.no_frames]
         
-        self.frames = [
-            ObsDopplerFrame(
-                fname=parts[0],
-                date=time_shape2astropy(' '.join(parts[1:7])),
-                sdev=float(parts[7]),
-                calfact_freeze=parts[8],
-                calfact=float(parts[9]),
-                looks=float(parts[10]),
-                weight=float(parts[11]),
-                mask=int(parts[12])
-            )
-            for parts in (line.split() for line in frame_lines)
-        ]
+        self.frames = _parse_frames(ObsDopplerFrame, frame_lines)
     
     def _update_frames(self):
         if not self.frames:
-            error_exit(f'Cannot find frames when trying to update lines in set {self.set_no}')
-            return
+            raise MissingBlockError(f'Cannot find frames when trying to update lines in set {self.set_no}')
 
         frame_idx = self._find_line('{number of frames}', self.set_lines)
         start = frame_idx + 2
 
-        for i, frame in enumerate(self.frames):
-            self.set_lines[start + i] = frame.to_line()
+        for i, line in enumerate(_frames_to_lines(self.frames)):
+            self.set_lines[start + i] = line
             
         
 #===DELAY DOPPLER===
@@ -249,31 +295,17 @@ class ObsDelayDoppler(ObsSet):
         self.no_frames = int(self.set_lines[frame_idx].split()[0])
         frame_lines = self.set_lines[frame_idx+2 : frame_idx+2 + self.no_frames]
         
-        self.frames = [
-            ObsDelayDopplerFrame(
-                fname=parts[0],
-                date=time_shape2astropy(' '.join(parts[1:7])),
-                sdev=float(parts[7]),
-                calfact_freeze=parts[8],
-                calfact=float(parts[9]),
-                looks=float(parts[10]),
-                com_del_row=float(parts[11]),
-                weight=float(parts[12]),
-                mask=int(parts[13])
-            )
-            for parts in (line.split() for line in frame_lines)
-        ]
+        self.frames = _parse_frames(ObsDelayDopplerFrame, frame_lines)
         
     def _update_frames(self):
         if not self.frames:
-            error_exit(f'Cannot find frames when trying to update lines in set {self.set_no}')
-            return
+            raise MissingBlockError(f'Cannot find frames when trying to update lines in set {self.set_no}')
 
         frame_idx = self._find_line('{number of frames}', self.set_lines)
         start = frame_idx + 2
 
-        for i, frame in enumerate(self.frames):
-            self.set_lines[start + i] = frame.to_line()
+        for i, line in enumerate(_frames_to_lines(self.frames)):
+            self.set_lines[start + i] = line
 
             
             
@@ -293,18 +325,12 @@ class ObsLightCurve(ObsSet):
         self.no_points = int(self.set_lines[points_idx].split()[0])
         
         parts = self.set_lines[points_idx+1].split()
-        frame = ObsLightCurveFrame(
-            fname=parts[0],
-            calfact_freeze=parts[1],
-            calfact=float(parts[2]),
-            weight=float(parts[3]),
-        )
+        frame = ObsLightCurveFrame.from_parts(parts)
         self.frames = [frame] #Store in list to match other datasets, but only ever length 1
         
     def _update_frames(self):
         if not self.frames:
-            error_exit(f'Cannot find frames when trying to update lines in set {self.set_no}')
-            return
+            raise MissingBlockError(f'Cannot find frames when trying to update lines in set {self.set_no}')
 
         points_idx = self._find_line('{number of samples', self.set_lines)
 
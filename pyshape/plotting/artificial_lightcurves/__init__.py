@@ -1,4 +1,4 @@
 #Last modified by @recannon 06/01/2026
 
 from .pub_lightcurve_generator import pub_lightcurve_generator
-from .concat_lc_plots import concat_lc_plots
\ No newline at end of file
+from .concat_lc_plots import concat_lc_plots, lc_pdf_build
\ No newline at end of file
@@ -7,18 +7,27 @@ import argparse
 import logging
 from ...cli_config import logger, error_exit
 from ...utils import check_dir
-from ...jinja_env import render_and_compile_pdf
+from ...jinja_env import render_and_compile_pdf, PdfBuild
 
-def concat_lc_plots(figdir:Path, outdir:Path, pdf_name:str = 'Art_LC_Plots'):
+def concat_lc_plots(figdir:Path, outdir:Path, pdf_name:str = 'Art_LC_Plots', incremental=True):
+
+    build = lc_pdf_build(figdir, outdir, pdf_name)
+
+    #Render as pdf
+    render_and_compile_pdf(build.template_name, build.render_kwargs, build.out_stem,
+                           build.work_dir, build.dest_dir, build.depends, incremental)
+    
+    return True
+
+def lc_pdf_build(figdir:Path, outdir:Path, pdf_name:str = 'Art_LC_Plots') -> PdfBuild:
+    '''Template inputs for the combined lightcurve pdf, without compiling it'''
 
     #Number of lightcurves and their numbers (range)
     lightcurve_pdfs = sorted(figdir.glob("ArtLC*.pdf"))
     logger.debug(f'pdf files: \n {lightcurve_pdfs}')
     n_lightcurves = len(lightcurve_pdfs)
     lightcurve_nos = list(range(1, n_lightcurves + 1))
-    
-    #Render as pdf
-    render_and_compile_pdf("concat_lc_plots.tex.j2", {"lightcurve_nos": lightcurve_nos},
-                           pdf_name, figdir, outdir)
-    
-    return True
+
+    #Figures are included through a macro, so list them as dependencies
+    return PdfBuild("concat_lc_plots.tex.j2", {"lightcurve_nos": lightcurve_nos},
+                    pdf_name, figdir, outdir, depends=lightcurve_pdfs)
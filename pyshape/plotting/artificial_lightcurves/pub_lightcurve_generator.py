@@ -5,10 +5,12 @@
 #This script does a sparser line but includes specific lightcurve points
 
 from ..pub_routines import pub_lightcurves
+from ..figure_cache import figure_key, source_file
 from ...convinv import read_lctxt
 from .optical_scattering_laws import scattering
 from .self_shadowing import apply_self_shadowing
 import numpy as np
+from pathlib import Path
 import trimesh
 from ...cli_config import logger
 
@@ -16,7 +18,11 @@ from ...cli_config import logger
 def pub_lightcurve_generator(out_path, lc_file, T0, lam, bet, phi, P, Fn, FNA,
                          V=None, F=None, shadowing=False, 
                          scattering_law='lambert', scattering_params=None, 
-                         plot=True, show_plot=False):
+                         plot=True, show_plot=False, cache=None):
+    '''
+    cache is an optional figure_cache.FigureCache. Lightcurves whose data, model and
+    scattering law are unchanged since they were cached are copied rather than recomputed
+    '''
 
     #Read in lightcurve file
     lightcurves, calibrated = read_lctxt(lc_file)
@@ -46,12 +52,27 @@ def pub_lightcurve_generator(out_path, lc_file, T0, lam, bet, phi, P, Fn, FNA,
                             [0,            1,  0],
                             [np.sin(bet),  0,  np.cos(bet)]])
 
+    #Code and model shared by every lightcurve's key
+    if cache and plot:
+        shared_key = figure_key(Path(__file__), source_file(pub_lightcurves), source_file(scattering),
+                                source_file(apply_self_shadowing),
+                                T0, lam, bet, phi0, P, Fn, FNA, V, F, shadowing,
+                                scattering_law, scattering_params)
+
     for i in range(no_lightcurves):
         print("")
         logger.info(f'Lightcurve {i+1}')
         
         #Read lightcurve data and sun and earth vectors
         lc_data = lightcurves[i]
+
+        if cache and plot:
+            lc_key = figure_key(shared_key, lc_data)
+            fig_name = Path(f'{out_path}/ArtLC_{i+1:0>2}_fix.pdf')
+            if cache.fetch(lc_key, fig_name):
+                logger.info(f'Reused cached lightcurve {i+1}')
+                continue
+
         jds_lc, mags_lc = lc_data[:,0], lc_data[:,9]
         t_0, t_fin = jds_lc[[0, -1]]
         lc_len = len(jds_lc)
@@ -154,5 +175,7 @@ def pub_lightcurve_generator(out_path, lc_file, T0, lam, bet, phi, P, Fn, FNA,
 
         if plot:
             pub_lightcurves(art_lc_data,lc_data,lc_phase_angle,lc_aspect_angle,i+1,out_path,show_plot)
+            if cache:
+                cache.store(lc_key, fig_name)
 
     return True
@@ -0,0 +1,128 @@
+#Last modified 19/10/2026
+
+#Content-addressed cache of rendered figures
+#A figure is stored under the hash of everything used to draw it, so unchanged panels can be copied
+#back into place instead of being re-rendered. Include the plotting module files in the key,
+#so that changes to the plotting routines also invalidate the cache
+
+import hashlib
+import inspect
+import os
+import shutil
+import numpy as np
+from pathlib import Path
+from ..cli_config import logger
+
+#Bump to invalidate every cached figure
+CACHE_VERSION = 1
+#Size the cache is pruned back to, removing the least recently used figures first
+MAX_CACHE_MB = 500
+
+def figure_key(*inputs) -> str:
+    '''
+    Hash of the inputs to a figure. Paths are hashed by their contents, arrays by their
+    dtype, shape and data, and containers recursively. Anything else is hashed by its repr
+    '''
+    h = hashlib.sha256(f'v{CACHE_VERSION}'.encode())
+    for obj in inputs:
+        _update(h, obj)
+    return h.hexdigest()
+
+def file_stamps(paths) -> list[tuple]:
+    '''
+    (name, size, mtime) of each file, for adding large inputs (e.g. data frames) to a key
+    without reading them. Missing files are (name, None)
+    '''
+    stamps = []
+    for path in map(Path, paths):
+        try:
+            stat = path.stat()
+            stamps.append((str(path), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            stamps.append((str(path), None))
+    return stamps
+
+def source_file(func) -> Path:
+    '''File defining func, for adding a plotting routine to a key'''
+    return Path(inspect.getsourcefile(func))
+
+def _update(h, obj):
+    if isinstance(obj, Path):
+        h.update(b'file')
+        h.update(obj.read_bytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(f'array{obj.dtype.str}{obj.shape}'.encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(f'dict{len(obj)}'.encode())
+        for key in sorted(obj, key=repr):
+            _update(h, key)
+            _update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(f'seq{len(obj)}'.encode())
+        for item in obj:
+            _update(h, item)
+    elif isinstance(obj, (set, frozenset)):
+        _update(h, sorted(obj, key=repr))
+    else:
+        h.update(repr(obj).encode())
+    h.update(b';')
+
+class FigureCache:
+    '''
+    Directory of figures named by key. Figures are copied in and out rather than linked,
+    as savefig rewrites its output in place and would change the cached copy
+    '''
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key, suffix='.pdf') -> Path:
+        return self.cache_dir / f'{key}{suffix}'
+
+    def fetch(self, key, dest) -> bool:
+        '''Copies the cached figure to dest. Returns False if there isn't one'''
+        dest = Path(dest)
+        cached = self.path(key, dest.suffix)
+        if not cached.exists():
+            return False
+        shutil.copyfile(cached, dest)
+        #Marks the figure as recently used, for prune
+        os.utime(cached)
+        logger.debug(f'Reused cached {dest.name}')
+        return True
+
+    def store(self, key, src):
+        '''Adds src to the cache. Written to a temporary name first, so readers never see a partial file'''
+        src = Path(src)
+        cached = self.path(key, src.suffix)
+        temp = cached.with_name(f'.{cached.name}.{os.getpid()}')
+        shutil.copyfile(src, temp)
+        os.replace(temp, cached)
+
+    def render(self, key, dest, render_func, *args, **kwargs) -> bool:
+        '''Fetches dest from the cache, or calls render_func to create it and caches the result. Returns True if cached'''
+        if self.fetch(key, dest):
+            return True
+        render_func(*args, **kwargs)
+        self.store(key, dest)
+        return False
+
+    def prune(self, max_mb=MAX_CACHE_MB):
+        '''Removes the least recently used figures until the cache is at most max_mb'''
+        files = sorted((f for f in self.cache_dir.iterdir() if f.is_file()),
+                       key=lambda f: f.stat().st_mtime, reverse=True)
+        total = 0
+        for f in files:
+            total += f.stat().st_size
+            if total > max_mb * 2**20:
+                f.unlink(missing_ok=True)
+                logger.debug(f'Removed {f.name} from the figure cache')
+
+    def clear(self):
+        '''Removes every cached figure'''
+        for f in self.cache_dir.iterdir():
+            if f.is_file():
+                f.unlink(missing_ok=True)
+        logger.info(f'Cleared figure cache {self.cache_dir}')
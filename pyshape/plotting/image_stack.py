@@ -0,0 +1,104 @@
+#Last modified 19/10/2026
+
+#In-process replacement for the ppmstack/ffmpeg/convert chains used on SHAPE images
+#Images are held as (height, width, 3) uint8 arrays
+
+import numpy as np
+from pathlib import Path
+from PIL import Image
+
+#Width of pdf pages, in pixels (A4 at 72 DPI)
+PDF_WIDTH = 842
+
+#===Reading===
+def read_pnm(fname) -> np.ndarray:
+    '''Reads a PGM/PPM file (plain or raw) as an RGB uint8 array'''
+    data = Path(fname).read_bytes()
+
+    #Header is magic number, width, height, maxval, allowing for comments
+    tokens, pos = [], 0
+    while len(tokens) < 4:
+        while data[pos:pos+1].isspace():
+            pos += 1
+        if data[pos:pos+1] == b'#':
+            pos = data.index(b'\n', pos) + 1
+            continue
+        start = pos
+        while not data[pos:pos+1].isspace():
+            pos += 1
+        tokens.append(data[start:pos].decode())
+    pos += 1  #Single whitespace before raster
+
+    magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    channels = {'P2': 1, 'P5': 1, 'P3': 3, 'P6': 3}.get(magic)
+    if channels is None:
+        raise ValueError(f'Unsupported image type {magic} in {fname}')
+    count = width * height * channels
+
+    if magic in ('P2', 'P3'):
+        pixels = np.array(data[pos:].split()[:count], dtype=np.uint16)
+    else:
+        dtype = np.dtype('>u2') if maxval > 255 else np.uint8
+        pixels = np.frombuffer(data, dtype=dtype, count=count, offset=pos)
+
+    pixels = pixels.reshape(height, width, channels)
+    if maxval != 255:
+        pixels = np.rint(pixels.astype(float) * 255 / maxval)
+    pixels = pixels.astype(np.uint8)
+
+    if channels == 1:
+        pixels = np.repeat(pixels, 3, axis=2)
+    return pixels
+
+def read_image(fname) -> np.ndarray:
+    '''Reads PGM/PPM files directly, anything else through PIL'''
+    if Path(fname).suffix.lower() in ('.pgm', '.ppm', '.pnm'):
+        return read_pnm(fname)
+    with Image.open(fname) as img:
+        return np.asarray(img.convert('RGB'))
+
+#===Stacking===
+def hstack(images, gap=1, fill=0) -> np.ndarray:
+    '''Places images side by side, top aligned, with gap pixels between them'''
+    height = max(img.shape[0] for img in images)
+    width  = sum(img.shape[1] for img in images) + gap * (len(images) - 1)
+    out = np.full((height, width, 3), fill, dtype=np.uint8)
+    x = 0
+    for img in images:
+        out[:img.shape[0], x:x+img.shape[1]] = img
+        x += img.shape[1] + gap
+    return out
+
+def vstack(images, gap=1, fill=0) -> np.ndarray:
+    '''Places images above one another, left aligned, with gap pixels between them'''
+    return hstack([img.transpose(1, 0, 2) for img in images], gap, fill).transpose(1, 0, 2)
+
+def grid(images, no_cols, gap=1, fill=0) -> np.ndarray:
+    '''Tiles images row by row into no_cols columns (as ppmstack no_cols)'''
+    rows = [images[i:i+no_cols] for i in range(0, len(images), no_cols)]
+    return vstack([hstack(row, gap, fill) for row in rows], gap, fill)
+
+def column_grid(images, no_cols, gap=1, fill=0) -> np.ndarray:
+    '''Fills no_cols columns top to bottom, then joins the columns'''
+    no_rows = len(images) // no_cols + int(len(images) % no_cols != 0)
+    columns = [images[i*no_rows:(i+1)*no_rows] for i in range(no_cols)]
+    return hstack([vstack(col, gap, fill) for col in columns if col], gap, fill)
+
+#===Writing===
+def save_image(image, fname, quality=95):
+    '''Saves an array as an image, with the format taken from the suffix (jpg, pdf, png...)'''
+    Image.fromarray(image).save(fname, quality=quality, resolution=72.0)
+
+def images_to_pdf(images, out_pdf, width=PDF_WIDTH):
+    '''
+    Resizes images (arrays or file names) to the same width and stacks them vertically
+    into a single-page pdf (as convert -resize, then -append)
+    '''
+    resized = []
+    for img in images:
+        if not isinstance(img, np.ndarray):
+            img = read_image(img)
+        height = max(1, round(img.shape[0] * width / img.shape[1]))
+        resized.append(np.asarray(Image.fromarray(img).resize((width, height), Image.LANCZOS)))
+    save_image(vstack(resized, gap=0), out_pdf)
+    return out_pdf
@@ -3,10 +3,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FormatStrFormatter
-from astropy.time import Time
-from astropy.stats import sigma_clip
 from ..cli_config import logger
-from .model.plot_model_projection import plot_model_projection
 
 # Colorblind-friendly colors
 CBblue  = np.array([68, 119, 170]) / 255
@@ -24,6 +21,7 @@ def pub_lightcurves(art_lc_data,lc_data,solar_phase_angle,aspect_angle,i,out_pat
     ./artificial_lightcurves/pub_lightcurve_generator.py for details on how input arrays are constructed
     '''
     
+    from astropy.time import Time
     logger.info(f'Plotting lightcurve {i}')
 
     lc_start = Time(lc_data[0,0],format='jd')
@@ -86,6 +84,7 @@ def pub_lightcurves(art_lc_data,lc_data,solar_phase_angle,aspect_angle,i,out_pat
     return 1
 
 def pub_doppler(fit_file,dop_info,fig_title,sigma_threshold=5,show=True,save=False):
+    from astropy.stats import sigma_clip
 
     text_size = 30
     title_size = 30
@@ -143,6 +142,8 @@ def pub_model(vertices,facets,normals,
               red_list=None,yellow_list=None,
               lims = 0.6, ticks=0.5, titlesize=35, labelsize=30):
     
+    from .model.plot_model_projection import plot_model_projection
+
     views = ['+Z', '+Y', '+X', '-Z', '-Y', '-X']
 
     plt.rcParams.update({'font.size': 30})
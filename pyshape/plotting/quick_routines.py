@@ -1,6 +1,5 @@
 #Last modified by @recannon 07/01/2026
 
-from astropy.stats import sigma_clip
 import matplotlib.pyplot as plt
 import numpy as np
 import cmasher as cmr
@@ -42,6 +41,7 @@ def quick_lightcurves(fit_files,no_cols=3,show=True,save=False):
     return 1
 
 def quick_doppler(fit_files,no_cols=2,sigma_threshold=5,show=True,save=False):
+    from astropy.stats import sigma_clip
 
     # A4 size in inches: 11.7 x 8.3 (landscape)
     A4_WIDTH = 11.7
@@ -105,7 +105,7 @@ def quick_gridscan(p1_arr, p2_arr, chi_arr,
     cf = ax.contourf(p1_grid, p2_grid, chi_grid, cmap=cmp, levels=col_contours)
     
     if lines:
-        lin_contours = np.min(chi_arr) * (1 + (np.array(lines) / 100))
+        lin_contours = np.nanmin(chi_arr) * (1 + (np.array(lines) / 100))
         ax.contour(p1_grid, p2_grid, chi_grid, levels=lin_contours,
                    colors='deepskyblue', linestyles=['-', '--', ':'])
 
@@ -126,4 +126,29 @@ def quick_gridscan(p1_arr, p2_arr, chi_arr,
     if save:
         fig.savefig(save)
     if show:
-        fig.show()
\ No newline at end of file
+        fig.show()
+    else:
+        plt.close(fig)
+
+def quick_subscan_summary(angle2, best_p1, best_p2, best_chi,
+                          p1_label='p1', p2_label='p2',
+                          save=False, show=False):
+    '''Best chi-square of each angle2 subscan, with the overall best marked'''
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(angle2, best_chi, 'k.-')
+
+    i = np.argmin(best_chi)
+    ax.plot(angle2[i], best_chi[i], 'o', color='deepskyblue')
+    ax.set_title(f'angle2 = {angle2[i]} ({p1_label} {best_p1[i]}, {p2_label} {best_p2[i]}) : {best_chi[i]}',
+                 fontsize=20)
+
+    ax.set_xlabel('angle2', fontsize=20)
+    ax.set_ylabel('Best objective function', fontsize=20)
+
+    if save:
+        fig.savefig(save)
+    if show:
+        fig.show()
+    else:
+        plt.close(fig)
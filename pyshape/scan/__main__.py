@@ -1,18 +1,25 @@
 #Last modified by @recannon 04/03/2026
 
-from ..cli_config import console,safe_exit
+from ..cli_config import safe_exit,get_console,cli_main
 
+@cli_main
 def main():
     
-    console.print('''Run commands with "python -m pyshape.scan.<command> <args>"
+    get_console().print('''Run commands with "python -m pyshape.scan.<command> <args>"
 
 Available commands:
     run_grid    Run a grid scan
+    run_adaptive Run a polescan that refines around the best fits
     run_line    Run a line scan
+    run_weights Run a scan over dataset weights
     qplot       Quick plotting (grid scan)
     pplot       Publication-ready plotting (grid scan)
     combine     Combine scan results
     rank        Rank scan fits (and can delete those outside threshold)
+    slurm       Monitor SLURM scans, resubmitting failed fits
+    watch       Cancel SLURM fits that cannot reach the best chi-square
+    stage       Run one fit in node-local storage, copying the results back
+    cost        Estimate the cores, memory and time of each SLURM fit from past runtimes
 
 Use "python -m pyshape.scan.<command> -h" for individual details.''')
     
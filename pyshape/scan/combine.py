@@ -6,7 +6,7 @@ import numpy as np
 from pathlib import Path
 import shutil
 from rich.progress import Progress
-from ..cli_config import logger,error_exit,console
+from ..cli_config import logger,error_exit,get_console,cli_main
 from ..utils import check_dir
 from . import scan_io
 
@@ -19,7 +19,7 @@ def combine_gridscan(fit_dirs, out_dir):
 
     #Read all fits
     p1_parts, p2_parts, chi_parts, loc_parts = [], [], [], []
-    with Progress(console=console, transient=True) as pb:
+    with Progress(console=get_console(), transient=True) as pb:
         t1 = pb.add_task('Reading scan directories', total=len(fit_dirs))
         for i, scan_dir in enumerate(fit_dirs):
             p1, p2, chi, _ = scan_io.scan_results(scan_dir)
@@ -43,7 +43,7 @@ def combine_gridscan(fit_dirs, out_dir):
     combined_best     = sorted_combined[unique_indices]
 
     #Write namecores.txt and copy files to new dir
-    with Progress(console=console, transient=True) as pb:
+    with Progress(console=get_console(), transient=True) as pb:
         t2 = pb.add_task('Copying files', total=len(combined_best))
 
         with open(f'{out_dir}/namecores.txt', 'w') as namecore_file:
@@ -137,6 +137,7 @@ def validate_args(args):
 
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
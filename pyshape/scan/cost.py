@@ -0,0 +1,263 @@
+#Last modified 19/10/2026
+
+import argparse
+import hashlib
+import logging
+import math
+import numpy as np
+from dataclasses import dataclass
+from pathlib import Path
+from .. import log_file
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import MissingFileError, PyshapeError
+from ..mod.mod_io import modFile
+from ..obs.obs_io import obsFile
+from ..utils import check_type
+from .local import PAR_FILE
+from .scan_io import fit_complete, fit_continued
+
+#python -m pyshape.scan.cost                           (estimate the scan here from its own finished fits)
+#python -m pyshape.scan.cost new_scan --history old_scan1 old_scan2
+
+#Chooses the cores, memory and time of each SLURM fit rather than the fixed values in launch_fitting.sbatch.
+#Every free parameter is stepped through each iteration, and each step renders the model in every frame,
+#so a fit costs about (facets x frames x free parameters) core-seconds times a rate. The rate is the median
+#of past fits (from the runtime line launch_fitting.sbatch and scan.local add to their logs), preferring
+#fits run with the same par file, as it sets how many iterations a fit takes
+
+#Limits on what a fit asks for
+MAX_CORES = 32
+TARGET_HOURS = 12   #Fits get the fewest cores (a power of 2) that finish within this
+MAX_HOURS = 24      #As in launch_fitting.sbatch. Fits cut off by the time limit are continued
+#Time requests are this many minutes doubled, so fits with similar costs ask for the same and share a job
+MIN_MINUTES = 30
+#Times the predicted runtime that is asked for
+SAFETY = 1.5
+#launch_fitting.sbatch asks for 6G for 8 ranks. Each rank also holds a few copies of the data (data, model, residuals)
+MEM_PER_RANK_MB = 768
+DATA_COPIES = 4
+MEM_STEP_MB = 256
+#Timed fits read from each directory of past scans
+HISTORY_PER_DIR = 50
+
+@dataclass(frozen=True)
+class FitFeatures:
+    '''What the cost of a fit depends on'''
+    facets: int
+    frames: int
+    free: int
+    data_bytes: int
+    par: str  #Hash of the par file contents
+
+    @property
+    def work(self) -> int:
+        return self.facets * max(self.frames, 1) * max(self.free, 1)
+
+@dataclass(frozen=True)
+class Resources:
+    '''Cores, memory and time asked for by one fit'''
+    cores: int
+    minutes: int
+    mem_mb: int
+
+    def sbatch_args(self, pack=1) -> list[str]:
+        '''--time and --mem of a task running pack of these fits at once'''
+        return [f'--time={self.minutes // 60}:{self.minutes % 60:02d}:00', f'--mem={self.mem_mb * pack}M']
+
+    def __str__(self):
+        return f'{self.cores} cores, {self.mem_mb}M, {self.minutes // 60}:{self.minutes % 60:02d}:00'
+
+#===Features of a fit===
+def model_facets(mod) -> int:
+    '''Facets of every component. SHAPE realises ellipsoids and harmonics with about 4 theta^2 / pi vertices'''
+    facets = 0
+    for component in mod.components:
+        if component.type == 'vertex':
+            facets += component.no_fac
+        else:
+            facets += 2 * (2 + round(4 * component.theta**2 / np.pi)) - 4
+    return facets
+
+def free_params(mod) -> int:
+    '''Parameters of the model with freeze state f'''
+    parts = [*mod.components, mod.spinstate, *mod.phot_functions.radar, *mod.phot_functions.optical]
+    return sum(int(np.count_nonzero(np.asarray(getattr(part, name), dtype=str) == 'f'))
+               for part in parts for name in part._normal_freeze_names)
+
+def par_hash(par) -> str:
+    return hashlib.sha1(Path(par).read_bytes()).hexdigest()[:12]
+
+def fit_features(fit_dir, namecore, par_id) -> FitFeatures:
+    '''Features of modfiles/{namecore}.mod and obsfiles/{namecore}.obs in fit_dir (frame names relative to it)'''
+    fit_dir = Path(fit_dir)
+    mod_path = fit_dir / 'modfiles' / f'{namecore}.mod'
+    obs_path = fit_dir / 'obsfiles' / f'{namecore}.obs'
+    for path in (mod_path, obs_path):
+        if not path.exists():
+            raise MissingFileError(f'Cannot estimate {namecore}: {path} does not exist')
+    mod = modFile.from_file(mod_path)
+    frames = [frame.fname for ds in obsFile.from_file(obs_path).datasets for frame in getattr(ds, 'frames', None) or []]
+    data_bytes = sum((fit_dir / name).stat().st_size for name in frames if (fit_dir / name).is_file())
+    return FitFeatures(model_facets(mod), len(frames), free_params(mod), data_bytes, par_id)
+
+def fit_dirs(scan_dir) -> list[Path]:
+    '''The scan directory, or its angle2 subscans'''
+    scan_dir = Path(scan_dir)
+    subscans = sorted(d for d in (scan_dir / 'subscans').glob('*') if d.is_dir())
+    return subscans or [scan_dir]
+
+#===Cost model===
+def harvest(scan_dirs, per_dir=HISTORY_PER_DIR) -> list[tuple[FitFeatures, float]]:
+    '''
+    (features, core-seconds) of up to per_dir timed fits in each directory of each scan.
+    Fits that did not finish (see fit_complete), or were continued after a time limit (whose log only
+    times the last part, see fit_continued), are left out
+    '''
+    history = []
+    for scan_dir in map(Path, scan_dirs):
+        if not (scan_dir / PAR_FILE).exists():
+            logger.warning(f'No {PAR_FILE} in {scan_dir}, so its fits are not used')
+            continue
+        par_id = par_hash(scan_dir / PAR_FILE)
+        for fit_dir in fit_dirs(scan_dir):
+            found = 0
+            for log in sorted((fit_dir / 'logfiles').glob('*.log')):
+                if found >= per_dir:
+                    break
+                if not fit_complete(log) or fit_continued(log):
+                    continue
+                runtime = log_file.read_runtime(log)
+                try:
+                    features = fit_features(fit_dir, log.stem, par_id)
+                except (OSError, PyshapeError) as e:
+                    logger.debug(f'Skipping {log}: {e}')
+                    continue
+                history.append((features, runtime[0] * runtime[1]))
+                found += 1
+        logger.debug(f'{len(history)} timed fits after {scan_dir}')
+    return history
+
+class CostModel:
+    '''Predicts the core-seconds of a fit from the median rate (core-seconds per unit of work) of past fits'''
+
+    def __init__(self, history):
+        self.history = list(history)
+
+    @classmethod
+    def from_dirs(cls, scan_dirs, per_dir=HISTORY_PER_DIR):
+        return cls(harvest(scan_dirs, per_dir))
+
+    def rate(self, par=None) -> float | None:
+        '''Median rate of past fits with the same par file, or of all of them if there are none'''
+        records = [(f, t) for f, t in self.history if f.par == par] or self.history
+        if not records:
+            return None
+        return float(np.median([t / f.work for f, t in records]))
+
+    def core_seconds(self, features) -> float | None:
+        rate = self.rate(features.par)
+        return None if rate is None else rate * features.work
+
+def choose_resources(core_seconds, features, fits_per_task=1, cores=None,
+                     max_cores=MAX_CORES, target_hours=TARGET_HOURS, max_hours=MAX_HOURS) -> Resources:
+    '''
+    Resources for a fit predicted to take core_seconds, in a task running fits_per_task of them one after another
+    (e.g. one per angle2 subscan). Unless given, cores is the fewest power of 2 that finishes the task within target_hours
+    '''
+    task_seconds = fits_per_task * core_seconds
+    if cores is None:
+        cores = 1
+        while cores * 2 <= max_cores and task_seconds / cores > target_hours * 3600:
+            cores *= 2
+    minutes = SAFETY * task_seconds / cores / 60
+    minutes = MIN_MINUTES * 2 ** math.ceil(math.log2(max(minutes, MIN_MINUTES) / MIN_MINUTES))
+    per_rank = MEM_PER_RANK_MB + DATA_COPIES * features.data_bytes / 2**20
+    return Resources(cores, int(min(minutes, max_hours * 60)), cores * MEM_STEP_MB * math.ceil(per_rank / MEM_STEP_MB))
+
+def estimate_scan(scan_dir, history_dirs=None, angle2s=(), namecore_file='namecores.txt', cores=None,
+                  **limits) -> dict[str, Resources] | None:
+    '''
+    Resources (see choose_resources) for each namecore of scan_dir/namecore_file, calibrated on the timed fits of
+    history_dirs (default: scan_dir itself). With angle2s, every subscan runs in the same task, and each is
+    taken to cost as much as its largest fit among the subscans. None without history
+    '''
+    scan_dir = Path(scan_dir)
+    history_dirs = history_dirs or [scan_dir]
+    model = CostModel.from_dirs(history_dirs)
+    if not model.history:
+        logger.warning(f'No timed fits in {", ".join(map(str, history_dirs))}, so the defaults of launch_fitting.sbatch are used')
+        return None
+    logger.info(f'Cost model from {len(model.history)} timed fits: {model.rate():.3g} core-seconds per unit of work')
+
+    with open(scan_dir / namecore_file) as f:
+        namecores = [line.split()[0] for line in f if line.strip()]
+    task_dirs = [scan_dir / 'subscans' / f'{int(angle2):03d}' for angle2 in angle2s] or [scan_dir]
+    par_id = par_hash(scan_dir / PAR_FILE)
+
+    resources = {}
+    for namecore in namecores:
+        features = max((fit_features(fit_dir, namecore, par_id) for fit_dir in task_dirs),
+                       key=lambda f: (f.work, f.data_bytes))
+        resources[namecore] = choose_resources(model.core_seconds(features), features, len(task_dirs), cores, **limits)
+    for group, n in group_counts(resources).items():
+        logger.info(f'{n} fits ask for {group}')
+    return resources
+
+def group_counts(resources) -> dict[Resources, int]:
+    counts = {}
+    for r in resources.values():
+        counts[r] = counts.get(r, 0) + 1
+    return dict(sorted(counts.items(), key=lambda item: (item[0].cores, item[0].minutes, item[0].mem_mb)))
+
+#===Functions for parsing args===
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Estimate the cores, memory and time each fit of a scan needs on SLURM, from the runtimes of past fits",
+                                     epilog="run_grid --auto-resources submits with these estimates")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose output (sets log level to DEBUG)")
+    parser.add_argument("scan_dir", nargs='?', type=Path, default=Path('.'),
+                        help="Scan directory to estimate (with namecores.txt, and subscans if it has them). Default: current directory")
+    parser.add_argument("--history", nargs='+', type=Path, default=None,
+                        help="Scan directories whose finished fits calibrate the estimate. Default: scan_dir")
+    parser.add_argument("--max-cores", type=str, default=str(MAX_CORES),
+                        help=f"Most cores a fit can ask for. Default: {MAX_CORES}")
+    parser.add_argument("--target-hours", type=str, default=str(TARGET_HOURS),
+                        help=f"Fits get the fewest cores that finish within this. Default: {TARGET_HOURS}")
+    parser.add_argument("--max-hours", type=str, default=str(MAX_HOURS),
+                        help=f"Longest time a fit can ask for. Default: {MAX_HOURS}")
+
+    return parser.parse_args()
+
+def validate_args(args):
+
+    #Check verbose
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('Verbose: Set level to DEBUG')
+
+    args.max_cores = check_type(args.max_cores, '--max-cores', int)
+    args.target_hours = check_type(args.target_hours, '--target-hours', float)
+    args.max_hours = check_type(args.max_hours, '--max-hours', float)
+    if args.max_cores < 1 or args.target_hours <= 0 or args.max_hours <= 0:
+        error_exit('--max-cores must be at least 1, and --target-hours and --max-hours positive')
+    for d in [args.scan_dir, *(args.history or [])]:
+        if not d.is_dir():
+            error_exit(f'Scan directory not found: {d}')
+
+    return args
+
+#===Main===
+@cli_main
+def main():
+
+    args = parse_args()
+    args = validate_args(args)
+
+    dirs = fit_dirs(args.scan_dir)
+    angle2s = [d.name for d in dirs] if dirs[0] != args.scan_dir else []
+    estimate_scan(args.scan_dir, args.history, angle2s, max_cores=args.max_cores,
+                  target_hours=args.target_hours, max_hours=args.max_hours)
+
+if __name__ == "__main__":
+    main()
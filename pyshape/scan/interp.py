@@ -0,0 +1,202 @@
+#Last modified 19/10/2026
+
+#Linear interpolation of scan chi-squares as a precomputed sparse matrix of weights
+#The weights only depend on where the samples are, so they are computed once per scan layout
+#and reused as chi values change (max level, angle2 subscans, fits still landing)
+
+import hashlib
+import numpy as np
+from pathlib import Path
+from scipy import sparse
+from scipy.spatial import ConvexHull, Delaunay
+from ..cli_config import logger
+
+#Weights are saved in here, inside the scan directory
+CACHE_DIR = '.interp'
+#Most weight files kept in it. The least recently used are removed when a new one is saved
+MAX_CACHED = 8
+
+#Interpolators built or loaded this session, by layout key and file
+_interpolators = {}
+
+class WeightInterpolator:
+    '''
+    Interpolation as a sparse (n_targets, n_samples) matrix of weights.
+    NaN samples are dropped and the remaining weights renormalised. Targets with no valid samples are NaN
+    '''
+
+    def __init__(self, weights):
+        self.weights = sparse.csr_matrix(weights)
+
+    def __call__(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        total = self.weights @ np.where(valid, values, 0.0)
+        norm  = self.weights @ valid.astype(float)
+        out = np.full(total.shape, np.nan)
+        np.divide(total, norm, out=out, where=norm > 1e-12)
+        return out
+
+    def save(self, fname):
+        sparse.save_npz(fname, self.weights)
+
+    @classmethod
+    def load(cls, fname):
+        return cls(sparse.load_npz(fname))
+
+#===Cache===
+def layout_key(*arrays) -> str:
+    '''Hash of the sample and target coordinates that define a set of weights'''
+    h = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr, dtype=float)
+        h.update(f'{arr.shape}'.encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()[:16]
+
+def cached_interpolator(kind, build, *layout, cache_dir=None) -> WeightInterpolator:
+    '''
+    Returns WeightInterpolator(build(*layout)), reusing earlier results for the same layout.
+    With cache_dir, weights are also kept in cache_dir/.interp between runs, up to MAX_CACHED files
+    '''
+    key = f'{kind}_{layout_key(*layout)}'
+    fname = Path(cache_dir) / CACHE_DIR / f'{key}.npz' if cache_dir else None
+    if (key, fname) in _interpolators:
+        return _interpolators[key, fname]
+
+    interpolator = None
+    if fname and fname.exists():
+        try:
+            interpolator = WeightInterpolator.load(fname)
+            fname.touch()
+            logger.debug(f'Loaded interpolation weights from {fname}')
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not read {fname} ({e}). Recomputing weights')
+
+    if interpolator is None:
+        interpolator = WeightInterpolator(build(*layout))
+        if fname:
+            try:
+                fname.parent.mkdir(exist_ok=True)
+                interpolator.save(fname)
+                logger.debug(f'Saved interpolation weights to {fname}')
+                prune_cache(fname.parent, MAX_CACHED)
+            except OSError as e:
+                logger.warning(f'Could not save interpolation weights to {fname} ({e})')
+
+    _interpolators[key, fname] = interpolator
+    return interpolator
+
+def prune_cache(cache_path, keep=MAX_CACHED):
+    '''Removes all but the keep most recently used weight files in cache_path'''
+    files = sorted(Path(cache_path).glob('*.npz'), key=lambda f: f.stat().st_mtime, reverse=True)
+    for f in files[keep:]:
+        try:
+            f.unlink()
+            logger.debug(f'Removed old interpolation weights {f}')
+        except OSError as e:
+            logger.warning(f'Could not remove {f} ({e})')
+        for k in [k for k, fname in _interpolators if fname == f]:
+            del _interpolators[k, f]
+
+#===Interpolation on the sphere===
+def lonlat_to_xyz(lon, lat) -> np.ndarray:
+    lon, lat = np.radians(lon), np.radians(lat)
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+def sphere_weights(lon, lat, target_lon, target_lat, chunk=2048) -> sparse.csr_matrix:
+    '''
+    Weights for linear interpolation over the spherical Delaunay triangulation of the samples,
+    which is the convex hull of their unit vectors. There is no seam at lon 0/360 and nothing special at the poles.
+    Targets outside the sampled area (if the samples don't surround the centre) get no weights
+    '''
+    #Repeated positions (lon 0 and 360, every lon at a pole) are averaged
+    unique, average = _merge_repeats(np.round(lonlat_to_xyz(lon, lat), 9))
+
+    hull = ConvexHull(unique)
+    normals, offsets = hull.equations[:, :3], hull.equations[:, 3]
+    #Facets with the centre on their outside span a gap in coverage
+    facets = np.flatnonzero(offsets < -1e-9)
+    normals, offsets = normals[facets], offsets[facets]
+
+    targets = lonlat_to_xyz(target_lon, target_lat)
+    rows, cols, vals = [], [], []
+    for start in range(0, len(targets), chunk):
+        d = targets[start:start+chunk]
+
+        #A ray from the centre along d crosses each facet plane at -offset/(normal.d).
+        #The first crossing is the facet containing d
+        facet = facets[np.argmax((d @ normals.T) / -offsets, axis=1)]
+        corners = unique[hull.simplices[facet]]
+        w = np.linalg.solve(corners.transpose(0, 2, 1), d[..., None])[..., 0]
+
+        inside = np.all(w > -1e-9, axis=1)
+        w = np.clip(w[inside], 0, None)
+        w /= w.sum(axis=1, keepdims=True)
+        rows.append(np.repeat(start + np.flatnonzero(inside), 3))
+        cols.append(hull.simplices[facet[inside]].ravel())
+        vals.append(w.ravel())
+
+    weights = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                shape=(len(targets), len(unique)))
+    return weights @ average
+
+def _merge_repeats(points):
+    '''Unique points, and the sparse matrix averaging sample values onto them'''
+    unique, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse)
+    average = sparse.csr_matrix((1 / counts[inverse], (inverse, np.arange(len(inverse)))),
+                                shape=(len(unique), len(points)))
+    return unique, average
+
+def healpix_plot_points(nside) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    (lon, lat) in degrees of the HEALPix pixel centres, plus points on each ring at lon 0 and 360
+    and along both poles, so a flat triangulation of them covers the whole map
+    '''
+    import healpy as hp
+    theta, phi = hp.pix2ang(nside, np.arange(hp.nside2npix(nside)))
+    lat = np.rad2deg(np.pi/2 - theta)
+    lon = np.rad2deg(phi)
+
+    rings = np.unique(lat)
+    pole_lon = np.linspace(0, 360, 13)
+    lon = np.concatenate([lon, np.zeros_like(rings), np.full_like(rings, 360), pole_lon, pole_lon])
+    lat = np.concatenate([lat, rings, rings, np.full_like(pole_lon, 90), np.full_like(pole_lon, -90)])
+    return lon, lat
+
+def healpix_interpolator(lon, lat, nside=32, cache_dir=None) -> WeightInterpolator:
+    '''Interpolator from samples at (lon, lat) in degrees onto healpix_plot_points(nside)'''
+    target_lon, target_lat = healpix_plot_points(nside)
+    return cached_interpolator(f'sphere{nside}', sphere_weights,
+                               lon, lat, target_lon, target_lat, cache_dir=cache_dir)
+
+#===Interpolation on a plane===
+def plane_weights(x, y, target_x, target_y) -> sparse.csr_matrix:
+    '''
+    Weights for linear interpolation over the Delaunay triangulation of the samples,
+    matching griddata(method='linear'). Targets outside the convex hull get no weights
+    '''
+    unique, average = _merge_repeats(np.column_stack([x, y]).astype(float))
+    delaunay = Delaunay(unique)
+
+    targets = np.column_stack([np.ravel(target_x), np.ravel(target_y)]).astype(float)
+    simplex = delaunay.find_simplex(targets)
+    inside = np.flatnonzero(simplex >= 0)
+
+    #Barycentric coordinates from the affine transform of each triangle
+    transform = delaunay.transform[simplex[inside]]
+    b = np.einsum('nij,nj->ni', transform[:, :2], targets[inside] - transform[:, 2])
+    w = np.column_stack([b, 1 - b.sum(axis=1)])
+
+    weights = sparse.csr_matrix((w.ravel(), (np.repeat(inside, 3), delaunay.simplices[simplex[inside]].ravel())),
+                                shape=(len(targets), len(unique)))
+    return weights @ average
+
+def grid_interpolator(x, y, target_x, target_y, cache_dir=None) -> WeightInterpolator:
+    '''Interpolator from samples at (x, y) onto the flattened target_x, target_y grid'''
+    return cached_interpolator('plane', plane_weights,
+                               x, y, target_x, target_y, cache_dir=cache_dir)
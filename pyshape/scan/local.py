@@ -0,0 +1,134 @@
+#Last modified 19/10/2026
+
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from rich.progress import Progress
+from .. import log_file
+from ..cli_config import logger, get_console
+from ..errors import MissingFileError
+from .scan_io import fit_complete
+from .watch import stop_hopeless
+from .stage import run_staged
+
+#Runs the fits of a scan on this machine rather than through SLURM (see launch_fitting.sbatch),
+#with the same modfiles/obsfiles/logfiles layout so rank, qplot and pplot work the same afterwards
+
+#Relative to the scan directory, as in launch_fitting.sbatch
+PAR_FILE = 'par/fpar'
+#Seconds between checks for hopeless fits (see watch.py)
+WATCH_INTERVAL = 10
+
+def available_cores() -> int:
+    '''Cores this process may use (respects taskset/cgroup limits where the OS reports them)'''
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def shape_command(ranks=1) -> list[str]:
+    '''shape, or pshape under mpirun when using more than one rank per fit'''
+    if ranks > 1:
+        return ['mpirun', '-n', str(ranks), 'pshape']
+    return ['shape']
+
+def fit_command(par, mod, obs, ranks=1) -> list[str]:
+    return [*shape_command(ranks), str(par), str(mod), str(obs)]
+
+def run_fit(fit_dir, namecore, par, ranks=1, procs=None, stage=None, mod=None) -> int:
+    '''
+    Runs one fit in fit_dir, writing logfiles/{namecore}.log. Returns the exit code.
+    While it runs, the process is kept in procs (by log file) if given, so it can be stopped early.
+    With stage (a directory, see stage.scratch_dir), the fit runs from a copy of its files in there.
+    mod is the model to start from, relative to fit_dir (default: modfiles/{namecore}.mod). Its fitted
+    model is moved to modfiles/{namecore}.mod.fit, where a fit from the default model writes it.
+    Fits that succeed get a runtime line at the end of their log (see log_file.runtime_line)
+    '''
+    fit_dir = Path(fit_dir)
+    log_path = fit_dir / 'logfiles' / f'{namecore}.log'
+    default_mod = Path('modfiles') / f'{namecore}.mod'
+    mod = Path(mod or default_mod)
+    start = time.monotonic()
+    if stage is not None:
+        returncode = run_staged(fit_dir, namecore, par, shape_command(ranks), stage, procs, mod)
+    else:
+        cmd = fit_command(par, f'./{mod.as_posix()}', f'./obsfiles/{namecore}.obs', ranks)
+        with open(log_path, 'w') as log:
+            proc = subprocess.Popen(cmd, cwd=fit_dir, stdout=log, stderr=subprocess.STDOUT)
+            if procs is not None:
+                procs[log_path] = proc
+            try:
+                returncode = proc.wait()
+            finally:
+                if procs is not None:
+                    procs.pop(log_path, None)
+    fitted = fit_dir / f'{mod}.fit'
+    if mod != default_mod and fitted.exists():
+        os.replace(fitted, fit_dir / f'{default_mod}.fit')
+    if returncode == 0:
+        with open(log_path, 'a') as log:
+            log.write(log_file.runtime_line(time.monotonic() - start, ranks))
+    return returncode
+
+def run_local(scan_dir, angle2s=(), jobs=None, ranks=1, watcher=None, namecore_file='namecores.txt', stage=None,
+              resume=False) -> list[tuple[Path, str]]:
+    '''
+    Runs every fit in scan_dir/namecore_file, or in each scan_dir/subscans/{angle2} if angle2s are given.
+    Fits run in a pool of jobs threads (each waits on a shape subprocess). By default this fills the
+    available cores with ranks cores per fit. With a watch.FitWatcher, hopeless fits are stopped early.
+    With stage, each fit runs from a copy of its files in that directory (see stage.py).
+    With resume, fits that already finished (see scan_io.fit_complete) are skipped, e.g. the other subscans of a namecore.
+    Returns the (directory, namecore) of fits that failed
+    '''
+    scan_dir = Path(scan_dir).resolve()
+    par = (scan_dir / PAR_FILE).resolve()
+    if not par.exists():
+        raise MissingFileError(f'Could not find {PAR_FILE} in {scan_dir}')
+    with open(scan_dir / namecore_file) as f:
+        namecores = [line.split()[0] for line in f if line.strip()]
+
+    fit_dirs = [scan_dir / 'subscans' / f'{int(a2):03d}' for a2 in angle2s] or [scan_dir]
+    fits = [(fit_dir, namecore) for namecore in namecores for fit_dir in fit_dirs]
+    if resume:
+        fits = [(fit_dir, namecore) for fit_dir, namecore in fits
+                if not fit_complete(fit_dir / 'logfiles' / f'{namecore}.log')]
+    jobs = jobs or max(1, available_cores() // ranks)
+    logger.info(f'Running {len(fits)} fits locally, {jobs} at a time with {ranks} rank(s) each')
+
+    failed, procs, stopped = [], {}, set()
+    with ThreadPoolExecutor(max_workers=jobs) as pool, \
+         Progress(console=get_console(), transient=True) as pb:
+        t1 = pb.add_task('Running fits', total=len(fits))
+        futures = {pool.submit(run_fit, fit_dir, namecore, par, ranks, procs, stage): (fit_dir, namecore)
+                   for fit_dir, namecore in fits}
+        running = set(futures)
+        while running:
+            finished, running = wait(running, timeout=WATCH_INTERVAL if watcher else None,
+                                     return_when=FIRST_COMPLETED)
+            for future in finished:
+                fit_dir, namecore = futures[future]
+                if check_fit(future, fit_dir, namecore, stopped):
+                    failed.append((fit_dir, namecore))
+                pb.update(task_id=t1, advance=1)
+            if watcher:
+                watcher.update(fit_dir / 'logfiles' / f'{namecore}.log' for fit_dir, namecore in
+                               (futures[future] for future in finished))
+                stop_hopeless(watcher, procs, stopped)
+
+    stopped_msg = f' ({len(stopped)} stopped early)' if watcher else ''
+    logger.info(f'Finished {len(fits) - len(failed)} of {len(fits)} fits{stopped_msg}')
+    return failed
+
+def check_fit(future, fit_dir, namecore, stopped=()) -> bool:
+    '''Logs why a finished fit failed. Returns True if it failed (fits stopped as hopeless don't count)'''
+    try:
+        returncode = future.result()
+    except OSError as e:
+        logger.warning(f'Could not run {namecore} in {fit_dir}: {e}')
+        return True
+    if returncode == 0 or Path(fit_dir) / 'logfiles' / f'{namecore}.log' in stopped:
+        return False
+    logger.warning(f'{namecore} in {fit_dir} exited with code {returncode}')
+    return True
@@ -2,23 +2,25 @@
 
 import argparse
 import logging
-import cartopy.crs as ccrs
-import cmasher as cmr
-import healpy as hp
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
-import matplotlib.tri as tri
 import numpy as np
-from scipy.interpolate import griddata
-from ..cli_config import logger, error_exit
-from ..utils import check_dir, check_type
+from functools import lru_cache
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import PyshapeError
+from ..utils import check_dir, check_type, plot_pool
 from . import scan_io
 
+#Plotting and interpolation modules (matplotlib, cartopy, healpy, scipy) are imported
+#in the functions that use them, so that -h and argument errors are fast
+
 def pub_gridscan(bet:np.array, lam:np.array, chi:np.array, 
-                cmp_array:list, cmp:str='magma', save=None):
+                cmp_array:list, cmp:str='magma', save=None, cache_dir=None, show=True):
+
+    import cartopy.crs as ccrs
+    import cmasher as cmr
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as mticker
 
-    lon_plot,lat_plot,chi_plot = _p_interpolate_chi_sphere(bet,lam,chi)
-    coords_plot = tri.Triangulation(lon_plot, lat_plot)
+    coords_plot,chi_plot = _p_interpolate_chi_sphere(bet,lam,chi, cache_dir=cache_dir)
 
     proj = ['N','S']
     ortho_N = ccrs.Orthographic(central_longitude=180,central_latitude=+90)
@@ -64,68 +66,83 @@ def pub_gridscan(bet:np.array, lam:np.array, chi:np.array,
         logger.debug(f'Saved pubplot to {save}')
         plt.savefig(f'{save}.jpg')
         plt.savefig(f'{save}.pdf')
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
         
     return 1
 
 
-def _p_interpolate_chi_sphere(bet,lam,chi, nside=32):
-    
-    #Duplicate values across from 0 to 360 degrees, for interpolation to be more complete
-    lam_new = np.ones(len(lam[lam==0]))*360
-    bet_new = bet[lam==0]
-    chi_new = chi[lam==0]
-    
-    bet = np.concatenate([bet,bet_new])
-    lam = np.concatenate([lam,lam_new])
-    chi = np.concatenate([chi,chi_new])
-    
-    #Interpolate onto spherical healpy grid
-    npix = hp.nside2npix(nside)
-
-    theta, phi = hp.pix2ang(nside, np.arange(npix))
-    lat = np.rad2deg(np.pi/2 - theta)   # latitude [-90, +90]
-    lon = np.rad2deg(phi)               # longitude [0, 360)
-
-    # interpolate onto HEALPix points
-    chiall = griddata(
-        np.column_stack([lam, bet]),        # input scattered coords
-        chi,                                # values at those coords
-        np.column_stack([lon, lat]),        # HEALPix coords
-        method='linear'
-    )
-
-    coords_lon = lon.copy()
-    coords_lat = lat.copy()
-    coords_chi = chiall.copy()
-
-    #Adds where initial scan was lon = 0
-    lon_wrap = np.concatenate([coords_lon, lam[lam==0]])
-    lat_wrap = np.concatenate([coords_lat, bet[lam==0]])
-    chi_wrap = np.concatenate([coords_chi, chi[lam==0]])
-    #Duplicate to 360
-    lon_wrap2 = np.concatenate([lon_wrap, lon_wrap[lon_wrap==0]+360])
-    lat_wrap2 = np.concatenate([lat_wrap, lat_wrap[lon_wrap==0]])
-    chi_wrap2 = np.concatenate([chi_wrap, chi_wrap[lon_wrap==0]])
-
-    #Pole values
-    minval = np.min(coords_chi)
-    lon_poles = np.concatenate([lam[bet==-90],lam[bet==90]])
-    lat_poles = np.concatenate([bet[bet==-90],bet[bet==90]])
-    chi_poles = np.concatenate([chi[bet==-90],chi[bet==90]])
-    # chi_poles = np.concatenate([chi[bet==-90],np.array([10,10])])
-
-    #plot arrays
-    lon_plot = np.concatenate([lon_wrap2, lon_poles])
-    lat_plot = np.concatenate([lat_wrap2, lat_poles])
-    chi_plot = np.concatenate([chi_wrap2, chi_poles])
-
-    #remove nans
-    lon_plot = lon_plot[~np.isnan(chi_plot)]
-    lat_plot = lat_plot[~np.isnan(chi_plot)]
-    chi_plot = chi_plot[~np.isnan(chi_plot)]
-
-    return lon_plot,lat_plot,chi_plot
+def _p_interpolate_chi_sphere(bet,lam,chi, nside=32, cache_dir=None):
+    '''
+    Interpolates chi onto a HEALPix grid directly on the sphere (see interp.healpix_interpolator).
+    Returns the flat (lon, lat) triangulation of the grid, with unsampled areas masked, and the grid's chi values
+    '''
+    import matplotlib.tri as tri
+    from . import interp
+    interpolator = interp.healpix_interpolator(lam, bet, nside, cache_dir=cache_dir)
+    chi_plot = interpolator(chi)
+
+    #Triangulation is the same for every call with this nside, only the mask changes
+    base = _plot_triangulation(nside)
+    mask = np.any(np.isnan(chi_plot[base.triangles]), axis=1)
+    coords_plot = tri.Triangulation(base.x, base.y, triangles=base.triangles, mask=mask)
+
+    return coords_plot,chi_plot
+
+@lru_cache
+def _plot_triangulation(nside):
+    import matplotlib.tri as tri
+    from . import interp
+    lon, lat = interp.healpix_plot_points(nside)
+    return tri.Triangulation(lon, lat)
+
+def _pub_inputs(lam, bet, chi, max_level):
+    '''Removes NaN fits and makes the colour levels'''
+    bet,lam = bet[~np.isnan(chi)],lam[~np.isnan(chi)]
+    chi = chi[~np.isnan(chi)]
+    cmp_array = np.linspace(np.min(chi),np.min(chi)*max_level,10)
+    return lam,bet,chi,cmp_array
+
+#===Batch plotting of angle2 subscans===
+def pub_subscans(scan_dir, fig_name, max_level=1.1, jobs=1):
+    '''
+    Plots every subscan of a run_grid --angle2-range polescan as {fig_name}_{angle2}, plus a
+    summary of the best chi-square against angle2. Subscans with the same pole layout share
+    interpolation weights (and the plot triangulation), saved in scan_dir/.interp
+    '''
+    from ..plotting import quick_routines as pq
+    from . import interp
+    results = scan_io.subscan_results(scan_dir)
+    if not results:
+        raise PyshapeError(f'No subscans in {scan_dir} have results')
+
+    tasks = []
+    for angle2, lam, bet, chi, _ in results:
+        lam, bet, chi, cmp_array = _pub_inputs(lam, bet, chi, max_level)
+        tasks.append(dict(bet=bet, lam=lam, chi=chi, cmp_array=cmp_array, cmp='cmr.sunburst',
+                          save=f'{fig_name}_{angle2:03d}', cache_dir=scan_dir, show=False))
+
+    logger.info(f'Plotting {len(tasks)} subscans')
+    if jobs == 1:
+        for task in tasks:
+            pub_gridscan(**task)
+    else:
+        #Weights for each distinct layout are made here once, and loaded by the workers
+        for task in tasks:
+            interp.healpix_interpolator(task['lam'], task['bet'], cache_dir=scan_dir)
+        with plot_pool(jobs) as pool:
+            list(pool.map(_pub_gridscan_task, tasks))
+
+    angle2, best_lam, best_bet, best_chi = scan_io.best_fits(results)
+    summary = f'{fig_name}_summary.jpg'
+    pq.quick_subscan_summary(angle2, best_lam, best_bet, best_chi,
+                             p1_label='Longitude', p2_label='Latitude', save=summary)
+    logger.info(f'Best fit at angle2 = {angle2[np.argmin(best_chi)]}. Summary saved to {summary}')
+
+def _pub_gridscan_task(task):
+    return pub_gridscan(**task)
 
 
 #===Functions for parsing args below this point===
@@ -145,6 +162,12 @@ def parse_args():
     plot_group.add_argument('--max-level', type=str,
                             help='Multiple of minimum chisqr that appears coloured on plot. Default 1.1')
 
+    subscan_group = parser.add_argument_group('Plotting all angle2 subscans (run_grid --angle2-range)')
+    subscan_group.add_argument('--subscans', action='store_true',
+                               help='Plot each subscans/NNN as {fig-name}_NNN, plus a summary of best chisqr against angle2')
+    subscan_group.add_argument('-j', '--jobs', default=1,
+                               help='Number of subscans to plot at once. Default 1')
+
     return parser.parse_args()
 
 def validate_args(args):
@@ -170,9 +193,15 @@ def validate_args(args):
         args.max_level = 1.1
     args.max_level = check_type(args.max_level,'--max-level',float) 
 
+    #Jobs
+    args.jobs = check_type(args.jobs,'--jobs',int)
+    if args.jobs < 1:
+        error_exit('--jobs must be at least 1')
+
     return args
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
@@ -180,17 +209,18 @@ def main():
 
 
     logger.debug(f'Scanning files in {args.dirname}')
-    lam,bet,chi,_ = scan_io.scan_results(args.dirname)
+    if args.subscans:
+        pub_subscans(args.dirname, args.fig_name, max_level=args.max_level, jobs=args.jobs)
+        return
 
-    bet,lam = bet[~np.isnan(chi)],lam[~np.isnan(chi)]
-    chi = chi[~np.isnan(chi)]
-    
-    cmp_array = np.linspace(np.min(chi),np.min(chi)*args.max_level,10)
+    lam,bet,chi,_ = scan_io.scan_results(args.dirname)
+    lam,bet,chi,cmp_array = _pub_inputs(lam,bet,chi,args.max_level)
     
     #Plot
     pub_gridscan(bet,lam,chi,
              cmp_array=cmp_array,
-             cmp='cmr.sunburst',save=args.fig_name)
+             cmp='cmr.sunburst',save=args.fig_name,
+             cache_dir=args.dirname)
 
 if __name__ == "__main__":
     main()
@@ -3,43 +3,37 @@
 import argparse
 import logging
 import numpy as np
-from scipy.interpolate import griddata
+from pathlib import Path
 from . import scan_io
-from ..plotting import quick_routines as pq
-from ..cli_config import logger, error_exit
-from ..utils import check_dir, check_type
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import PyshapeError
+from ..utils import check_dir, check_type, plot_pool
+
+#Plotting and interpolation modules (matplotlib, scipy) are imported
+#in the functions that use them, so that -h and argument errors are fast
 
 def config_quick_scan(p1: np.array, p2: np.array, chi: np.array,
                       p1_label: str = 'p1', p2_label: str = 'p2',
                       polescan: bool = False,
                       maxlevel: float = 1.5, lines: list = [],
-                      cmp: str = 'cmr.sunburst', save: str = None, show: bool = True):
+                      cmp: str = 'cmr.sunburst', save: str = None, show: bool = True,
+                      cache_dir=None):
+
+    from ..plotting import quick_routines as pq
 
-    p1, p2 = p1[~np.isnan(chi)], p2[~np.isnan(chi)]
-    chi = chi[~np.isnan(chi)]
+    p1, p2, chi, res = _prepare_quick_scan(p1, p2, chi, polescan)
 
     if polescan:
         logger.debug('Plotting polescan')
-        # Duplicate lam=0 values at 360 for interpolation continuity
-        p1_new = np.ones(len(p1[p1==0])) * 360
-        p2_new = p2[p1==0]
-        chi_new = chi[p1==0]
-        p1 = np.concatenate([p1, p1_new])
-        p2 = np.concatenate([p2, p2_new])
-        chi = np.concatenate([chi, chi_new])
         p1_label, p2_label = 'Latitude', 'Longitude'
         p1_ticks = np.arange(0, 361, 60)
         p2_ticks = np.arange(-90, 91, 30)
-        res=1
     else:
         logger.debug('Plotting gridscan')
         p1_ticks = None
         p2_ticks = None
-        p1_res = np.min(np.diff(np.unique(p1))) /2
-        p2_res = np.min(np.diff(np.unique(p2))) /2
-        res = np.min([p1_res,p2_res])
 
-    p1_grid, p2_grid, chi_grid = _q_interpolate_chi_grid(p1, p2, chi, res=res)
+    p1_grid, p2_grid, chi_grid = _q_interpolate_chi_grid(p1, p2, chi, res=res, cache_dir=cache_dir)
     minchi = np.nanmin(chi)
     logger.debug(f'Minchi = {minchi}')
 
@@ -51,24 +45,84 @@ def config_quick_scan(p1: np.array, p2: np.array, chi: np.array,
                    save=save, show=show)
 
 
+def _prepare_quick_scan(p1, p2, chi, polescan):
+    '''
+    Returns p1, p2, chi and the resolution of the interpolated grid. NaN (unfinished) fits are kept,
+    so the grid and interpolation weights stay the same as fits land
+    '''
+    p1, p2, chi = np.asarray(p1), np.asarray(p2), np.asarray(chi)
+
+    if polescan:
+        # Duplicate lam=0 values at 360 for interpolation continuity
+        p1_new = np.ones(len(p1[p1==0])) * 360
+        p2_new = p2[p1==0]
+        chi_new = chi[p1==0]
+        p1 = np.concatenate([p1, p1_new])
+        p2 = np.concatenate([p2, p2_new])
+        chi = np.concatenate([chi, chi_new])
+        res=1
+    else:
+        p1_res = np.min(np.diff(np.unique(p1))) /2
+        p2_res = np.min(np.diff(np.unique(p2))) /2
+        res = np.min([p1_res,p2_res])
+
+    return p1, p2, chi, res
+
+#===Batch plotting of angle2 subscans===
+def quick_subscans(scan_dir, fig_name, maxlevel=1.1, lines=None, jobs=1):
+    '''
+    Plots every subscan of a run_grid --angle2-range scan as {fig_name stem}_{angle2}, plus a
+    summary of the best chi-square against angle2. Subscans with the same layout share
+    interpolation weights, saved in scan_dir/.interp
+    '''
+    from ..plotting import quick_routines as pq
+    results = scan_io.subscan_results(scan_dir, unfinished=True)
+    if not results:
+        raise PyshapeError(f'No subscans in {scan_dir} have results')
+    fig_name = Path(fig_name)
+
+    tasks = []
+    for angle2, p1, p2, chi, polescan in results:
+        save = fig_name.with_name(f'{fig_name.stem}_{angle2:03d}{fig_name.suffix}')
+        tasks.append(dict(p1=p1, p2=p2, chi=chi, polescan=polescan,
+                          maxlevel=maxlevel, lines=lines, cmp='cmr.sunburst',
+                          save=save, show=False, cache_dir=scan_dir))
+
+    logger.info(f'Plotting {len(tasks)} subscans')
+    if jobs == 1:
+        for task in tasks:
+            config_quick_scan(**task)
+    else:
+        #Weights for each distinct layout are made here once, and loaded by the workers
+        for task in tasks:
+            p1, p2, chi, res = _prepare_quick_scan(task['p1'], task['p2'], task['chi'], task['polescan'])
+            _q_interpolate_chi_grid(p1, p2, chi, res=res, cache_dir=scan_dir)
+        with plot_pool(jobs) as pool:
+            list(pool.map(_config_quick_scan_task, tasks))
+
+    angle2, best_p1, best_p2, best_chi = scan_io.best_fits(results)
+    p1_label, p2_label = ('Longitude', 'Latitude') if results[0][4] else ('p1', 'p2')
+    summary = fig_name.with_name(f'{fig_name.stem}_summary{fig_name.suffix}')
+    pq.quick_subscan_summary(angle2, best_p1, best_p2, best_chi,
+                             p1_label=p1_label, p2_label=p2_label, save=summary)
+    logger.info(f'Best fit at angle2 = {angle2[np.argmin(best_chi)]}. Summary saved to {summary}')
+
+def _config_quick_scan_task(task):
+    return config_quick_scan(**task)
+
 #Quick interpolate does not use spherical interpolation
-def _q_interpolate_chi_grid(p1_arr,p2_arr,chi, res=1):
+#Weights for each set of sample points are kept in cache_dir/.interp, so replotting as chi values change is cheap.
+#NaN chi values are masked when the weights are applied
+def _q_interpolate_chi_grid(p1_arr,p2_arr,chi, res=1, cache_dir=None):
     
-    mask = ~np.isnan(chi)
-    p1_arr, p2_arr, chi = np.asarray(p1_arr)[mask], np.asarray(p2_arr)[mask], np.asarray(chi)[mask]
+    from . import interp
 
     p1_vals = np.arange(np.nanmin(p1_arr), np.nanmax(p1_arr) + res, res)
     p2_vals = np.arange(np.nanmin(p2_arr), np.nanmax(p2_arr) + res, res)
     p2_grid, p1_grid = np.meshgrid(p2_vals, p1_vals)
 
-    chi_grid = griddata(
-        points=np.column_stack((p1_arr, p2_arr)), 
-        values=chi,
-        xi=(p1_grid, p2_grid),
-        method="linear",
-        # fill_value=1e7,
-        fill_value=np.nan,
-    )
+    interpolator = interp.grid_interpolator(p1_arr, p2_arr, p1_grid, p2_grid, cache_dir=cache_dir)
+    chi_grid = interpolator(chi).reshape(p1_grid.shape)
 
     return p1_grid, p2_grid, chi_grid
     
@@ -88,6 +142,12 @@ def parse_args():
     plot_group.add_argument('--lines', nargs='*', type=float, default=None,
                             help='Additional contours to plot as percentages above minimum chi-sqr. e.g., --lines 1 2.5 5')
 
+    subscan_group = parser.add_argument_group('Plotting all angle2 subscans (run_grid --angle2-range)')
+    subscan_group.add_argument('--subscans', action='store_true',
+                               help='Plot each subscans/NNN as {fig-name}_NNN, plus a summary of best chisqr against angle2')
+    subscan_group.add_argument('-j', '--jobs', default=1,
+                               help='Number of subscans to plot at once. Default 1')
+
     return parser.parse_args()
 
 def validate_args(args):
@@ -115,11 +175,16 @@ def validate_args(args):
     #Lines
     if args.lines == []:
         args.lines = [1.0, 2.5, 5.0]
+    #Jobs
+    args.jobs = check_type(args.jobs,'--jobs',int)
+    if args.jobs < 1:
+        error_exit('--jobs must be at least 1')
 
     return args
 
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
@@ -127,12 +192,20 @@ def main():
 
     logger.debug(f'Scanning files in {args.dirname}')
 
-    p1, p2, chi, polescan_toggle = scan_io.scan_results(args.dirname)
+    if args.subscans:
+        quick_subscans(args.dirname, args.fig_name, maxlevel=args.max_level,
+                       lines=args.lines, jobs=args.jobs)
+        return
+
+    p1, p2, chi, polescan_toggle = scan_io.scan_results(args.dirname, unfinished=True)
+    if np.all(np.isnan(chi)):
+        raise PyshapeError(f'No fits in {args.dirname} have results')
 
     config_quick_scan(p1, p2, chi,
                       polescan=polescan_toggle,
                       maxlevel=args.max_level, lines=args.lines,
-                      cmp='cmr.sunburst', show=False, save=args.fig_name)
+                      cmp='cmr.sunburst', show=False, save=args.fig_name,
+                      cache_dir=args.dirname)
 
 if __name__ == "__main__":
     main()
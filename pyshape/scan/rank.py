@@ -1,6 +1,7 @@
-#Last modified 06/04/2026
+#Last modified 19/10/2026
 
-from ..cli_config import logger, error_exit, safe_exit
+from ..cli_config import logger, error_exit, safe_exit, cli_main
+from ..errors import MissingFileError
 from ..utils import check_type
 from .. import log_file
 from pathlib import Path
@@ -13,7 +14,8 @@ import logging
 
 def rank(dirname:Path, top:int = 5, chi_type:str = 'ALLDATA', percent:bool = False, delete:bool = False):
     
-    log_files = sorted(dirname.glob('*'))
+    #Only the last log of a fit continued after a time limit (earlier parts are *.log.1, *.log.2, ...)
+    log_files = sorted(dirname.glob('*.log'))
 
     results = []
     for log in log_files:
@@ -27,7 +29,7 @@ def rank(dirname:Path, top:int = 5, chi_type:str = 'ALLDATA', percent:bool = Fal
     results.sort()
 
     if not results:
-        error_exit(f'No valid log files found in {dirname}')
+        raise MissingFileError(f'No valid log files found in {dirname}')
 
     if percent:
         chi_cut = results[0][0] * (1 + top / 100)
@@ -46,7 +48,7 @@ def rank(dirname:Path, top:int = 5, chi_type:str = 'ALLDATA', percent:bool = Fal
 
         namecores_path = dirname.parent / 'namecores.txt'
         if not namecores_path.exists():
-            error_exit(f'Could not find namecores.txt in {dirname.parent}')
+            raise MissingFileError(f'Could not find namecores.txt in {dirname.parent}')
 
         #Delete not selected
         not_selected = [(chi, log) for chi, log in results if log.stem not in selected_stems]
@@ -55,6 +57,7 @@ def rank(dirname:Path, top:int = 5, chi_type:str = 'ALLDATA', percent:bool = Fal
             parent = log.parent.parent  #Avoids using str replace
             shape_files = [
                 log,
+                *sorted(log.parent.glob(f'{log.name}.*')),
                 parent / 'obsfiles' / f'{log.stem}.obs',
                 parent / 'modfiles' / f'{log.stem}.mod',
             ]
@@ -147,6 +150,7 @@ def validate_args(args):
     return args
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
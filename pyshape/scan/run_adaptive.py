@@ -0,0 +1,202 @@
+#Last modified 19/10/2026
+
+import argparse
+import logging
+from pathlib import Path
+import numpy as np
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import ShapeRunError
+from ..utils import check_type
+from . import scan_io, slurm, local
+from .combine import combine_gridscan
+from .run_grid import setup_grid_scan, create_polescan_lists
+from .sampling import angular_distance
+
+#python -m pyshape.scan.run_adaptive -ps -90 90 20 0 360 20 --target 5 --backend local
+#python -m pyshape.scan.run_adaptive -ps -90 90 20 0 360 20 --target 5 --threshold 5 --pack 4
+
+#Each refinement level is a polescan in here, combined into the current directory at the end
+LEVEL_DIR = 'levels'
+
+def level_steps(start, target, factor=2, span=180) -> list[int]:
+    '''
+    Grid steps of each level, e.g. 20, 10, 5. Steps are whole degrees (as they are in namecores)
+    that divide the beta span, so every level has the same rings of latitude as the finest
+    '''
+    steps = [start]
+    while steps[-1] > target:
+        divisors = [d for d in range(target, int(steps[-1] / factor) + 1) if span % d == 0]
+        steps.append(max(divisors, default=target))
+    return steps
+
+def refine_points(lat, lon, chi, cand_lat, cand_lon, radius, threshold) -> np.ndarray:
+    '''
+    Mask of candidate points within radius degrees of a fit with chi within threshold percent of the minimum,
+    which aren't already one of the fit points
+    '''
+    good = np.nan_to_num(chi, nan=np.inf) <= np.nanmin(chi) * (1 + threshold / 100)
+    near = angular_distance(cand_lat, cand_lon, lat[good], lon[good]) <= radius + 1e-6
+    done = angular_distance(cand_lat, cand_lon, lat, lon) < 1e-6
+    return near.any(axis=1) & ~done.any(axis=1)
+
+def polescan_points(args, step) -> tuple[np.ndarray, np.ndarray]:
+    '''(angle1, angle0) of a polescan over the requested range with this step in beta and lambda'''
+    return create_polescan_lists(args.param1.min, args.param1.max, step,
+                                 args.param2.min, args.param2.max, step)
+
+def run_level(level_dir, args, points) -> int:
+    '''Writes the files for points into level_dir and runs them to completion'''
+    for sub in ('modfiles', 'obsfiles', 'logfiles'):
+        Path(f'{level_dir}/{sub}').mkdir(parents=True, exist_ok=True)
+    #Fits read ./par/fpar from where they run
+    if not (level_dir / 'par').exists():
+        (level_dir / 'par').symlink_to(Path.cwd() / 'par')
+
+    no_files = setup_grid_scan(args.param1, args.param2, args.mod_template, args.obs_template,
+                               level_dir, args.angle2, points=points)
+    if args.backend == 'local':
+        local.run_local(level_dir, jobs=args.jobs, ranks=args.ranks or 1)
+    else:
+        slurm.submit_scan(level_dir, manage=True, pack=args.pack, cores_per_fit=args.ranks)
+    return no_files
+
+def run_adaptive_scan(args):
+
+    cwd = Path.cwd()
+    steps = level_steps(args.param1.step, args.target, args.factor, args.param1.max - args.param1.min)
+
+    angle1, angle0 = polescan_points(args, steps[0])
+    scan_io.check_no_files(len(angle1), args.backend)
+    if len(steps) > 1:
+        logger.info(f'Then refining with steps {", ".join(map(str, steps[1:]))} around fits within {args.threshold}% of the best')
+
+    level_dirs = []
+    lam, bet, chi = np.array([]), np.array([]), np.array([])
+    for level, step in enumerate(steps):
+        level_dir = cwd / LEVEL_DIR / f'{level:02d}'
+        if level > 0:
+            angle1, angle0 = polescan_points(args, step)
+            keep = refine_points(bet, lam, chi, 90 - angle1, (angle0 - 90) % 360,
+                                 radius=steps[level-1], threshold=args.threshold)
+            angle1, angle0 = angle1[keep], angle0[keep]
+            if not len(angle1):
+                logger.info(f'Nothing left to refine at step {step}')
+                break
+
+        logger.info(f'Level {level}: {len(angle1)} fits with a step of {step} degrees')
+        run_level(level_dir, args, (angle1, angle0))
+        level_dirs.append(level_dir)
+
+        level_lam, level_bet, level_chi, _ = scan_io.scan_results(level_dir)
+        lam, bet, chi = (np.concatenate(pair) for pair in [(lam, level_lam), (bet, level_bet), (chi, level_chi)])
+        if np.all(np.isnan(chi)):
+            raise ShapeRunError(f'No fits finished in {level_dir}. Check its logfiles')
+        logger.info(f'Best so far: lam {lam[np.nanargmin(chi)]:.0f}, bet {bet[np.nanargmin(chi)]:.0f} : {np.nanmin(chi)}')
+
+    #Full scan in the current directory, for qplot/pplot/rank
+    combine_gridscan(level_dirs, cwd)
+    full_grid = len(polescan_points(args, steps[-1])[0])
+    logger.info(f'Ran {len(chi)} fits over {len(level_dirs)} levels (a full scan at step {steps[-1]} is {full_grid} fits)')
+
+#===Functions for parsing args===
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Polescan that starts coarse and refines only around the best fits",
+                                     epilog=f"Each level is saved in ./{LEVEL_DIR}, and all levels are combined into the current directory at the end")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose output (sets log level to DEBUG)")
+
+    polescan_group = parser.add_argument_group("Polescan")
+    polescan_group.add_argument('-ps', '--polescan', nargs=6, required=True, metavar=('BMIN', 'BMAX', 'BSTEP', 'LMIN', 'LMAX', 'LSTEP'),
+                                help="Beta/lambda min, max, step as 6 integers. The steps are for the coarse level, and must be equal")
+    polescan_group.add_argument('-a2', '--angle2', type=str, default='0',
+                                help='Set angle2 (degrees) for all files. Default: 0')
+
+    refine_group = parser.add_argument_group("Refinement")
+    refine_group.add_argument('--target', type=str, required=True,
+                              help="Step (degrees) of the finest level")
+    refine_group.add_argument('--threshold', type=str, default='10',
+                              help="Refine around fits within this percent of the best chi-square. Default: 10")
+    refine_group.add_argument('--factor', type=str, default='2',
+                              help="Step is divided by this at each level. Default: 2")
+
+    file_group = parser.add_argument_group("Optional file inputs. Defaults to [type].template")
+    file_group.add_argument("-mod", "--mod-template", type=Path, default=Path('./mod.template'),
+                            help="The template mod file. Will keep f/c state and freeze new param value")
+    file_group.add_argument("-obs", "--obs-template", type=Path, default=Path('./obs.template'),
+                            help="The template obs file. Will not be changed")
+
+    run_group = parser.add_argument_group("Running fits. Each level waits for its fits to finish")
+    run_group.add_argument("--backend", choices=['slurm', 'local'], default='slurm',
+                           help="Run each level through SLURM (managed) or on this machine. Default: slurm")
+    run_group.add_argument("-j", "--jobs", type=str, default=None,
+                           help="(local) Number of fits to run at once. Default: available cores / --ranks")
+    run_group.add_argument("--ranks", "--cores-per-fit", type=str, default=None,
+                           help="MPI ranks (cores) per fit. Default: 1 locally, 8 on slurm")
+    run_group.add_argument("--pack", type=str, default='1',
+                           help="(slurm) Fits per array task, run at the same time. Default: 1")
+
+    return parser.parse_args()
+
+def validate_args(args):
+
+    #Check verbose
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('Verbose: Set level to DEBUG')
+
+    bet_info = ['spin','angle1',*args.polescan[:3]]
+    lam_info = ['spin','angle0',*args.polescan[3:]]
+    args.param1 = scan_io.check_scan_param_vals(bet_info, int)
+    args.param2 = scan_io.check_scan_param_vals(lam_info, int)
+    if args.param1.min < -90 or args.param1.max > 90:
+        error_exit('Invalid range for beta ( -90 =< bet =< 90)')
+    if args.param2.min < 0 or args.param2.max > 360:
+        error_exit('Invalid range for lambda ( 0 =< lam =< 360)')
+    if args.param1.step != args.param2.step:
+        error_exit('Beta and lambda steps must be the same')
+
+    args.angle2 = check_type(args.angle2, '--angle2', int)
+    args.target = check_type(args.target, '--target', int)
+    args.threshold = check_type(args.threshold, '--threshold', float)
+    args.factor = check_type(args.factor, '--factor', float)
+    if not 0 < args.target <= args.param1.step:
+        error_exit('--target must be between 0 and the coarse step')
+    if args.factor <= 1:
+        error_exit('--factor must be greater than 1')
+    span = args.param1.max - args.param1.min
+    if span % args.param1.step or span % args.target:
+        error_exit(f'The step and --target must divide the beta range ({span})')
+
+    if not args.mod_template.exists():
+        error_exit(f"Mod template not found: {args.mod_template}")
+    if not args.obs_template.exists():
+        error_exit(f"Obs template not found: {args.obs_template}")
+    args.mod_template = args.mod_template.resolve()
+    args.obs_template = args.obs_template.resolve()
+    if not Path('par/fpar').exists():
+        error_exit('Could not find par/fpar')
+
+    args.ranks = check_type(args.ranks, '--ranks', int) if args.ranks else None
+    args.jobs = check_type(args.jobs, '--jobs', int) if args.jobs else None
+    args.pack = check_type(args.pack, '--pack', int)
+    if (args.ranks is not None and args.ranks < 1) or (args.jobs is not None and args.jobs < 1) or args.pack < 1:
+        error_exit('--jobs, --ranks and --pack must be at least 1')
+
+    return args
+
+#===Main===
+@cli_main
+def main():
+
+    args = parse_args()
+    args = validate_args(args)
+
+    logger.info(f'Using templates: {args.mod_template} and {args.obs_template}')
+
+    run_adaptive_scan(args)
+
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -4,38 +4,45 @@ import argparse
 from dataclasses import fields
 import logging
 import shutil
-import subprocess
 from pathlib import Path
 import numpy as np
 from rich.progress import Progress
 from ..mod.mod_io import modFile
-from ..cli_config import logger, error_exit, console
-from . import scan_io
+from ..cli_config import logger, error_exit, get_console, cli_main
+from ..errors import InputError
+from ..utils import check_type
+from . import scan_io, slurm, local, sampling, wavefront, watch, cost
 
 #python -m pyshape.scan.run_grid -ps -90 90 10 0 360 10 -mod mod.h.template -obs obs.h.template
 #python -m pyshape.scan.run_grid -ps -90 90 10 0 360 10 -a2r 0 355 5
+#python -m pyshape.scan.run_grid -ps -90 90 5 0 360 5 --backend local --warm-start
+#python -m pyshape.scan.run_grid -ps -90 90 10 0 360 10 --resume (after a time limit or node failure)
+#python -m pyshape.scan.run_grid -ps -90 90 10 0 360 10 --auto-resources --history ../previous_scan
 #non polescan grid searches are untested but should work. Let me know if not
 #This code is very slow when doing at many angles
 
 def run_grid_scan(args):
         
     cwd = Path.cwd()
+
+    #Near-uniform poles replace the rings of create_polescan_lists
+    points = None
+    if args.polescan and args.sampling != 'legacy':
+        points = sampling.pole_directions(args.sampling, args.param1.min, args.param1.max,
+                                          args.param2.min, args.param2.max, args.param1.step)
     
     if not args.angle2_range:
         
-        Path(f'{cwd}/modfiles').mkdir(exist_ok=True)
-        Path(f'{cwd}/obsfiles').mkdir(exist_ok=True)
-        Path(f'{cwd}/logfiles').mkdir(exist_ok=True)
-
-        no_files = setup_grid_scan(args.param1, args.param2,
-                                   args.mod_template, args.obs_template,
-                                   cwd,args.angle2)
-        
-        scan_io.check_no_files(no_files)
+        a2_strs = []
+        #Resuming keeps the files of the previous run
+        if not (args.resume and (cwd / 'namecores.txt').exists()):
+            Path(f'{cwd}/modfiles').mkdir(exist_ok=True)
+            Path(f'{cwd}/obsfiles').mkdir(exist_ok=True)
+            Path(f'{cwd}/logfiles').mkdir(exist_ok=True)
 
-        script_dir = Path(__file__).resolve().parents[2]
-        subprocess.run(["sbatch", f"--array=1-{no_files}", f'{script_dir}/launch_fitting.sbatch'])
-        logger.info(f'Submitted SLURM array jobs 1-{no_files}')
+            setup_grid_scan(args.param1, args.param2,
+                            args.mod_template, args.obs_template,
+                            cwd,args.angle2,points)
 
     elif args.angle2_range:
         
@@ -46,43 +53,80 @@ def run_grid_scan(args):
         #Angle 2 list
         a2_min,a2_max,a2_step = args.angle2_range.min, args.angle2_range.max, args.angle2_range.step
         a2_list = np.arange(a2_min,a2_max+a2_step,a2_step)
+        a2_strs = [str(angle) for angle in a2_list]
+        subdirs = [f'{cwd}/subscans/{a2:03d}' for a2 in a2_list]
         
         #Make directories
-        with Progress(console=console,transient=True) as pb:
-            t1 = pb.add_task('Creating subscan directories',total=len(a2_list))
-            
-            for a2 in a2_list:
-                #Create a2 directory in subscans
-                subdir = f'{cwd}/subscans/{a2:03d}'
-                Path(subdir).mkdir(exist_ok=True)
-                Path(f'{subdir}/modfiles').mkdir(exist_ok=True)
-                Path(f'{subdir}/obsfiles').mkdir(exist_ok=True)
-                Path(f'{subdir}/logfiles').mkdir(exist_ok=True)
+        if not (args.resume and all(Path(f'{subdir}/namecores.txt').exists() for subdir in subdirs)):
+            with Progress(console=get_console(),transient=True) as pb:
+                t1 = pb.add_task('Creating subscan directories',total=len(a2_list))
+                
+                for a2, subdir in zip(a2_list, subdirs):
+                    #Create a2 directory in subscans
+                    Path(subdir).mkdir(exist_ok=True)
+                    Path(f'{subdir}/modfiles').mkdir(exist_ok=True)
+                    Path(f'{subdir}/obsfiles').mkdir(exist_ok=True)
+                    Path(f'{subdir}/logfiles').mkdir(exist_ok=True)
 
-                logging.info(f'Creating files in {subdir}')
+                    logging.info(f'Creating files in {subdir}')
 
-                no_files = setup_grid_scan(args.param1, args.param2,
+                    setup_grid_scan(args.param1, args.param2,
                                     args.mod_template, args.obs_template,
-                                    subdir, a2)  
-                
-                pb.update(task_id=t1,advance=1)         
+                                    subdir, a2, points)  
+                    
+                    pb.update(task_id=t1,advance=1)         
 
-        shutil.copy(f'{subdir}/namecores.txt', f'{cwd}/namecores.txt')
-        scan_io.check_no_files(no_files)
-
-        a2_strs = [str(angle) for angle in a2_list]
-        script_dir = Path(__file__).resolve().parents[2]
-        subprocess.run(["sbatch", f"--array=1-{no_files}", f'{script_dir}/launch_fitting.sbatch', ' '.join(a2_strs)])
-        logger.info(f'Submitted SLURM array jobs 1-{no_files}')
-        
+            shutil.copy(f'{subdir}/namecores.txt', f'{cwd}/namecores.txt')
 
     else:
         error_exit('This message shouldnt appear so its time to cry')
 
+    run_fits(args, cwd, a2_strs)
+
     return
 
+def run_fits(args, cwd, a2_strs=()):
+    '''
+    Runs the fits of the scan in cwd with the chosen backend. With --resume, only fits that have not finished
+    (see scan_io.fit_complete): on SLURM fits cut off by the time limit carry on from their latest model, and
+    with subscans only the unfinished subscans of a namecore run. Fits stopped by --stop-margin never finished,
+    so they run again (from the start) and are judged again against the best fit of the resumed scan
+    '''
+    watcher = watch.FitWatcher(args.stop_margin) if args.stop_margin is not None else None
+
+    namecore_file = 'namecores.txt'
+    with open(cwd / namecore_file) as f:
+        no_files = sum(1 for line in f if line.strip())
+    if args.resume:
+        todo = scan_io.incomplete_namecores(cwd, a2_strs)
+        if not todo:
+            logger.info(f'All {no_files} fits already have a chi-square. Nothing to resume')
+            return
+        logger.info(f'Resuming {len(todo)} of {no_files} fits. The rest already have a chi-square')
+        no_files = len(todo)
+        #The wavefront skips finished fits itself, as they seed their neighbours
+        if not args.warm_start:
+            namecore_file = scan_io.write_resume_file(cwd, todo)
+
+    scan_io.check_no_files(no_files, args.backend)
+
+    if args.warm_start:
+        wavefront.run_wavefront(cwd, a2_strs, jobs=args.jobs, ranks=args.ranks or 1, seeds=args.seeds,
+                                watcher=watcher, resume=args.resume, stage=args.stage)
+    elif args.backend == 'local':
+        local.run_local(cwd, a2_strs, jobs=args.jobs, ranks=args.ranks or 1, watcher=watcher,
+                        namecore_file=namecore_file, stage=args.stage, resume=args.resume)
+    else:
+        resources = None
+        if args.auto_resources:
+            resources = cost.estimate_scan(cwd, args.history, a2_strs, namecore_file, cores=args.ranks)
+        slurm.submit_scan(cwd, a2_strs, manage=args.manage, pack=args.pack, cores_per_fit=args.ranks,
+                          watcher=watcher, namecore_file=namecore_file, stage=args.stage, resources=resources,
+                          continuation=args.resume)
+
 #===Pole/Gridscan setup===
-def setup_grid_scan(p1,p2,mod_template,obs_template,outf,angle2=0):
+def setup_grid_scan(p1,p2,mod_template,obs_template,outf,angle2=0,points=None):
+    '''Writes a mod and obs file for each grid point. points=(p1_vals, p2_vals) writes only those points instead'''
 
     mod_info = modFile.from_file(mod_template)
 
@@ -101,15 +145,18 @@ def setup_grid_scan(p1,p2,mod_template,obs_template,outf,angle2=0):
     p2_owner = owner_map.get(p2.location)
 
     if p1_owner is None:
-        error_exit(f'Unknown target "{p1.location}"')
+        raise InputError(f'Unknown target "{p1.location}"')
     if p2_owner is None:
-        error_exit(f'Unknown target "{p2.location}"')
+        raise InputError(f'Unknown target "{p2.location}"')
 
     param_names = [p1.name, p2.name]
 
     #Creates grid of values
     polescan_location_check = p1.location == 'spin' and p2.location == 'spin'
-    if polescan_location_check and param_names == ['angle1', 'angle0']:
+    polescan = polescan_location_check and sorted(param_names) == ['angle0', 'angle1']
+    if points is not None:
+        p1_vals, p2_vals = points
+    elif polescan_location_check and param_names == ['angle1', 'angle0']:
         p1_vals,p2_vals = create_polescan_lists(p1.min,p1.max,p1.step,p2.min,p2.max,p2.step)
         polescan = True
     elif polescan_location_check and param_names == ['angle0','angle1']:
@@ -140,10 +187,8 @@ def setup_grid_scan(p1,p2,mod_template,obs_template,outf,angle2=0):
 
             #Write new file
             if polescan:
-                bet = 90 - p1_val
-                lam = (p2_val - 90) % 360
-                namecore = f'lat{bet:+03d}lon{lam:03d}'
-                namecores.write(f'{namecore} {lam:+03d} {bet:03d}\n')  # lam/bet in wrong order as x axis val comes first
+                namecore, pole = polescan_namecore(90 - p1_val, (p2_val - 90) % 360)
+                namecores.write(f'{namecore} {pole}\n')  # lam/bet in wrong order as x axis val comes first
             else:
                 namecore = f'{p1.location}{p1.name}{p1_val:+.3f}{p2.location}{p2.name}{p2_val:+.3f}'
                 namecores.write(f'{namecore} {p1_val:+.3f} {p2_val:+.3f}\n')
@@ -154,6 +199,14 @@ def setup_grid_scan(p1,p2,mod_template,obs_template,outf,angle2=0):
     no_files = len(p1_vals)
     return no_files
 
+def polescan_namecore(bet, lam) -> tuple[str, str]:
+    '''Namecore and "lam bet" of a pole. Whole degrees keep the original format, others get one decimal place'''
+    bet, lam = round(float(bet), 1), round(float(lam), 1)
+    if bet.is_integer() and lam.is_integer():
+        bet, lam = int(bet), int(lam)
+        return f'lat{bet:+03d}lon{lam:03d}', f'{lam:+03d} {bet:03d}'
+    return f'lat{bet:+05.1f}lon{lam:05.1f}', f'{lam:.1f} {bet:+.1f}'
+
 def create_polescan_lists(bet_min,bet_max,bet_step,lam_min,lam_max,lam_step):
     #Bet values can be linear as all lines of longitude are great circles
     bet_array = np.arange(bet_min,bet_max+bet_step,bet_step)
@@ -217,6 +270,8 @@ Valid LOCs: rs* os* spin shape*''')
                             help="Polescan mode: provide beta/lambda min, max, step as 6 integers")
     polescan_group.add_argument('-a2', '--angle2', type=int, default=None,
                             help='Set angle2 (float, degrees) for all files. Default: 0')
+    polescan_group.add_argument('--sampling', choices=sampling.SAMPLINGS, default='legacy',
+                            help="How poles are spread. healpix and fibonacci are near-uniform, with BSTEP as the resolution (LSTEP is unused). Default: legacy")
     polescan_group.add_argument('-a2r', '--angle2-range', nargs=3, metavar=('START', 'END', 'STEP'),
                             help="Run for a range of angle2 values (instead of --angle2).")
 
@@ -227,6 +282,32 @@ Valid LOCs: rs* os* spin shape*''')
     file_group.add_argument("-obs", "--obs-template", type=Path, default=Path('./obs.template'),
                             help="The template obs file. Will not be changed")
 
+    run_group = parser.add_argument_group("Running fits")
+    run_group.add_argument("--backend", choices=['slurm', 'local'], default='slurm',
+                           help="Submit an array job to SLURM, or run the fits on this machine. Default: slurm")
+    run_group.add_argument("--manage", action="store_true",
+                           help="(slurm) Stay running until every fit is done, resubmitting failures (see pyshape.scan.slurm)")
+    run_group.add_argument("-j", "--jobs", type=str, default=None,
+                           help="(local) Number of fits to run at once. Default: available cores / --ranks")
+    run_group.add_argument("--ranks", "--cores-per-fit", type=str, default=None,
+                           help="MPI ranks (cores) per fit. Locally, above 1 runs pshape with mpirun. Default: 1 locally, 8 on slurm")
+    run_group.add_argument("--pack", type=str, default='1',
+                           help="(slurm) Fits per array task, run at the same time. Use for short fits to cut queueing. Default: 1")
+    run_group.add_argument("--auto-resources", action="store_true",
+                           help="(slurm) Ask for cores, memory and time per fit from the runtimes of past fits, rather than the defaults of launch_fitting.sbatch (see pyshape.scan.cost). --ranks fixes the cores")
+    run_group.add_argument("--history", nargs='+', type=Path, default=None,
+                           help="(--auto-resources) Scan directories whose finished fits calibrate the estimate. Default: this scan (with --resume)")
+    run_group.add_argument("--warm-start", action="store_true",
+                           help="(local, polescan) Spread fits outwards from seed poles, starting each from its best finished neighbour's fitted model (see pyshape.scan.wavefront)")
+    run_group.add_argument("--stage", nargs='?', const='$TMPDIR', default=None, metavar='DIR',
+                           help="Run each fit from a copy of its files in node-local storage, e.g. /dev/shm (see pyshape.scan.stage). Default DIR: $TMPDIR on the node")
+    run_group.add_argument("--resume", action="store_true",
+                           help="Keep the files of a previous run here, and only run fits that have not finished. On SLURM, fits cut off by the time limit carry on from their latest model. Fits stopped by --stop-margin run again")
+    run_group.add_argument("--stop-margin", type=str, default=None,
+                           help="(local, or slurm with --manage) Stop fits that can no longer get within this percent of the best chi-square (see pyshape.scan.watch)")
+    run_group.add_argument("--seeds", type=str, default=None,
+                           help="(--warm-start) Number of seed poles started from the template. Default: --jobs")
+
     return parser.parse_args()
 
 def validate_args(args):
@@ -245,6 +326,8 @@ def validate_args(args):
         #Dont let angles be called
         if args.angle2_range or args.angle2:
             error_exit('Cannot use --angle2 or --angle2-range outside of --polescan mode')
+        if args.sampling != 'legacy':
+            error_exit('Cannot use --sampling outside of --polescan mode')
         
         args.param1 = scan_io.check_scan_param_vals(args.param1,float)
         args.param2 = scan_io.check_scan_param_vals(args.param2,float)
@@ -271,6 +354,9 @@ def validate_args(args):
         args.param1 = scan_io.check_scan_param_vals(bet_info, int)
         args.param2 = scan_io.check_scan_param_vals(lam_info, int)
 
+        if args.sampling != 'legacy' and args.param1.step != args.param2.step:
+            logger.warning(f'Using BSTEP ({args.param1.step}) as the resolution. LSTEP is ignored with --sampling {args.sampling}')
+
         #Ranges of lam and bet
         if args.param1.min < -90 or args.param1.max > 90:
             error_exit('Invalid range for beta ( -90 =< bet =< 90)')
@@ -291,9 +377,40 @@ def validate_args(args):
     args.mod_template = args.mod_template.resolve()
     args.obs_template = args.obs_template.resolve()
 
+    #Check fit running options
+    args.ranks = check_type(args.ranks, '--ranks', int) if args.ranks else None
+    args.jobs = check_type(args.jobs, '--jobs', int) if args.jobs else None
+    if (args.ranks is not None and args.ranks < 1) or (args.jobs is not None and args.jobs < 1):
+        error_exit('--jobs and --ranks must be at least 1')
+    if args.manage and args.backend != 'slurm':
+        error_exit('--manage is only used with --backend slurm')
+    args.pack = check_type(args.pack, '--pack', int)
+    if args.pack < 1:
+        error_exit('--pack must be at least 1')
+    if args.pack > 1 and args.backend != 'slurm':
+        error_exit('--pack is only used with --backend slurm')
+    args.stop_margin = check_type(args.stop_margin, '--stop-margin', float) if args.stop_margin else None
+    if args.stop_margin is not None and (args.stop_margin < 0 or (args.backend == 'slurm' and not args.manage)):
+        error_exit('--stop-margin must be at least 0, and needs --manage with slurm (or run python -m pyshape.scan.watch)')
+    if args.stage and args.stop_margin is not None:
+        error_exit('--stop-margin cannot be used with --stage, as logs are only copied back when a fit ends')
+    if args.auto_resources and args.backend != 'slurm':
+        error_exit('--auto-resources is only used with --backend slurm')
+    if args.history and not args.auto_resources:
+        error_exit('--history is only used with --auto-resources')
+    for d in args.history or []:
+        if not d.is_dir():
+            error_exit(f'Scan directory not found: {d}')
+    args.seeds = check_type(args.seeds, '--seeds', int) if args.seeds else None
+    if args.warm_start and (args.backend != 'local' or not args.polescan):
+        error_exit('--warm-start is only used with --polescan and --backend local')
+    if args.seeds is not None and (not args.warm_start or args.seeds < 1):
+        error_exit('--seeds must be at least 1 and is only used with --warm-start')
+
     return args
 
 #===Main===
+@cli_main
 def main():
 
     args = parse_args()
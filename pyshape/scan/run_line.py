@@ -3,13 +3,14 @@
 import argparse
 import dataclasses
 import logging
-import os
 import shutil
-import subprocess
 from pathlib import Path
 import numpy as np
-from ..cli_config import logger, error_exit
-from .. import utils, mod
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import InputError
+from .. import mod
+from ..utils import check_type
+from . import scan_io, slurm, local
 
 #python -m line_scan -z 0.9 1.1 0.02
 #non polescan line searches are untested but should work. Let me know if not
@@ -43,10 +44,10 @@ def line_scan_setup(p,mod_template,obs_template,outf):
             break
 
     if param_owner_index == None:
-        error_exit(f'Could not match param {p.name} to a dataclass')
+        raise InputError(f'Could not match param {p.name} to a dataclass')
 
     if param_owner_index == 0 and len(components) != 1:
-        error_exit('Expected a single component when scanning over shape parameter')
+        raise InputError('Expected a single component when scanning over shape parameter')
 
 
     #Create files
@@ -97,6 +98,16 @@ def parse_args():
     file_group.add_argument("-obs", "--obs-template", type=Path, default=Path('./obs.template'),
                             help="The template obs file. Will not be changed")
 
+    run_group = parser.add_argument_group("Running fits")
+    run_group.add_argument("--backend", choices=['slurm', 'local'], default='slurm',
+                           help="Submit an array job to SLURM, or run the fits on this machine. Default: slurm")
+    run_group.add_argument("--manage", action="store_true",
+                           help="(slurm) Stay running until every fit is done, resubmitting failures (see pyshape.scan.slurm)")
+    run_group.add_argument("-j", "--jobs", type=str, default=None,
+                           help="(local) Number of fits to run at once. Default: available cores / --ranks")
+    run_group.add_argument("--ranks", "--cores-per-fit", type=str, default=None,
+                           help="MPI ranks (cores) per fit. Locally, above 1 runs pshape with mpirun. Default: 1 locally, 8 on slurm")
+
     return parser.parse_args()
 
 def validate_args(args):
@@ -112,14 +123,14 @@ def validate_args(args):
         if args.z_scan:
             error_exit('Cannot use --z-scan mode when specifying --param')
         #Check values are floats and min<max and step>0
-        args.param = utils.check_scan_param_vals(args.param,float)
+        args.param = scan_io.check_scan_param_vals(args.param,float)
     
     #Else if z_scan
     elif args.z_scan:
 
         #Check values and set to param
         z_info = ['scale2',*args.z_scan]
-        args.param = utils.check_scan_param_vals(z_info,float)
+        args.param = scan_io.check_scan_param_vals(z_info,float)
 
         if args.param.min <= 0:
             error_exit('Minimum z-scale value must be greater than 0')
@@ -135,8 +146,17 @@ def validate_args(args):
     args.mod_template = args.mod_template.resolve()
     args.obs_template = args.obs_template.resolve()
 
+    #Check fit running options
+    args.ranks = check_type(args.ranks, '--ranks', int) if args.ranks else None
+    args.jobs = check_type(args.jobs, '--jobs', int) if args.jobs else None
+    if (args.ranks is not None and args.ranks < 1) or (args.jobs is not None and args.jobs < 1):
+        error_exit('--jobs and --ranks must be at least 1')
+    if args.manage and args.backend != 'slurm':
+        error_exit('--manage is only used with --backend slurm')
+
     return args
 
+@cli_main
 def main():
 
     args = parse_args()
@@ -156,11 +176,12 @@ def main():
                                args.mod_template, args.obs_template,
                                cwd)
     
-    utils.check_no_files(no_files)
+    scan_io.check_no_files(no_files, args.backend)
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    subprocess.run(["sbatch", f"--array=1-{no_files}", f'{script_dir}/launch_fitting.sbatch'])
-    logger.info(f'Submitted SLURM array jobs 1-{no_files}')
+    if args.backend == 'local':
+        local.run_local(cwd, jobs=args.jobs, ranks=args.ranks or 1)
+    else:
+        slurm.submit_scan(cwd, manage=args.manage, cores_per_fit=args.ranks)
 
     return True
 
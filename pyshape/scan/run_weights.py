@@ -0,0 +1,204 @@
+#Last modified 19/10/2026
+
+import argparse
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from ..cli_config import logger, error_exit, cli_main
+from ..obs.change_weights import CHANGE_TYPE, patch_weight_lines
+from ..utils import check_type
+from . import scan_io, slurm
+
+#python -m pyshape.scan.run_weights -w cw 1e3 1e4 1e5 -w dd 0.5 1 2
+#python -m pyshape.scan.run_weights -w lc 10 100 -mod mod.template -obs obs.template --no-links
+#namecores.txt has a weight column per set type. qplot plots the first two (against 0 with one set type)
+
+SHARED_MOD = 'shared.mod'
+
+def run_weight_scan(args):
+
+    cwd = Path.cwd()
+
+    Path(f'{cwd}/modfiles').mkdir(exist_ok=True)
+    Path(f'{cwd}/obsfiles').mkdir(exist_ok=True)
+    Path(f'{cwd}/logfiles').mkdir(exist_ok=True)
+
+    no_files = setup_weight_scan(args.weights, args.mod_template, args.obs_template,
+                                 cwd, jobs=args.jobs, links=not args.no_links)
+
+    scan_io.check_no_files(no_files)
+
+    slurm.submit_scan(cwd, manage=args.manage)
+
+    return
+
+#===Weight grid setup===
+def setup_weight_scan(weights, mod_template, obs_template, outf, jobs=None, links=True):
+    '''
+    Writes one obs file per combination of weights, sharing a single mod file.
+    weights is a dict of {obs_type: [weight, ...]} using the change_weights types (cw, dd, lc)
+    Obs files with identical contents are hard linked (or copied if links=False)
+    '''
+    outf = Path(outf)
+    obs_types = list(weights)
+    combos = list(itertools.product(*(weights[t] for t in obs_types)))
+    namecores = [weight_namecore(obs_types, combo) for combo in combos]
+
+    with open(obs_template) as f:
+        template_lines = f.readlines()
+
+    #Create obs contents in parallel, hashed to find duplicates
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(_weighted_obs,
+                                 itertools.repeat(template_lines), itertools.repeat(obs_types),
+                                 combos, chunksize=16))
+
+    #First namecore with each content is written, the rest point to it
+    first_by_digest = {}
+    duplicates = []
+    for namecore, (digest, text) in zip(namecores, results):
+        if digest in first_by_digest:
+            duplicates.append((namecore, first_by_digest[digest]))
+        else:
+            first_by_digest[digest] = namecore
+    unique = {namecore: text for namecore, (digest, text) in zip(namecores, results)
+              if first_by_digest[digest] == namecore}
+    logger.info(f'{len(unique)} unique obs files for {len(namecores)} weight combinations')
+
+    obs_dir = outf / 'obsfiles'
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(lambda item: _write_file(obs_dir / f'{item[0]}.obs', item[1]), unique.items()))
+        list(pool.map(lambda item: _link_file(obs_dir / f'{item[1]}.obs', obs_dir / f'{item[0]}.obs', links),
+                      duplicates))
+
+    #One mod file for all variants
+    mod_dir = outf / 'modfiles'
+    shutil.copy(mod_template, mod_dir / SHARED_MOD)
+    for namecore in namecores:
+        _link_file(mod_dir / SHARED_MOD, mod_dir / f'{namecore}.mod', links, symbolic=True)
+
+    with open(outf / 'namecores.txt', 'w') as f:
+        for namecore, combo in zip(namecores, combos):
+            f.write(f'{namecore} {" ".join(f"{w:.7g}" for w in combo)}\n')
+
+    return len(namecores)
+
+def weight_namecore(obs_types, combo):
+    return '_'.join(f'w{t}{w:.7g}' for t, w in zip(obs_types, combo))
+
+def _weighted_obs(template_lines, obs_types, combo):
+    lines = template_lines
+    for obs_type, weight in zip(obs_types, combo):
+        lines = patch_weight_lines(lines, obs_type, weight)
+    text = ''.join(lines)
+    return hashlib.sha256(text.encode()).hexdigest(), text
+
+def _write_file(dest, text):
+    dest.unlink(missing_ok=True)  #May be a link from a previous scan
+    dest.write_text(text)
+
+def _link_file(src, dest, links=True, symbolic=False):
+    '''Point dest at src with a link, replacing dest. Copies if links are disabled or unsupported'''
+    dest.unlink(missing_ok=True)
+    if links:
+        try:
+            if symbolic:
+                dest.symlink_to(src.name)  #Relative, so the scan directory can be moved
+            else:
+                os.link(src, dest)
+            return
+        except OSError as e:
+            logger.debug(f'Could not link {dest} to {src} ({e}). Copying instead')
+    shutil.copy(src, dest)
+
+#===Functions for parsing args===
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Create obs files in obsfiles for a grid of dataset weights, sharing one mod file",
+                                     epilog="Each obs file is the template with the weights of every set of a type changed. Identical files are linked")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose output (sets log level to DEBUG)")
+
+    weight_group = parser.add_argument_group('Weights to scan. Repeat for each set type')
+    weight_group.add_argument('-w', '--weights', nargs='+', action='append', metavar=('TYPE', 'WEIGHT'),
+                              help="Set type (cw, dd, lc) followed by its weights: e.g. -w cw 1e3 1e4 -w dd 0.5 1")
+
+    file_group = parser.add_argument_group("Optional file inputs. Defaults to [type].template")
+    file_group.add_argument("-mod", "--mod-template", type=Path, default=Path('./mod.template'),
+                            help="The template mod file. Shared between all weight combinations")
+    file_group.add_argument("-obs", "--obs-template", type=Path, default=Path('./obs.template'),
+                            help="The template obs file. Weights are changed for each combination")
+
+    run_group = parser.add_argument_group("File creation")
+    run_group.add_argument("-j", "--jobs", type=str, default=None,
+                           help="Number of processes used to create files. Default: all cores")
+    run_group.add_argument("--no-links", action="store_true",
+                           help="Write independent copies of the mod file and duplicate obs files rather than links")
+
+    submit_group = parser.add_argument_group("SLURM submission")
+    submit_group.add_argument("--manage", action="store_true",
+                              help="Stay running until every fit is done, resubmitting failures (see pyshape.scan.slurm)")
+
+    return parser.parse_args()
+
+def validate_args(args):
+
+    #Check verbose
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('Verbose: Set level to DEBUG')
+
+    if not args.weights:
+        error_exit('Must provide at least one set of weights with --weights')
+
+    weights = {}
+    for weight_info in args.weights:
+        obs_type, values = weight_info[0], weight_info[1:]
+        if obs_type not in CHANGE_TYPE:
+            error_exit(f'Set type must be one of: {" ".join(CHANGE_TYPE)} (got {obs_type})')
+        if obs_type in weights:
+            error_exit(f'Weights for {obs_type} given more than once')
+        if not values:
+            error_exit(f'No weights given for {obs_type}')
+        #Weights are written to 7 significant figures, so repeats are checked at that precision
+        values = [check_type(v, f'{obs_type} weight', float) for v in values]
+        values = [float(f'{v:.7g}') for v in values]
+        if len(set(values)) != len(values):
+            logger.warning(f'Ignoring repeated {obs_type} weights')
+        weights[obs_type] = list(dict.fromkeys(values))
+    args.weights = weights
+
+    if args.jobs is not None:
+        args.jobs = check_type(args.jobs, '--jobs', int)
+        if args.jobs < 1:
+            error_exit('--jobs must be at least 1')
+
+    #check files exist
+    if not args.mod_template.exists():
+        error_exit(f"Mod template not found: {args.mod_template}")
+    if not args.obs_template.exists():
+        error_exit(f"Obs template not found: {args.obs_template}")
+    args.mod_template = args.mod_template.resolve()
+    args.obs_template = args.obs_template.resolve()
+
+    return args
+
+#===Main===
+@cli_main
+def main():
+
+    args = parse_args()
+    args = validate_args(args)
+
+    logger.info(f'Using templates: {args.mod_template} and {args.obs_template}')
+
+    run_weight_scan(args)
+
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#Last modified 19/10/2026
+
+import numpy as np
+
+#Pole directions for polescans. 'legacy' is run_grid.create_polescan_lists (rings of beta with a lambda
+#step per ring). 'healpix' and 'fibonacci' spread poles near-uniformly over the sphere, so each fit
+#covers about the same area at a requested resolution
+
+SAMPLINGS = ('legacy', 'healpix', 'fibonacci')
+
+#Sphere area in square degrees
+SPHERE_AREA = 4 * np.pi * np.rad2deg(1)**2
+
+def healpix_nside(resolution) -> int:
+    '''Smallest nside with pixels no wider than resolution degrees (pixel area = resolution^2)'''
+    return max(1, int(np.ceil(np.sqrt(SPHERE_AREA / 12) / resolution)))
+
+def healpix_centres(nside) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    (lat, lon) in degrees of the HEALPix pixel centres (RING order, any nside).
+    Computed directly, so healpy isn't needed to set up a scan
+    '''
+    lat, lon = [], []
+    for i in range(1, 4*nside):
+        ring = min(i, 4*nside - i)  #Mirror rings of the southern cap onto the northern
+        if ring < nside:
+            #Polar caps: 4*ring pixels on the ring
+            z = 1 - ring**2 / (3 * nside**2)
+            phi = np.pi / (2*ring) * (np.arange(1, 4*ring + 1) - 0.5)
+        else:
+            #Equatorial belt: 4*nside pixels, alternate rings shifted by half a pixel
+            z = 4/3 - 2*ring / (3*nside)
+            shift = (i - nside + 1) % 2
+            phi = np.pi / (2*nside) * (np.arange(4*nside) + shift / 2)
+        z = z if i <= 2*nside else -z
+        lat.append(np.full(len(phi), np.rad2deg(np.arcsin(z))))
+        lon.append(np.rad2deg(phi))
+    return np.concatenate(lat), np.concatenate(lon)
+
+def fibonacci_points(resolution) -> tuple[np.ndarray, np.ndarray]:
+    '''(lat, lon) in degrees of a Fibonacci spiral with one point per resolution^2 square degrees'''
+    n = max(1, int(round(SPHERE_AREA / resolution**2)))
+    k = np.arange(n)
+    lat = np.rad2deg(np.arcsin(1 - (2*k + 1) / n))
+    lon = np.rad2deg(k * np.pi * (3 - np.sqrt(5))) % 360
+    return lat, lon
+
+def pole_directions(sampling, bet_min, bet_max, lam_min, lam_max, resolution) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    (angle1, angle0) of the poles within the beta/lambda ranges, as create_polescan_lists returns.
+    Directions are rounded to 0.1 degrees (and to whole degrees for legacy)
+    '''
+    if sampling == 'legacy':
+        from .run_grid import create_polescan_lists
+        return create_polescan_lists(bet_min, bet_max, resolution, lam_min, lam_max, resolution)
+
+    if sampling == 'healpix':
+        lat, lon = healpix_centres(healpix_nside(resolution))
+    elif sampling == 'fibonacci':
+        lat, lon = fibonacci_points(resolution)
+    else:
+        raise ValueError(f'Unknown sampling {sampling}. Must be one of: {" ".join(SAMPLINGS)}')
+
+    lat, lon = np.round(lat, 1), np.round(lon, 1) % 360
+    keep = (lat >= bet_min) & (lat <= bet_max) & (lon >= lam_min) & (lon <= lam_max)
+    lat, lon = lat[keep], lon[keep]
+    return 90 - lat, (lon + 90) % 360
+
+def angular_distance(lat1, lon1, lat2, lon2) -> np.ndarray:
+    '''Great circle distances in degrees between every point 1 (rows) and point 2 (columns)'''
+    from .interp import lonlat_to_xyz
+    cos_d = lonlat_to_xyz(lon1, lat1) @ lonlat_to_xyz(lon2, lat2).T
+    return np.rad2deg(np.arccos(np.clip(cos_d, -1, 1)))
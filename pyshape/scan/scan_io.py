@@ -1,11 +1,12 @@
-#Last modified 12/09/2025
+#Last modified 19/10/2026
 
 import dataclasses
 import glob
 import numpy as np
 from pathlib import Path
 from .. import log_file
-from ..cli_config import logger,error_exit
+from ..cli_config import logger
+from ..errors import AbortError, InputError, MissingFileError, ParseError
 
 #===Read polescans===
 # def polescan_results(scan_dir):
@@ -36,34 +37,134 @@ from ..cli_config import logger,error_exit
 
 #     return bet,lam,chi
 
-def scan_results(scan_dir):
+def scan_results(scan_dir, unfinished=False):
+    '''
+    p1, p2 and chi of each finished fit, from the "namecore p1 p2" lines of namecores.txt.
+    Lines with one parameter (e.g. a run_weights scan of one set type) have p2 = 0,
+    and only the first two of more parameters are read.
+    With unfinished, fits with no log or chi-square are kept with chi NaN, so the layout is the full grid
+    '''
     namecores_path = Path(scan_dir) / 'namecores.txt'
     if not namecores_path.exists():
-        error_exit(f'Could not find namecores.txt in {scan_dir}')
+        raise MissingFileError(f'Could not find namecores.txt in {scan_dir}')
 
     p1, p2, chi = [], [], []
     with open(namecores_path) as f:
         lines = f.readlines()
 
+    lines = [line for line in lines if line.strip()]
     #This is a boolean toggle to detect if its reading a grid scan or a pole scan
     polescan = lines[0].split()[0].startswith('lat')
+    n_params = len(lines[0].split()) - 1
+    if n_params > 2:
+        logger.warning(f'{namecores_path} has {n_params} parameters per fit. Only the first two are used')
 
     for line in lines:
-        namecore, p1_val, p2_val = line.strip().split()
+        namecore, *params = line.split()
+        if not params:
+            raise ParseError(f'No parameter values for {namecore} in {namecores_path}')
+        p1_val, p2_val = (params + ['0'])[:2]
         log_path = Path(scan_dir) / 'logfiles' / f'{namecore}.log'
+        chi_val = None
         if not log_path.exists():
             logger.warning(f'Log file not found: {log_path}')
-            continue
-        try:
-            log_info = log_file.read(log_path)
-            chi.append(log_info['ALLDATA'])
-            p1.append(float(p1_val))
-            p2.append(float(p2_val))
-        except:
-            logger.warning(f'Found NaN chisqr in {log_path}')
+        else:
+            try:
+                chi_val = log_file.read(log_path)['ALLDATA']
+            except:
+                logger.warning(f'Found NaN chisqr in {log_path}')
+        if chi_val is None:
+            if not unfinished:
+                continue
+            chi_val = np.nan
+        chi.append(chi_val)
+        p1.append(float(p1_val))
+        p2.append(float(p2_val))
 
     return np.array(p1), np.array(p2), np.array(chi), polescan
 
+#===Read angle2 subscans===
+def subscan_dirs(scan_dir) -> list[tuple[int, Path]]:
+    '''angle2 and directory of each subscan made by run_grid --angle2-range, in angle2 order'''
+    subscans = Path(scan_dir) / 'subscans'
+    if not subscans.is_dir():
+        raise MissingFileError(f'Could not find subscans directory in {scan_dir}')
+    dirs = sorted((int(d.name), d) for d in subscans.iterdir()
+                  if d.is_dir() and d.name.isdigit() and (d / 'namecores.txt').exists())
+    if not dirs:
+        raise MissingFileError(f'No subscans with a namecores.txt found in {subscans}')
+    return dirs
+
+def subscan_results(scan_dir, unfinished=False):
+    '''
+    scan_results for each subscan, as a list of (angle2, p1, p2, chi, polescan).
+    Subscans with no finished fits are skipped
+    '''
+    results = []
+    for angle2, subdir in subscan_dirs(scan_dir):
+        p1, p2, chi, polescan = scan_results(subdir, unfinished)
+        if len(chi) == 0 or np.all(np.isnan(chi)):
+            logger.warning(f'No results in {subdir}, skipping')
+            continue
+        results.append((angle2, p1, p2, chi, polescan))
+    return results
+
+def best_fits(results):
+    '''Arrays of angle2 and the p1, p2 and chi of the best fit in each subscan of subscan_results'''
+    best = []
+    for angle2, p1, p2, chi, _ in results:
+        i = np.nanargmin(chi)
+        best.append((angle2, p1[i], p2[i], chi[i]))
+    return tuple(np.array(col) for col in zip(*best))
+
+#===Resuming scans===
+#Lines of namecores.txt still to run when resuming a scan (launch_fitting.sbatch reads it as NAMECORE_FILE)
+RESUME_FILE = 'resume_namecores.txt'
+
+def fit_complete(log_path) -> bool:
+    '''
+    True if the fit of a log finished: it ends with the runtime line written when shape exits cleanly
+    (SHAPE prints ALLDATA every iteration, so a chi-square alone could be from a fit that was cut off),
+    and launch_fitting.sbatch has no {log}.running marker for it
+    '''
+    log_path = Path(log_path)
+    if log_path.with_name(f'{log_path.name}.running').exists() or log_file.read_runtime(log_path) is None:
+        return False
+    try:
+        return bool(np.isfinite(log_file.read(log_path).get('ALLDATA', np.nan)))
+    except (OSError, IndexError, ValueError):
+        return False
+
+def fit_continued(log_path) -> bool:
+    '''
+    True if launch_fitting.sbatch continued the fit after a time limit, so its log only covers the last part.
+    Continuations keep the earlier logs as {log}.1, {log}.2, ... and run from modfiles/{namecore}.cont.mod
+    '''
+    log_path = Path(log_path)
+    cont_mod = log_path.parent.parent / 'modfiles' / f'{log_path.stem}.cont.mod'
+    return cont_mod.exists() or any(log_path.parent.glob(f'{glob.escape(log_path.name)}.[0-9]*'))
+
+def incomplete_namecores(scan_dir, angle2s=()) -> list[str]:
+    '''
+    Lines of scan_dir/namecores.txt whose fit has not finished (see fit_complete)
+    (in any of the subscans, if angle2s are given, as one array task runs them all)
+    '''
+    scan_dir = Path(scan_dir)
+    namecores_path = scan_dir / 'namecores.txt'
+    if not namecores_path.exists():
+        raise MissingFileError(f'Could not find namecores.txt in {scan_dir}')
+    fit_dirs = [scan_dir / 'subscans' / f'{int(a2):03d}' for a2 in angle2s] or [scan_dir]
+    with open(namecores_path) as f:
+        lines = [line for line in f if line.strip()]
+    return [line for line in lines
+            if not all(fit_complete(d / 'logfiles' / f'{line.split()[0]}.log') for d in fit_dirs)]
+
+def write_resume_file(scan_dir, lines) -> str:
+    '''Writes the namecores still to run to scan_dir/RESUME_FILE. Returns its name'''
+    with open(Path(scan_dir) / RESUME_FILE, 'w') as f:
+        f.writelines(lines)
+    return RESUME_FILE
+
 #===Helper functions for line and grid_scan inputs
 @dataclasses.dataclass
 class ParamInfo:
@@ -74,25 +175,25 @@ class ParamInfo:
     step: float
 
 def check_scan_param_vals(param_info, req_type=float) -> ParamInfo:
+    location = param_info[0]
+    name = param_info[1]
     try:
-        location = param_info[0]
-        name = param_info[1]
         min_val, max_val, step_val = map(req_type, param_info[2:])
-        if min_val >= max_val:
-            error_exit(f'{name} max must be greater than min')
-        if step_val <= 0:
-            error_exit(f'{name} step must be greater than 0')
-        return ParamInfo(location, name, min_val, max_val, step_val)
     except ValueError:
         logger.warning(param_info)
-        error_exit(f'Must provide {req_type.__name__} values for {param_info[1]} min/max/step')
+        raise InputError(f'Must provide {req_type.__name__} values for {name} min/max/step') from None
+    if min_val >= max_val:
+        raise InputError(f'{name} max must be greater than min')
+    if step_val <= 0:
+        raise InputError(f'{name} step must be greater than 0')
+    return ParamInfo(location, name, min_val, max_val, step_val)
 
-def check_no_files(no_files):
+def check_no_files(no_files, backend='slurm'):
     #Check no_files created
     if no_files == 0:
-        error_exit("No files would be generated — check grid min/max/step settings.")
-    logger.info(f'This will create and run {no_files} slurm jobs')
+        raise InputError("No files would be generated — check grid min/max/step settings.")
+    what = 'slurm jobs' if backend == 'slurm' else 'fits on this machine'
+    logger.info(f'This will create and run {no_files} {what}')
     check = input("Is that ok? [y/N] ")
     if check.lower() != 'y':
-        logger.info("Aborting.")
-        exit(0)
\ No newline at end of file
+        raise AbortError("Aborting.")
\ No newline at end of file
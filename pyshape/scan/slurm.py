@@ -0,0 +1,403 @@
+#Last modified 19/10/2026
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from ..cli_config import logger, error_exit, get_console, cli_main
+from ..errors import MissingFileError, SchedulerError
+from ..utils import check_type
+
+#python -m pyshape.scan.slurm                     (manage the scan in this directory until every fit is done)
+#python -m pyshape.scan.slurm scan1 scan2 --status (one poll, then print what each scan is doing)
+
+#Each scan directory keeps the state of its array tasks (one per line of namecores.txt) in here
+STATE_FILE = 'slurm_state.json'
+#When fits are packed, the array task of every namecore is listed in here (read by launch_fitting.sbatch)
+PACK_FILE = 'packs.txt'
+LAUNCH_SCRIPT = Path(__file__).resolve().parents[2] / 'launch_fitting.sbatch'
+#Matches NCORES in launch_fitting.sbatch
+DEFAULT_CORES_PER_FIT = 8
+
+#Task states from squeue/sacct. Anything not listed (COMPLETED, CANCELLED) is final
+ACTIVE = {'SUBMITTED', 'PENDING', 'CONFIGURING', 'RUNNING', 'COMPLETING',
+          'REQUEUED', 'RESIZING', 'SUSPENDED', 'STAGE_OUT'}
+RETRY  = {'FAILED', 'TIMEOUT', 'NODE_FAIL', 'OUT_OF_MEMORY', 'BOOT_FAIL',
+          'PREEMPTED', 'DEADLINE', 'LOST'}
+
+#Polling slows down by this factor each time nothing changes
+BACKOFF = 1.5
+
+#===Per-scan task state===
+@dataclass
+class TaskState:
+    namecore: str  #Space separated when several fits are packed into the task
+    job: str = ''
+    state: str = 'UNSUBMITTED'
+    attempts: int = 0
+    opts: list[str] = field(default_factory=list)  #sbatch options of this task, instead of the scan's (see cost.py)
+
+class ScanJobs:
+    '''The array tasks of one scan directory, saved in scan_dir/slurm_state.json'''
+
+    def __init__(self, scan_dir, tasks, script=LAUNCH_SCRIPT, args=(), sbatch_opts=()):
+        self.scan_dir = Path(scan_dir).resolve()
+        self.tasks = tasks
+        self.script = str(script)
+        self.args = [str(a) for a in args]
+        self.sbatch_opts = list(sbatch_opts)
+
+    @classmethod
+    def create(cls, scan_dir, script=LAUNCH_SCRIPT, args=(), pack=1, sbatch_opts=(), namecore_file='namecores.txt',
+               task_opts=None):
+        '''
+        New state with a task for each line of scan_dir/namecore_file, or for every pack of that many lines.
+        task_opts gives the sbatch options of each namecore. Packs then only hold namecores with the same options
+        '''
+        namecores_path = Path(scan_dir) / namecore_file
+        if not namecores_path.exists():
+            raise MissingFileError(f'Could not find {namecore_file} in {scan_dir}')
+        with open(namecores_path) as f:
+            namecores = [line.split()[0] for line in f if line.strip()]
+        groups = [namecores]
+        if task_opts and pack > 1:
+            by_opts = {}
+            for name in namecores:
+                by_opts.setdefault(tuple(task_opts[name]), []).append(name)
+            groups = list(by_opts.values())
+        packs = [names[i:i+pack] for names in groups for i in range(0, len(names), pack)]
+        tasks = {i: TaskState(' '.join(names), opts=list(task_opts[names[0]]) if task_opts else [])
+                 for i, names in enumerate(packs, start=1)}
+        return cls(scan_dir, tasks, script, args, sbatch_opts)
+
+    @classmethod
+    def load(cls, scan_dir):
+        state_path = Path(scan_dir) / STATE_FILE
+        if not state_path.exists():
+            raise MissingFileError(f'No {STATE_FILE} in {scan_dir}. Was it submitted with pyshape?')
+        state = json.loads(state_path.read_text())
+        tasks = {int(i): TaskState(**task) for i, task in state['tasks'].items()}
+        return cls(scan_dir, tasks, state['script'], state['args'], state.get('sbatch_opts', []))
+
+    def save(self):
+        '''Written to a temporary file first, so an interrupted save never leaves a broken state file'''
+        state = {'script': self.script, 'args': self.args, 'sbatch_opts': self.sbatch_opts,
+                 'tasks': {i: asdict(task) for i, task in self.tasks.items()}}
+        state_path = self.scan_dir / STATE_FILE
+        tmp_path = state_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(state, indent=1))
+        os.replace(tmp_path, state_path)
+
+    def write_packs(self):
+        '''Manifest of "task namecore" lines, so each packed fit can be traced to its array task'''
+        with open(self.scan_dir / PACK_FILE, 'w') as f:
+            f.write('#task namecore\n')
+            for i, task in self.tasks.items():
+                f.writelines(f'{i} {namecore}\n' for namecore in task.namecore.split())
+
+    def active(self):
+        return {i: task for i, task in self.tasks.items() if task.state in ACTIVE}
+
+    def to_submit(self, max_retries):
+        '''Tasks never submitted, and failed tasks with retries left'''
+        return [i for i, task in self.tasks.items()
+                if task.state == 'UNSUBMITTED'
+                or (task.state in RETRY and task.attempts <= max_retries)]
+
+    def finished(self, max_retries):
+        return not self.active() and not self.to_submit(max_retries)
+
+    def counts(self) -> dict[str, int]:
+        counts = {}
+        for task in self.tasks.values():
+            counts[task.state] = counts.get(task.state, 0) + 1
+        return dict(sorted(counts.items()))
+
+#===Talking to SLURM===
+def array_spec(task_ids) -> str:
+    '''Compact --array value, e.g. [1,2,3,5,7,8] -> "1-3,5,7-8"'''
+    ids = sorted(set(task_ids))
+    ranges = []
+    start = prev = ids[0]
+    for i in ids[1:] + [None]:
+        if i is None or i != prev + 1:
+            ranges.append(f'{start}-{prev}' if prev > start else f'{start}')
+            start = i
+        prev = i
+    return ','.join(ranges)
+
+def parse_states(text) -> dict[tuple[str, int], str]:
+    '''
+    (job, task) -> state from "JOBID|STATE" lines of squeue or sacct.
+    Pending arrays ("123_[4-9%2]") are expanded and job steps ("123_4.batch") skipped
+    '''
+    states = {}
+    for line in text.splitlines():
+        if '|' not in line:
+            continue
+        job_id, state = line.split('|')[:2]
+        match = re.fullmatch(r'(\d+)_(\d+|\[[\d,\-%]+\])', job_id.strip())
+        if not match or not state.strip():
+            continue
+        job, tasks = match.groups()
+        state = state.split()[0].rstrip('+')  #e.g. "CANCELLED by 123", "CANCELLED+"
+        if tasks.startswith('['):
+            for part in tasks.strip('[]').split('%')[0].split(','):
+                lo, _, hi = part.partition('-')
+                for t in range(int(lo), int(hi or lo) + 1):
+                    states[job, t] = state
+        else:
+            states[job, int(tasks)] = state
+    return states
+
+async def _run(*cmd, cwd=None) -> tuple[int, str, str]:
+    proc = await asyncio.create_subprocess_exec(*map(str, cmd), cwd=cwd,
+                                                stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await proc.communicate()
+    return proc.returncode, stdout.decode(), stderr.decode()
+
+async def sbatch(script, task_ids, args=(), cwd=None, opts=()) -> str:
+    '''Submits an array job for task_ids and returns its job id'''
+    returncode, stdout, stderr = await _run('sbatch', '--parsable', *opts, f'--array={array_spec(task_ids)}',
+                                            script, *args, cwd=cwd)
+    if returncode != 0:
+        raise SchedulerError(f'sbatch failed in {cwd}: {stderr.strip()}')
+    return stdout.strip().split(';')[0]
+
+async def squeue(job_ids) -> dict[tuple[str, int], str] | None:
+    '''States of queued and running tasks of all job_ids in one call. None if squeue could not be reached'''
+    returncode, stdout, stderr = await _run('squeue', '--noheader', '--array', '--format=%i|%T',
+                                            f'--jobs={",".join(job_ids)}')
+    if returncode != 0:
+        #Asking only about jobs that have left the queue is an error, but just means none are queued
+        if 'Invalid job id' in stderr:
+            return {}
+        logger.warning(f'squeue failed: {stderr.strip()}')
+        return None
+    return parse_states(stdout)
+
+async def sacct(job_ids) -> dict[tuple[str, int], str]:
+    '''Final states of tasks of all job_ids in one call'''
+    returncode, stdout, stderr = await _run('sacct', '--noheader', '--parsable2', '--format=JobID,State',
+                                            f'--jobs={",".join(job_ids)}')
+    if returncode != 0:
+        logger.warning(f'sacct failed: {stderr.strip()}')
+        return {}
+    return parse_states(stdout)
+
+#===Manager===
+class SlurmManager:
+    '''
+    Submits and watches the array jobs of any number of scans. Every poll is one squeue call for all jobs,
+    with sacct only asked about tasks that have left the queue. Polling backs off while nothing changes.
+    Tasks that fail or time out are resubmitted up to max_retries times
+    '''
+
+    def __init__(self, scans, poll=30, max_poll=300, max_retries=2):
+        self.scans = list(scans)
+        self.poll = poll
+        self.max_poll = max_poll
+        self.max_retries = max_retries
+
+    async def submit(self, scan, task_ids):
+        #Resubmitted tasks continue where they stopped (see launch_fitting.sbatch)
+        retry = any(scan.tasks[i].attempts for i in task_ids)
+        opts = scan.tasks[task_ids[0]].opts or scan.sbatch_opts
+        opts = export_options(opts, 'CONTINUATION=1') if retry else opts
+        job = await sbatch(scan.script, task_ids, scan.args, cwd=scan.scan_dir, opts=opts)
+        for i in task_ids:
+            task = scan.tasks[i]
+            if task.attempts:
+                logger.info(f'Resubmitting {task.namecore} ({task.state}) in {scan.scan_dir.name} as {job}_{i}')
+            task.job, task.state = job, 'SUBMITTED'
+            task.attempts += 1
+        scan.save()
+        logger.info(f'Submitted SLURM array job {job} ({array_spec(task_ids)}) in {scan.scan_dir}')
+
+    async def submit_all(self):
+        '''
+        Submits everything that needs (re)submitting, for all scans at once.
+        New and resubmitted tasks, and tasks with different sbatch options, are separate jobs
+        '''
+        submissions = []
+        for scan in self.scans:
+            groups = {}
+            for i in scan.to_submit(self.max_retries):
+                groups.setdefault((bool(scan.tasks[i].attempts), tuple(scan.tasks[i].opts)), []).append(i)
+            submissions += [self.submit(scan, group) for _, group in sorted(groups.items())]
+        await asyncio.gather(*submissions)
+
+    async def poll_once(self) -> bool:
+        '''Updates every active task. Returns True if any state changed'''
+        active = [(scan, i, task) for scan in self.scans for i, task in scan.active().items()]
+        if not active:
+            return False
+        jobs = sorted({task.job for _, _, task in active})
+
+        queued = await squeue(jobs)
+        if queued is None:
+            return False
+        left = sorted({task.job for _, i, task in active if (task.job, i) not in queued})
+        finished = await sacct(left) if left else {}
+
+        changed = set()
+        for scan, i, task in active:
+            state = queued.get((task.job, i)) or finished.get((task.job, i))
+            if state and state != task.state:
+                logger.debug(f'{task.namecore}: {task.state} -> {state}')
+                task.state = state
+                changed.add(scan)
+                if state in RETRY and task.attempts > self.max_retries:
+                    logger.warning(f'{task.namecore} in {scan.scan_dir.name} ended {state} after {task.attempts} attempts')
+        for scan in changed:
+            scan.save()
+        return bool(changed)
+
+    async def run(self):
+        '''Submits, polls and resubmits until every task of every scan is finished'''
+        await self.submit_all()
+        interval = self.poll
+        while not all(scan.finished(self.max_retries) for scan in self.scans):
+            await asyncio.sleep(interval)
+            changed = await self.poll_once()
+            await self.submit_all()
+            interval = self.poll if changed else min(interval * BACKOFF, self.max_poll)
+            logger.debug(f'Next poll in {interval:.0f}s')
+        for scan in self.scans:
+            logger.info(f'{scan.scan_dir}: {format_counts(scan.counts())}')
+
+def format_counts(counts) -> str:
+    return ', '.join(f'{n} {state.lower()}' for state, n in counts.items())
+
+#===Used by run_grid, run_line and run_weights===
+def export_options(opts, *variables) -> list[str]:
+    '''opts with variables (e.g. "CONTINUATION=1") added to its --export, or to a new --export=ALL,...'''
+    opts = list(opts)
+    for j, opt in enumerate(opts):
+        if opt.startswith('--export='):
+            opts[j] = ','.join([opt, *variables])
+            return opts
+    return [f'--export={",".join(["ALL", *variables])}', *opts]
+
+def sbatch_options(pack=1, cores_per_fit=None, namecore_file='namecores.txt', stage=None) -> list[str]:
+    '''
+    Options for launch_fitting.sbatch. Packed tasks run their fits at the same time,
+    so they ask for enough cores for all of them and read the pack manifest.
+    Array indices are lines of namecore_file. With stage, fits run in that node-local directory (see stage.py)
+    '''
+    export = ['ALL']
+    if stage:
+        #Run with this python, so the node finds the same pyshape
+        export += [f'STAGE_DIR={stage}', f'STAGE_PYTHON={sys.executable}']
+    if pack > 1:
+        export.append(f'PACK_FILE={PACK_FILE}')
+    if namecore_file != 'namecores.txt':
+        export.append(f'NAMECORE_FILE={namecore_file}')
+    if cores_per_fit:
+        export.append(f'CORES_PER_FIT={cores_per_fit}')
+    opts = [f'--export={",".join(export)}'] if len(export) > 1 else []
+    if cores_per_fit or pack > 1:
+        opts.append(f'--ntasks-per-node={pack * (cores_per_fit or DEFAULT_CORES_PER_FIT)}')
+    return opts
+
+def submit_scan(scan_dir, args=(), manage=False, script=LAUNCH_SCRIPT, pack=1, cores_per_fit=None, watcher=None,
+                namecore_file='namecores.txt', stage=None, resources=None, continuation=False, **manager_kwargs):
+    '''
+    Submits an array job with a task per namecore of scan_dir (or per pack of namecores),
+    recording it in scan_dir/slurm_state.json. With manage, stays running until the scan is done (resubmitting failures),
+    and cancels hopeless fits if given a watch.FitWatcher. namecore_file can list only some of the namecores.
+    With stage, each fit runs in that node-local directory. resources (namecore -> cost.Resources, see cost.py)
+    sets the cores, memory and time of each task instead, with a job for each group of tasks asking for the same.
+    With continuation, tasks run as continuations (see launch_fitting.sbatch): fits that finished are skipped,
+    and fits that were cut off carry on from their latest model
+    '''
+    opts = sbatch_options(pack, cores_per_fit, namecore_file, stage)
+    task_opts = None
+    if resources:
+        task_opts = {name: [*sbatch_options(pack, r.cores, namecore_file, stage), *r.sbatch_args(pack)]
+                     for name, r in resources.items()}
+    if continuation:
+        opts = export_options(opts, 'CONTINUATION=1')
+        if task_opts:
+            task_opts = {name: export_options(o, 'CONTINUATION=1') for name, o in task_opts.items()}
+    scan = ScanJobs.create(scan_dir, script, args, pack, opts, namecore_file, task_opts)
+    if pack > 1:
+        scan.write_packs()
+        logger.info(f'Packed {sum(len(t.namecore.split()) for t in scan.tasks.values())} fits into {len(scan.tasks)} tasks. See {PACK_FILE}')
+    else:
+        (scan.scan_dir / PACK_FILE).unlink(missing_ok=True)
+    manager = SlurmManager([scan], **manager_kwargs)
+    if manage and watcher:
+        from .watch import watch_slurm
+        async def run_and_watch():
+            await asyncio.gather(manager.run(), watch_slurm(scan.scan_dir, watcher,
+                                 done=lambda: scan.finished(manager.max_retries)))
+        asyncio.run(run_and_watch())
+    elif manage:
+        asyncio.run(manager.run())
+    else:
+        asyncio.run(manager.submit_all())
+        logger.info(f'Monitor with "python -m pyshape.scan.slurm {scan.scan_dir}"')
+
+#===Functions for parsing args===
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Monitor SLURM scans submitted by run_grid, run_line or run_weights, resubmitting failed fits",
+                                     epilog="Many scans can be watched at once. They share each squeue/sacct call")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose output (sets log level to DEBUG)")
+    parser.add_argument("dirs", nargs='*', type=Path, default=[Path('.')],
+                        help=f"Scan directories (containing {STATE_FILE}). Default: current directory")
+    parser.add_argument("--status", action="store_true",
+                        help="Poll once and print the state of each scan, rather than running until done")
+
+    poll_group = parser.add_argument_group("Polling and retries")
+    poll_group.add_argument("--poll", type=str, default='30',
+                            help="Seconds between polls while states are changing. Default: 30")
+    poll_group.add_argument("--max-poll", type=str, default='300',
+                            help="Longest wait between polls when nothing changes. Default: 300")
+    poll_group.add_argument("--retries", type=str, default='2',
+                            help="Times to resubmit a failed or timed out fit. Default: 2")
+
+    return parser.parse_args()
+
+def validate_args(args):
+
+    #Check verbose
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('Verbose: Set level to DEBUG')
+
+    args.poll = check_type(args.poll, '--poll', float)
+    args.max_poll = check_type(args.max_poll, '--max-poll', float)
+    args.retries = check_type(args.retries, '--retries', int)
+    if args.poll <= 0 or args.max_poll < args.poll:
+        error_exit('--poll must be positive and no more than --max-poll')
+
+    return args
+
+#===Main===
+@cli_main
+def main():
+
+    args = parse_args()
+    args = validate_args(args)
+
+    scans = [ScanJobs.load(d) for d in args.dirs]
+    manager = SlurmManager(scans, poll=args.poll, max_poll=args.max_poll, max_retries=args.retries)
+
+    if args.status:
+        asyncio.run(manager.poll_once())
+        for scan in scans:
+            get_console().print(f'{scan.scan_dir}: {format_counts(scan.counts())}')
+    else:
+        asyncio.run(manager.run())
+
+if __name__ == "__main__":
+    main()
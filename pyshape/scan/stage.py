@@ -0,0 +1,186 @@
+#Last modified 19/10/2026
+
+import argparse
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from pathlib import Path, PurePath
+from ..cli_config import logger, error_exit, cli_main
+from ..errors import InputError, MissingFileError
+from ..obs.obs_io import obsFile
+
+#python -m pyshape.scan.stage NAMECORE par/fpar --scratch '$TMPDIR' -- mpirun -n 8 pshape
+#(run from the fit directory. launch_fitting.sbatch does this when STAGE_DIR is set)
+
+#Runs a fit in node-local storage rather than the shared scan directory. The mod and obs files, the par file
+#and the data frames the obs file names are copied in, the fit runs there, and everything it wrote is copied
+#back (each file replaced atomically) before the scratch directory is removed. So the parallel filesystem
+#sees one read of each input and one write of each output per fit, instead of every rank reading and writing
+
+#Frames outside the fit directory (absolute, or with ..) are put in here, and the staged obs file renamed to match
+DATA_DIR = 'data'
+
+def scratch_dir(spec=None) -> Path:
+    '''
+    Directory for staging, with environment variables expanded on the node running the fit, e.g. "$TMPDIR" or /dev/shm.
+    Falls back to the system temporary directory if it is unset or missing
+    '''
+    if spec:
+        path = os.path.expandvars(str(spec))
+        if '$' not in path and Path(path).is_dir():
+            return Path(path)
+        logger.warning(f'Staging directory {spec} is not available, using {tempfile.gettempdir()}')
+    return Path(tempfile.gettempdir())
+
+def _inside(name) -> bool:
+    path = PurePath(name)
+    return not path.is_absolute() and '..' not in path.parts
+
+def stage_in(fit_dir, namecore, par, stage, mod=None) -> list[Path]:
+    '''
+    Copies the inputs of a fit in fit_dir into stage, with the same layout (par file as ./fpar).
+    mod is the model, relative to fit_dir (default: modfiles/{namecore}.mod).
+    Frame names are relative to fit_dir, where shape would otherwise run. Returns the staged files
+    '''
+    fit_dir, stage = Path(fit_dir), Path(stage)
+    mod = PurePath(mod or f'modfiles/{namecore}.mod')
+    if not _inside(mod):
+        raise InputError(f'The model {mod} must be inside {fit_dir}')
+    inputs = {Path(par): stage / 'fpar', fit_dir / mod: stage / mod}
+
+    obs_path = fit_dir / 'obsfiles' / f'{namecore}.obs'
+    obs = obsFile.from_file(obs_path)
+    moved = 0
+    for ds in obs.datasets:
+        frames = getattr(ds, 'frames', None) or []
+        for frame in frames:
+            if _inside(frame.fname):
+                inputs[fit_dir / frame.fname] = stage / frame.fname
+            else:
+                #Numbered, as frames from different directories can share a name
+                moved += 1
+                staged_name = f'{DATA_DIR}/{moved}_{PurePath(frame.fname).name}'
+                inputs[(fit_dir / frame.fname).resolve()] = stage / staged_name
+                frame.fname = staged_name
+        if any(frame.fname.startswith(f'{DATA_DIR}/') for frame in frames):
+            ds._update_frames()
+
+    for src, dst in inputs.items():
+        if not src.exists():
+            raise MissingFileError(f'Cannot stage {src}: Does not exist')
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
+    staged_obs = stage / 'obsfiles' / f'{namecore}.obs'
+    staged_obs.parent.mkdir(parents=True, exist_ok=True)
+    if moved:
+        obs.write(staged_obs)
+    else:
+        shutil.copy2(obs_path, staged_obs)
+    (stage / 'logfiles').mkdir(exist_ok=True)
+
+    return [*inputs.values(), staged_obs]
+
+def stage_out(stage, fit_dir, staged) -> list[Path]:
+    '''Copies every file in stage that isn't one of the staged inputs back to fit_dir, replacing each atomically'''
+    stage, fit_dir = Path(stage), Path(fit_dir)
+    staged = {Path(f) for f in staged}
+    copied = []
+    for src in sorted(stage.rglob('*')):
+        if not src.is_file() or src in staged:
+            continue
+        dst = fit_dir / src.relative_to(stage)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f'.{dst.name}.{os.getpid()}.tmp')
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+        copied.append(dst)
+    return copied
+
+def run_staged(fit_dir, namecore, par, command, scratch=None, procs=None, mod=None) -> int:
+    '''
+    Runs command + [par, mod, obs] for a fit in fit_dir from a staging directory in scratch (see scratch_dir),
+    writing logfiles/{namecore}.log there. mod is as in stage_in. Results are copied back even if the fit fails
+    or is stopped. Returns the exit code. The process is kept in procs (by staged log file) while it runs, if given
+    '''
+    fit_dir = Path(fit_dir).resolve()
+    mod = PurePath(mod or f'modfiles/{namecore}.mod')
+    stage = Path(tempfile.mkdtemp(prefix=f'pyshape-{namecore}-', dir=scratch_dir(scratch)))
+    try:
+        staged = stage_in(fit_dir, namecore, par, stage, mod)
+        logger.debug(f'Staged {len(staged)} files for {namecore} in {stage}')
+        log_path = stage / 'logfiles' / f'{namecore}.log'
+        cmd = [*command, 'fpar', f'./{mod.as_posix()}', f'./obsfiles/{namecore}.obs']
+        with open(log_path, 'w') as log:
+            proc = subprocess.Popen(cmd, cwd=stage, stdout=log, stderr=subprocess.STDOUT)
+            if procs is not None:
+                procs[log_path] = proc
+            try:
+                return proc.wait()
+            finally:
+                if procs is not None:
+                    procs.pop(log_path, None)
+                stage_out(stage, fit_dir, staged)
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+
+#===Functions for parsing args===
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Run one fit of the current directory in node-local storage, copying the results back",
+                                     epilog="Example: python -m pyshape.scan.stage lat+10lon020 par/fpar --scratch /dev/shm -- mpirun -n 8 pshape")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose output (sets log level to DEBUG)")
+    parser.add_argument("namecore", type=str,
+                        help="Fit to run (modfiles/NAMECORE.mod and obsfiles/NAMECORE.obs)")
+    parser.add_argument("par", type=Path,
+                        help="Par file")
+    parser.add_argument("--scratch", type=str, default=None,
+                        help="Node-local directory to stage in. Environment variables are expanded. Default: $TMPDIR")
+    parser.add_argument("--mod", type=str, default=None,
+                        help="Model to start from, relative to the current directory. Default: modfiles/NAMECORE.mod")
+    parser.add_argument("command", nargs='*',
+                        help="Command that runs shape, after --. par, mod and obs files are added to the end")
+
+    #Everything after -- is the command, whatever its options look like
+    argv = sys.argv[1:]
+    split = argv.index('--') if '--' in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    args.command = argv[split + 1:]
+    return args
+
+def validate_args(args):
+
+    #Check verbose
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('Verbose: Set level to DEBUG')
+
+    if not args.command:
+        error_exit('Give the command that runs shape after --, e.g. -- mpirun -n 8 pshape')
+    args.scratch = args.scratch or '$TMPDIR'
+
+    return args
+
+#===Main===
+@cli_main
+def main():
+
+    args = parse_args()
+    args = validate_args(args)
+
+    #Stopped near a time limit (launch_fitting.sbatch), the fit is stopped and the results so far still copied back
+    procs = {}
+    def stop_fit(signum, frame):
+        for proc in list(procs.values()):
+            proc.terminate()
+    signal.signal(signal.SIGTERM, stop_fit)
+
+    returncode = run_staged(Path.cwd(), args.namecore, args.par.resolve(), args.command, args.scratch, procs, args.mod)
+    raise SystemExit(returncode)
+
+if __name__ == "__main__":
+    main()
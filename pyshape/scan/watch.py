@@ -0,0 +1,187 @@
+#Last modified 19/10/2026
+
+import argparse
+import asyncio
+import logging
+import numpy as np
+from pathlib import Path
+from .. import log_file
+from ..cli_config import logger, error_exit, cli_main
+from ..utils import check_type
+from . import slurm
+
+#python -m pyshape.scan.watch                    (alongside a SLURM scan in this directory)
+#python -m pyshape.scan.watch scan_dir --margin 5 --dry-run
+
+#Stops fits that can no longer finish near the best chi-square of the scan. SHAPE prints the chi-square
+#of every iteration, so the logs of running fits are tailed as they grow. A fit is hopeless once its
+#chi-square, less all the improvement it could still make, is more than margin percent above the best
+#value any fit has reached. Improvements are assumed to keep shrinking as fast as they have been
+
+#Iterations used to estimate how fast a fit is converging
+WINDOW = 5
+
+class LogTail:
+    '''ALLDATA chi-squares of a log, reading only what was added since the last read'''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.offset = 0
+        self.partial = ''
+        self.chis = []
+
+    def read(self) -> list[float]:
+        '''Reads any new complete lines. Returns every chi-square so far'''
+        try:
+            with open(self.path) as f:
+                f.seek(0, 2)
+                if f.tell() < self.offset:  #Rewritten by a new attempt
+                    self.offset, self.partial, self.chis = 0, '', []
+                f.seek(self.offset)
+                text = self.partial + f.read()
+                self.offset = f.tell()
+        except OSError:
+            return self.chis
+
+        *lines, self.partial = text.split('\n')
+        for line in lines:
+            chi = log_file.read_line(line.split())
+            if chi and chi[0] == 'ALLDATA':
+                self.chis.append(chi[1])
+        return self.chis
+
+def projected_floor(chis, window=WINDOW) -> float:
+    '''
+    Lowest chi-square a fit could plausibly reach: the latest value less the sum of future improvements,
+    if they keep shrinking by the same factor per iteration as over the last window. -inf if they aren't shrinking
+    '''
+    steps = np.maximum(-np.diff(chis[-window-1:]), 0)
+    if len(steps) == 0 or steps[-1] == 0:
+        return chis[-1]
+    if steps[0] == 0:
+        return -np.inf
+    ratio = (steps[-1] / steps[0]) ** (1 / max(len(steps) - 1, 1))
+    if ratio >= 1:
+        return -np.inf
+    return chis[-1] - steps[-1] * ratio / (1 - ratio)
+
+class FitWatcher:
+    '''Tails fit logs and finds the fits that can't get within margin percent of the best chi-square'''
+
+    def __init__(self, margin=10, min_iters=WINDOW + 1):
+        self.margin = margin
+        self.min_iters = min_iters
+        self.tails = {}
+
+    def update(self, logs):
+        for log in logs:
+            self.tails.setdefault(Path(log), LogTail(log)).read()
+
+    def best(self) -> float:
+        return min((tail.chis[-1] for tail in self.tails.values() if tail.chis), default=np.inf)
+
+    def is_hopeless(self, log) -> bool:
+        tail = self.tails.get(Path(log))
+        if tail is None or len(tail.chis) < self.min_iters:
+            return False
+        return projected_floor(tail.chis) > self.best() * (1 + self.margin / 100)
+
+    def hopeless(self, logs) -> list[Path]:
+        return [Path(log) for log in logs if self.is_hopeless(log)]
+
+def stop_hopeless(watcher, procs, stopped) -> None:
+    '''Terminates the local fits (procs, by log file) that are hopeless, adding their logs to stopped'''
+    watcher.update(list(procs))
+    for log in watcher.hopeless(list(procs)):
+        proc = procs.get(log)
+        if proc is not None and log not in stopped:
+            logger.info(f'Stopping {log.stem}: chi-square {watcher.tails[log].chis[-1]} cannot get near {watcher.best()}')
+            proc.terminate()
+            stopped.add(log)
+
+#===SLURM===
+async def scancel(job_ids):
+    returncode, _, stderr = await slurm._run('scancel', *job_ids)
+    if returncode != 0:
+        logger.warning(f'scancel failed: {stderr.strip()}')
+
+async def watch_slurm(scan_dir, watcher, interval=60, dry_run=False, done=None):
+    '''
+    Cancels array tasks of the scan in scan_dir once every fit in the task is hopeless, until done()
+    (default: until none of the scan's tasks are queued). The task state is re-read every time, so this
+    can run next to the manager in pyshape.scan.slurm. Cancelled tasks are not resubmitted
+    '''
+    scan_dir = Path(scan_dir)
+    if (scan_dir / 'subscans').exists():
+        logger.warning('Each SLURM task runs every angle2 of its namecore, so angle2 subscans are not watched')
+        return
+    cancelled = set()
+    while True:
+        scan = slurm.ScanJobs.load(scan_dir)
+        jobs = sorted({task.job for task in scan.tasks.values() if task.job})
+        if done is not None:
+            if done():
+                break
+        elif jobs and await slurm.squeue(jobs) == {}:
+            break
+
+        logs = {i: [scan_dir / 'logfiles' / f'{n}.log' for n in task.namecore.split()]
+                for i, task in scan.tasks.items()}
+        watcher.update(log for task_logs in logs.values() for log in task_logs)
+        hopeless = [f'{task.job}_{i}' for i, task in scan.active().items()
+                    if f'{task.job}_{i}' not in cancelled and all(map(watcher.is_hopeless, logs[i]))]
+        if hopeless:
+            logger.info(f'{"Would cancel" if dry_run else "Cancelling"} {len(hopeless)} hopeless task(s) '
+                        f'(best chi-square {watcher.best()}): {" ".join(hopeless)}')
+            if not dry_run:
+                await scancel(hopeless)
+            cancelled.update(hopeless)
+        await asyncio.sleep(interval)
+
+#===Functions for parsing args===
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Cancel SLURM fits of a scan that can no longer get near its best chi-square",
+                                     epilog=f"Runs until none of the scan's tasks are queued. Local scans use run_grid --stop-margin")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Enable verbose output (sets log level to DEBUG)")
+    parser.add_argument("scan_dir", nargs='?', type=Path, default=Path('.'),
+                        help=f"Scan directory (containing {slurm.STATE_FILE}). Default: current directory")
+    parser.add_argument("--margin", type=str, default='10',
+                        help="Cancel fits that can't get within this percent of the best chi-square. Default: 10")
+    parser.add_argument("--min-iters", type=str, default=str(WINDOW + 1),
+                        help=f"Iterations a fit runs before it can be cancelled. Default: {WINDOW + 1}")
+    parser.add_argument("--interval", type=str, default='60',
+                        help="Seconds between checks of the logs. Default: 60")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report what would be cancelled")
+
+    return parser.parse_args()
+
+def validate_args(args):
+
+    #Check verbose
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        logger.debug('Verbose: Set level to DEBUG')
+
+    args.margin = check_type(args.margin, '--margin', float)
+    args.min_iters = check_type(args.min_iters, '--min-iters', int)
+    args.interval = check_type(args.interval, '--interval', float)
+    if args.margin < 0 or args.min_iters < 2 or args.interval <= 0:
+        error_exit('--margin must be at least 0, --min-iters at least 2 and --interval positive')
+
+    return args
+
+#===Main===
+@cli_main
+def main():
+
+    args = parse_args()
+    args = validate_args(args)
+
+    watcher = FitWatcher(args.margin, args.min_iters)
+    asyncio.run(watch_slurm(args.scan_dir, watcher, args.interval, args.dry_run))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#Last modified 19/10/2026
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from rich.progress import Progress
+from .. import log_file
+from ..cli_config import logger, get_console
+from ..errors import MissingFileError, ParseError
+from ..mod.mod_io import modFile
+from .local import PAR_FILE, WATCH_INTERVAL, available_cores, run_fit, check_fit
+from .sampling import angular_distance
+from .scan_io import fit_complete
+from .watch import stop_hopeless
+
+#Warm-started polescans. A few seed poles start from the template, then fits spread outwards from them:
+#each later pole starts from the fitted model of its best finished neighbour, with its own pole frozen.
+#Neighbouring poles have similar shapes, so these fits need far fewer iterations than a cold start
+
+#SHAPE writes the fitted model of modfiles/X.mod to modfiles/X.mod.fit
+FIT_SUFFIX = '.fit'
+#Warm-started fits start from modfiles/X.warm.mod, so modfiles/X.mod stays as the template made it
+WARM_SUFFIX = '.warm.mod'
+
+#Poles within this many times the typical spacing of the grid are neighbours
+NEIGHBOUR_SPACING = 1.5
+
+def read_poles(fit_dir) -> tuple[list[str], np.ndarray, np.ndarray]:
+    '''Namecores and (lat, lon) of a polescan from its namecores.txt'''
+    with open(Path(fit_dir) / 'namecores.txt') as f:
+        lines = [line.split() for line in f if line.strip()]
+    if not lines or not lines[0][0].startswith('lat'):
+        raise ParseError(f'{fit_dir}/namecores.txt is not a polescan')
+    namecores = [line[0] for line in lines]
+    lon, lat = (np.array([float(line[i]) for line in lines]) for i in (1, 2))
+    return namecores, lat, lon
+
+def seed_indices(distances, n) -> list[int]:
+    '''n poles spread as far apart as possible (farthest point sampling from the first pole)'''
+    seeds = [0]
+    nearest = distances[0].copy()
+    while len(seeds) < min(n, len(nearest)):
+        seeds.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, distances[seeds[-1]])
+    return seeds
+
+def wavefront_order(distances, seeds) -> np.ndarray:
+    '''Pole indices by distance from the nearest seed, seeds first'''
+    return np.argsort(distances[seeds].min(axis=0), kind='stable')
+
+def neighbours(distances) -> np.ndarray:
+    '''Boolean (n, n) matrix of poles within NEIGHBOUR_SPACING of the median nearest-pole distance'''
+    spacing = np.where(np.eye(len(distances), dtype=bool), np.inf, distances).min(axis=1)
+    near = distances <= NEIGHBOUR_SPACING * np.median(spacing) + 1e-6
+    np.fill_diagonal(near, False)
+    return near
+
+def fit_chi(fit_dir, namecore) -> float:
+    '''ALLDATA chi-square of a finished fit, or NaN if the log has none'''
+    try:
+        return log_file.read(Path(fit_dir) / 'logfiles' / f'{namecore}.log')['ALLDATA']
+    except (OSError, KeyError, IndexError):
+        return np.nan
+
+def warm_start(fit_dir, namecore, neighbour) -> Path | None:
+    '''
+    Writes modfiles/{namecore}.warm.mod: the fitted model of neighbour, with the spin axis
+    (angle0-2, with their freeze states) of modfiles/{namecore}.mod, which is left unchanged.
+    Returns its path relative to fit_dir (for local.run_fit), or None if there is no fitted model
+    '''
+    mod_dir = Path(fit_dir) / 'modfiles'
+    fitted = mod_dir / f'{neighbour}.mod{FIT_SUFFIX}'
+    if not fitted.exists():
+        logger.debug(f'No fitted model {fitted}, so {namecore} starts from the template')
+        return None
+
+    own = modFile.from_file(mod_dir / f'{namecore}.mod').spinstate
+    try:
+        new = modFile.from_file(fitted)
+    except ParseError as e:
+        logger.warning(f'Could not read {fitted} ({e}), so {namecore} starts from the template')
+        return None
+    for name in ('angle0', 'angle1', 'angle2'):
+        new.spinstate.set_param(name, getattr(own, name), freeze=getattr(own, f'{name}_freeze'))
+    new.write(mod_dir / f'{namecore}{WARM_SUFFIX}')
+    return Path('modfiles') / f'{namecore}{WARM_SUFFIX}'
+
+def run_wavefront(scan_dir, angle2s=(), jobs=None, ranks=1, seeds=None, watcher=None, resume=False, stage=None) -> list[tuple[Path, str]]:
+    '''
+    Runs a polescan like local.run_local, but warm-started in waves outwards from seeds poles
+    (default: one per job). A pole starts once one of its neighbours has finished, from the fitted model
+    of the neighbour with the lowest chi-square. Each angle2 subscan is run in turn.
+    With a watch.FitWatcher, hopeless fits are stopped early. With resume, fits that already have a
+    chi-square are not run again, and seed their neighbours. stage is as in local.run_local. Returns the (directory, namecore) of fits that failed
+    '''
+    scan_dir = Path(scan_dir).resolve()
+    par = (scan_dir / PAR_FILE).resolve()
+    if not par.exists():
+        raise MissingFileError(f'Could not find {PAR_FILE} in {scan_dir}')
+    jobs = jobs or max(1, available_cores() // ranks)
+    seeds = seeds or jobs
+
+    failed = []
+    for fit_dir in [scan_dir / 'subscans' / f'{int(a2):03d}' for a2 in angle2s] or [scan_dir]:
+        failed += _run_wave(fit_dir, par, jobs, ranks, seeds, watcher, resume, stage)
+    return failed
+
+def _run_wave(fit_dir, par, jobs, ranks, n_seeds, watcher=None, resume=False, stage=None) -> list[tuple[Path, str]]:
+    '''Warm-started fits of one polescan directory'''
+    namecores, lat, lon = read_poles(fit_dir)
+    distances = angular_distance(lat, lon, lat, lon)
+    near = neighbours(distances)
+    seeds = set(seed_indices(distances, n_seeds))
+    pending = list(wavefront_order(distances, sorted(seeds)))
+    done = np.zeros(len(namecores), dtype=bool)
+    chi = np.full(len(namecores), np.nan)
+    if resume:
+        done[:] = [fit_complete(fit_dir / 'logfiles' / f'{namecore}.log') for namecore in namecores]
+        chi[done] = [fit_chi(fit_dir, namecores[i]) for i in np.flatnonzero(done)]
+        pending = [i for i in pending if not done[i]]
+    logger.info(f'Running {len(pending)} fits in {fit_dir} from {len(seeds)} seed poles, {jobs} at a time')
+
+    failed, warm, n_fits = [], 0, len(pending)
+    running, procs, stopped = {}, {}, set()
+    with ThreadPoolExecutor(max_workers=jobs) as pool, \
+         Progress(console=get_console(), transient=True) as pb:
+        t1 = pb.add_task('Running fits', total=len(pending))
+        while pending or running:
+
+            #Start poles next to a finished fit, nearest the seeds first. If none are ready and
+            #nothing is running (poles cut off by failures), the next pole starts from the template
+            ready = [i for i in pending if i in seeds or done[near[i]].any()]
+            if not ready and not running:
+                ready = pending[:1]
+            for i in ready[:jobs - len(running)]:
+                pending.remove(i)
+                finished = np.flatnonzero(near[i] & ~np.isnan(chi))
+                mod = None
+                if len(finished) and (i not in seeds or resume):
+                    best = finished[np.argmin(chi[finished])]
+                    mod = warm_start(fit_dir, namecores[i], namecores[best])
+                    warm += mod is not None
+                running[pool.submit(run_fit, fit_dir, namecores[i], par, ranks, procs, stage, mod)] = i
+
+            finished_futures, _ = wait(running, timeout=WATCH_INTERVAL if watcher else None,
+                                       return_when=FIRST_COMPLETED)
+            for future in finished_futures:
+                i = running.pop(future)
+                log = fit_dir / 'logfiles' / f'{namecores[i]}.log'
+                if check_fit(future, fit_dir, namecores[i], stopped):
+                    failed.append((fit_dir, namecores[i]))
+                elif log not in stopped:
+                    #Stopped fits are only part way, so never seed their neighbours
+                    chi[i] = fit_chi(fit_dir, namecores[i])
+                done[i] = True
+                pb.update(task_id=t1, advance=1)
+                if watcher:
+                    watcher.update([log])
+            if watcher:
+                stop_hopeless(watcher, procs, stopped)
+
+    stopped_msg = f', {len(stopped)} stopped early' if watcher else ''
+    logger.info(f'Finished {n_fits - len(failed)} of {n_fits} fits ({warm} warm-started{stopped_msg})')
+    return failed
@@ -1,31 +1,37 @@
 #Last modified by @recannon 04/03/2026
 
-from astropy.time import Time
-from .cli_config import error_exit
+from .errors import PyshapeError, InputError, MissingFileError, ShapeRunError
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 from .cli_config import logger
 import subprocess
 
+#astropy, numpy and the process pool are imported where used, as most commands never need them
+if TYPE_CHECKING:
+    from astropy.time import Time
+    from concurrent.futures import ProcessPoolExecutor
+
 #===Helper functions for checking input arguments
 def check_type(par,par_name,req_type):
     '''Check if an input is a correct type. If able, will change it to that type'''
     try:
         return req_type(par)
-    except:
-        error_exit(f"{par_name} must be of type {req_type.__name__} (got '{par}')")
+    except (TypeError, ValueError):
+        raise InputError(f"{par_name} must be of type {req_type.__name__} (got '{par}')") from None
 
 def check_dir(path, must_exist=True, create=False):
     '''Convert to Path and check it's a directory. Create if required'''
     path = Path(path)
     if path.exists():
         if not path.is_dir():
-            error_exit(f"Not a directory: {path}")
+            raise InputError(f"Not a directory: {path}")
     else:
         if create:
             path.mkdir(parents=True, exist_ok=True)
             logger.debug(f'Created directory {path}')
         elif must_exist:
-            error_exit(f"Directory does not exist: {path}")
+            raise MissingFileError(f"Directory does not exist: {path}")
     return path
 
 def check_file(path, must_exist=True):
@@ -33,19 +39,31 @@ def check_file(path, must_exist=True):
     path = Path(path)
     if must_exist:
         if not path.exists():
-            error_exit(f"File does not exist: {path}")
+            raise MissingFileError(f"File does not exist: {path}")
         if not path.is_file():
-            error_exit(f"Not a file: {path}")
+            raise InputError(f"Not a file: {path}")
     return path
 
+#===Batches of files===
+def for_each_file(func, fnames, *args, **kwargs) -> list:
+    '''Runs func(fname, *args, **kwargs) on each file. A PyshapeError only skips that file. Returns the files that failed'''
+    failed = []
+    for fname in fnames:
+        try:
+            func(fname, *args, **kwargs)
+        except PyshapeError as e:
+            logger.error(f'{fname}: {e}')
+            failed.append(fname)
+    return failed
+
 #===Emptying directory===
 def empty_dir(path, remove_dirs=False, ignore_errors=False):
     '''Remove all contents of a directory. remove_dirs=True to remove directories'''
     path = Path(path)
     if not path.exists():
-        error_exit(f'Cannot empty {path}: Does not exist')
+        raise MissingFileError(f'Cannot empty {path}: Does not exist')
     if not path.is_dir():
-        error_exit(f'Cannot empty {path}: Not a directory')
+        raise InputError(f'Cannot empty {path}: Not a directory')
 
     for item in path.iterdir():
         try:
@@ -78,18 +96,78 @@ def run_shape(args: list[str|Path], run_dir: str|Path, out_log: str|Path):
         try:
             subprocess.run(['shape', *map(str, args)], cwd=run_dir, 
                            stdout=log, stderr=subprocess.STDOUT,  check=True)
-        except subprocess.CalledProcessError:
-            error_exit(f'Problem running {args[0].name} action. Check {out_log}')
+        except subprocess.CalledProcessError as e:
+            raise ShapeRunError(f'Problem running {args[0].name} action. Check {out_log}') from e
+
+#===Process pools for plotting===
+def _plot_worker_init(cli_ready, level):
+    '''Workers only save figures, so use a non-interactive backend. Logging is set up as in the parent'''
+    import matplotlib
+    from . import cli_config
+    matplotlib.use('Agg')
+    if cli_ready:
+        cli_config.setup_cli()
+    cli_config.logger.setLevel(level)
+
+def plot_pool(jobs=None) -> "ProcessPoolExecutor":
+    '''
+    Process pool for matplotlib work. Workers are spawned rather than forked,
+    as forking while other threads are running (e.g. shape subprocesses) can deadlock.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    from . import cli_config
+    #Spawned workers start with fresh logging, so pass on whether the console is set up and the level (e.g. from -v)
+    return ProcessPoolExecutor(max_workers=jobs, initializer=_plot_worker_init,
+                               initargs=(cli_config._cli_ready, cli_config.logger.level),
+                               mp_context=multiprocessing.get_context('spawn'))
 
 #===Shape time formatting for mod/obs files
-def time_shape2astropy(t: str) -> Time:
-    '''Converts a SHAPE time string to astropy.time object'''
-    parts = t.split()
-    year, month, day, hour, minute, second = map(int, parts)
-    iso_str = f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
-    return Time(iso_str, format='iso', scale='utc')
-
-def time_astropy2shape(t: Time) -> str:
-    '''Converts astropy.time object to SHAPE time string'''
-    dt = t.to_datetime()
-    return f"{dt.year: >4} {dt.month: >2} {dt.day: >2} {dt.hour: >2} {dt.minute: >2} {dt.second: >2}"
+@lru_cache(maxsize=4096)
+def _shape2iso(t: str) -> str:
+    '''Converts a SHAPE time string to an iso string. Cached as epochs repeat across frames/files'''
+    year, month, day, hour, minute, second = map(int, t.split())
+    return f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+
+def _shape_time_str(year, month, day, hour, minute, second) -> str:
+    '''Formats integer date parts as a SHAPE time string'''
+    return f"{year: >4} {month: >2} {day: >2} {hour: >2} {minute: >2} {second: >2}"
+
+@lru_cache(maxsize=4096)
+def _shape2jd(t: str) -> tuple[float, float]:
+    '''Two-part Julian date of a SHAPE time string. Cached rather than the Time itself, as Time objects are mutable'''
+    from astropy.time import Time
+    time = Time(_shape2iso(t), format='iso', scale='utc')
+    return time.jd1, time.jd2
+
+def time_shape2astropy(t: str) -> "Time":
+    '''Converts a SHAPE time string to astropy.time object (a new one every call)'''
+    from astropy.time import Time
+    time = Time(*_shape2jd(t), format='jd', scale='utc')
+    time.format = 'iso'
+    return time
+
+def time_astropy2shape(t: "Time") -> str:
+    '''Converts astropy.time object to SHAPE time string, rounded to the nearest second as in times_astropy2shape'''
+    return times_astropy2shape(t)[0]
+
+def times_shape2astropy(ts: list[str]) -> "Time":
+    '''Converts a list of SHAPE time strings to a single astropy.time array'''
+    from astropy.time import Time
+    import numpy as np
+    #Only unique epochs are converted, then broadcast back to the input order
+    unique, inverse = np.unique([' '.join(t.split()) for t in ts], return_inverse=True)
+    times = Time([_shape2iso(t) for t in unique], format='iso', scale='utc')
+    return times[inverse.reshape(-1)]
+
+def times_astropy2shape(t: "Time") -> list[str]:
+    '''Converts an astropy.time array to a list of SHAPE time strings in one call'''
+    import numpy as np
+    import astropy.units as u
+    #ymdhms is vectorised. Adding half a second then flooring rounds to the nearest second,
+    #carrying into the minute, hour and day
+    ymdhms = np.atleast_1d((t.utc + 0.5 * u.s).ymdhms)
+    seconds = np.floor(ymdhms['second']).astype(int)
+    return [_shape_time_str(int(d['year']), int(d['month']), int(d['day']),
+                            int(d['hour']), int(d['minute']), int(s))
+            for d, s in zip(ymdhms, seconds)]
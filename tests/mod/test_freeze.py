@@ -7,6 +7,7 @@ from pathlib import Path
 
 from pyshape.mod.mod_io import modFile
 from pyshape.mod.freeze import freeze_mod
+from pyshape.errors import InputError
 
 #===Sample files===
 
@@ -50,13 +51,13 @@ def harmonic_file(tmp_path):
 
 class TestValidation:
 
-    def test_wrong_component_type_exits(self, ellip_file):
-        """Requesting a component type that doesn't match the file should exit."""
-        with pytest.raises(SystemExit):
+    def test_wrong_component_type_raises(self, ellip_file):
+        """Requesting a component type that doesn't match the file should raise."""
+        with pytest.raises(InputError):
             freeze_mod(str(ellip_file), 'v', 'f')
             
-    def test_out_of_range_component_exits(self, ellip_file):
-        with pytest.raises(SystemExit):
+    def test_out_of_range_component_raises(self, ellip_file):
+        with pytest.raises(InputError):
             freeze_mod(str(ellip_file), 'e', 'f', components=[99])
 
 class TestOption_e:
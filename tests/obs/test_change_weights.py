@@ -0,0 +1,45 @@
+#Last modified 19/10/2026
+#Tests for pyshape.obs.change_weights
+
+import pytest
+import shutil
+from pathlib import Path
+
+from pyshape.obs.change_weights import change_weights
+
+#===Sample files===
+
+SAMPLES = Path(__file__).parent
+SAMPLE_OBS = SAMPLES / "sample.obs"
+
+#===Helpers===
+
+def make_copy(src, tmp_path, name):
+    dest = tmp_path / name
+    shutil.copy(src, dest)
+    return dest
+
+def both_paths(tmp_path, obs_type, weight, sets_affected=None):
+    patched = make_copy(SAMPLE_OBS, tmp_path, 'patched.obs')
+    parsed  = make_copy(SAMPLE_OBS, tmp_path, 'parsed.obs')
+    change_weights(str(patched), obs_type, weight, sets_affected)
+    change_weights(str(parsed), obs_type, weight, sets_affected, full_parse=True)
+    return patched.read_text(), parsed.read_text()
+
+#===Tests===
+#Line patching must give identical output to the dataclass path
+
+@pytest.mark.parametrize("obs_type", ['dd', 'cw', 'lc'])
+def test_patch_matches_full_parse(tmp_path, obs_type):
+    patched, parsed = both_paths(tmp_path, obs_type, 1234.5)
+    assert patched == parsed
+
+def test_patch_matches_full_parse_subset(tmp_path):
+    patched, parsed = both_paths(tmp_path, 'cw', 0.25, sets_affected=[0, 2])
+    assert patched == parsed
+
+def test_weights_changed(tmp_path):
+    patched, _ = both_paths(tmp_path, 'cw', 0.25)
+    cw_lines = [l for l in patched.splitlines() if l.strip().startswith('cw_frame')]
+    assert len(cw_lines) == 2
+    assert all(l.split()[11] == '2.500000e-01' for l in cw_lines)
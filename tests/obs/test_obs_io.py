@@ -0,0 +1,51 @@
+#Last modified 19/10/2026
+#Tests for pyshape.obs.obs_io
+
+from pathlib import Path
+
+import pytest
+
+from pyshape.errors import MissingBlockError
+from pyshape.obs.obs_io import obsFile
+from pyshape.utils import time_shape2astropy
+
+#===Sample files===
+
+SAMPLES = Path(__file__).parent
+SAMPLE_OBS = SAMPLES / "sample.obs"
+
+#===Helpers===
+
+def load(path):
+    return obsFile.from_file(str(path))
+
+#===Tests===
+
+def test_set_types():
+    obs = load(SAMPLE_OBS)
+    assert [ds.set_type for ds in obs.datasets] == ['delay-doppler', 'doppler', 'lightcurve']
+
+def test_batched_dates_match_single_parse():
+    obs = load(SAMPLE_OBS)
+    for ds in obs.datasets[:2]:
+        frame_idx = ds._find_line('{number of frames}', ds.set_lines)
+        for frame, line in zip(ds.frames, ds.set_lines[frame_idx+2:]):
+            assert frame.date == time_shape2astropy(' '.join(line.split()[1:7]))
+
+def test_round_trip(tmp_path):
+    obs_in = load(SAMPLE_OBS)
+    for ds in obs_in.datasets:
+        ds.set_weights(2.5)
+    out = tmp_path / 'out.obs'
+    obs_in.write(out)
+    obs_out = load(out)
+    for ds_in, ds_out in zip(obs_in.datasets, obs_out.datasets):
+        assert [f.weight for f in ds_out.frames] == [2.5] * len(ds_in.frames)
+        for f_in, f_out in zip(ds_in.frames, ds_out.frames):
+            assert getattr(f_in, 'date', None) == getattr(f_out, 'date', None)
+
+def test_missing_block_raises():
+    lines = SAMPLE_OBS.read_text().splitlines(keepends=True)
+    lines = [line for line in lines if '{set type}' not in line]
+    with pytest.raises(MissingBlockError):
+        obsFile.from_lines(lines)
@@ -0,0 +1,69 @@
+#Last modified 19/10/2026
+#Tests for pyshape.plotting.figure_cache
+
+import os
+
+import numpy as np
+
+from pyshape.plotting.figure_cache import FigureCache, figure_key, file_stamps
+
+#===Tests===
+
+def test_key_follows_contents(tmp_path):
+    data = tmp_path / 'fit.dat'
+    data.write_text('1 2 3\n')
+    key = figure_key('cw_fit', data, np.arange(3), {'lims': 0.45}, 'title')
+
+    assert figure_key('cw_fit', data, np.arange(3), {'lims': 0.45}, 'title') == key
+    assert figure_key('cw_fit', data, np.arange(3.), {'lims': 0.45}, 'title') != key
+    assert figure_key('cw_fit', data, np.arange(3), {'lims': 0.5}, 'title') != key
+
+    data.write_text('1 2 4\n')
+    assert figure_key('cw_fit', data, np.arange(3), {'lims': 0.45}, 'title') != key
+
+def test_render_only_once(tmp_path):
+    cache = FigureCache(tmp_path / 'cache')
+    dest = tmp_path / 'fig.pdf'
+    calls = []
+
+    def render(text):
+        calls.append(text)
+        dest.write_text(text)
+
+    assert not cache.render('abc', dest, render, 'first')
+    dest.unlink()
+    assert cache.render('abc', dest, render, 'second')
+    assert calls == ['first']
+    assert dest.read_text() == 'first'
+
+    #Rewriting the output doesn't change the cached copy
+    dest.write_text('changed')
+    assert cache.fetch('abc', dest)
+    assert dest.read_text() == 'first'
+
+def test_file_stamps_follow_frames(tmp_path):
+    frame = tmp_path / 'frame.rdf'
+    frame.write_bytes(bytes(10))
+    key = figure_key('write', file_stamps([frame, tmp_path / 'missing.rdf']))
+    assert figure_key('write', file_stamps([frame, tmp_path / 'missing.rdf'])) == key
+
+    #Rewritten frames (here with a new size), or ones that appear, change the key
+    frame.write_bytes(bytes(20))
+    assert figure_key('write', file_stamps([frame, tmp_path / 'missing.rdf'])) != key
+    (tmp_path / 'missing.rdf').write_bytes(bytes(20))
+    assert figure_key('write', file_stamps([frame])) != figure_key('write', file_stamps([frame, tmp_path / 'missing.rdf']))
+
+def test_prune_and_clear(tmp_path):
+    cache = FigureCache(tmp_path / 'cache')
+    src = tmp_path / 'fig.pdf'
+    src.write_bytes(bytes(2**19))
+    for i, key in enumerate(['old', 'used', 'new']):
+        cache.store(key, src)
+        os.utime(cache.path(key), (i, i))
+    #Fetching marks a figure as used, so the oldest unused one goes first
+    assert cache.fetch('old', tmp_path / 'out.pdf')
+    cache.prune(max_mb=1)
+    assert sorted(f.stem for f in cache.cache_dir.iterdir()) == ['new', 'old']
+
+    cache.clear()
+    assert list(cache.cache_dir.iterdir()) == []
@@ -0,0 +1,71 @@
+#Last modified 19/10/2026
+#Tests for pyshape.plotting.image_stack
+
+import numpy as np
+from PIL import Image
+
+from pyshape.plotting import image_stack as ims
+
+#===Helpers===
+
+def block(value, height, width):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+def write_pnm(fname, magic, pixels, maxval=255):
+    '''Writes a PGM/PPM with a comment in its header'''
+    height, width = pixels.shape[:2]
+    header = f'{magic}\n# written by a test\n{width} {height}\n{maxval}\n'.encode()
+    if magic in ('P2', 'P3'):
+        raster = ' '.join(map(str, pixels.ravel())).encode() + b'\n'
+    else:
+        raster = pixels.astype('>u2' if maxval > 255 else np.uint8).tobytes()
+    fname.write_bytes(header + raster)
+
+#===Tests===
+
+def test_pnm_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (4, 5, 3), dtype=np.uint8)
+    grey = rng.integers(0, 256, (4, 5), dtype=np.uint8)
+
+    for magic in ('P3', 'P6'):
+        write_pnm(tmp_path / 'img.ppm', magic, rgb)
+        assert np.array_equal(ims.read_pnm(tmp_path / 'img.ppm'), rgb)
+    for magic in ('P2', 'P5'):
+        write_pnm(tmp_path / 'img.pgm', magic, grey)
+        assert np.array_equal(ims.read_pnm(tmp_path / 'img.pgm'), np.repeat(grey[..., None], 3, axis=2))
+
+    #PIL writes the same raw format
+    Image.fromarray(rgb).save(tmp_path / 'pil.ppm')
+    assert np.array_equal(ims.read_image(tmp_path / 'pil.ppm'), rgb)
+
+def test_pnm_rescale_rounds(tmp_path):
+    #Values rescaled from other maxvals are rounded, not truncated
+    write_pnm(tmp_path / 'deep.pgm', 'P5', np.array([[0, 257 * 100 + 200, 65535]]), maxval=65535)
+    assert list(ims.read_pnm(tmp_path / 'deep.pgm')[0, :, 0]) == [0, 101, 255]
+    write_pnm(tmp_path / 'low.pgm', 'P2', np.array([[1, 7, 15]]), maxval=15)
+    assert list(ims.read_pnm(tmp_path / 'low.pgm')[0, :, 0]) == [17, 119, 255]
+    write_pnm(tmp_path / 'odd.pgm', 'P2', np.array([[4]]), maxval=7)
+    assert ims.read_pnm(tmp_path / 'odd.pgm')[0, 0, 0] == 146
+
+def test_stacking():
+    a, b, c = block(10, 2, 3), block(20, 4, 1), block(30, 1, 2)
+
+    h = ims.hstack([a, b], gap=1, fill=255)
+    assert h.shape == (4, 5, 3)
+    assert np.all(h[:2, :3] == 10) and np.all(h[2:, :3] == 255) and np.all(h[:, 3] == 255) and np.all(h[:, 4] == 20)
+
+    v = ims.vstack([a, c], gap=0)
+    assert v.shape == (3, 3, 3)
+    assert np.all(v[2, :2] == 30) and np.all(v[2, 2] == 0)
+
+    #Row by row, or down each column
+    imgs = [block(i, 1, 1) for i in range(5)]
+    assert list(ims.grid(imgs, 2, gap=0)[..., 0].ravel()) == [0, 1, 2, 3, 4, 0]
+    assert ims.column_grid(imgs, 2, gap=0)[..., 0].tolist() == [[0, 3], [1, 4], [2, 0]]
+
+def test_images_to_pdf(tmp_path):
+    wide = tmp_path / 'wide.png'
+    Image.fromarray(block(50, 10, 40)).save(wide)
+    out = ims.images_to_pdf([wide, block(200, 20, 20)], tmp_path / 'out.pdf', width=80)
+    assert out.read_bytes().startswith(b'%PDF')
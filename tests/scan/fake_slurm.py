@@ -0,0 +1,95 @@
+#Last modified 19/10/2026
+#Stand-ins for sbatch, squeue, sacct and scancel, for testing pyshape.scan.slurm without a cluster
+#Each job is a json file in the fake state directory. A task is RUNNING for its job's first squeue,
+#then leaves the queue and sacct reports it COMPLETED (or FAILED, the first time a task listed in fail runs)
+#scancel only records the tasks it was given, in the file cancelled
+#With run, sbatch runs the script for each task there and then, and a task FAILED if the script exits non-zero
+
+import fcntl
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+#Shared by the three commands, which are this file run under different names
+def _array_ids(spec):
+    ids = []
+    for part in spec.split(','):
+        lo, _, hi = part.partition('-')
+        ids.extend(range(int(lo), int(hi or lo) + 1))
+    return ids
+
+def _jobs_arg(argv):
+    return next(a.split('=', 1)[1] for a in argv if a.startswith('--jobs=')).split(',')
+
+def _sbatch(state, argv):
+    spec = next(a.split('=', 1)[1] for a in argv if a.startswith('--array='))
+    tasks = _array_ids(spec)
+    fail_file = state / 'fail'
+    fail = json.loads(fail_file.read_text()) if fail_file.exists() else []
+    failed = [t for t in tasks if t in fail]
+    fail_file.write_text(json.dumps([t for t in fail if t not in failed]))
+
+    job = 1000 + len(list(state.glob('*.json')))
+    script, *script_args = argv[argv.index(next(a for a in argv if a.startswith('--array='))) + 1:]
+    if os.environ.get('FAKE_SLURM_RUN'):
+        failed = [t for t in tasks if _run_task(script, script_args, argv, job, t) != 0]
+    (state / f'{job}.json').write_text(json.dumps({'tasks': tasks, 'failed': failed, 'polls': 0,
+                                                   'cwd': os.getcwd(), 'args': script_args, 'argv': argv}))
+    print(job)
+
+def _run_task(script, script_args, argv, job, task):
+    env = {**os.environ, 'SLURM_ARRAY_JOB_ID': str(job), 'SLURM_ARRAY_TASK_ID': str(task)}
+    for opt in argv:
+        if opt.startswith('--export='):
+            env.update(var.split('=', 1) for var in opt.split('=', 1)[1].split(',') if '=' in var)
+    with open(f'task_{job}_{task}.out', 'w') as out:
+        return subprocess.run(['bash', script, *script_args], env=env, stdout=out, stderr=subprocess.STDOUT).returncode
+
+def _squeue(state, argv):
+    for job in _jobs_arg(argv):
+        job_file = state / f'{job}.json'
+        info = json.loads(job_file.read_text())
+        info['polls'] += 1
+        job_file.write_text(json.dumps(info))
+        if info['polls'] == 1:
+            for t in info['tasks']:
+                print(f'{job}_{t}|RUNNING')
+
+def _sacct(state, argv):
+    for job in _jobs_arg(argv):
+        info = json.loads((state / f'{job}.json').read_text())
+        for t in info['tasks']:
+            result = 'FAILED' if t in info['failed'] else 'COMPLETED'
+            print(f'{job}_{t}|{result}')
+            print(f'{job}_{t}.batch|{result}')
+
+def _scancel(state, argv):
+    cancelled = state / 'cancelled'
+    done = json.loads(cancelled.read_text()) if cancelled.exists() else []
+    cancelled.write_text(json.dumps(done + argv))
+
+def install(tmp_path, monkeypatch, fail=(), run=False):
+    '''Puts fake sbatch/squeue/sacct/scancel first on PATH. Returns the directory holding the fake job files'''
+    bin_dir, state = tmp_path / 'bin', tmp_path / 'fake_slurm'
+    bin_dir.mkdir()
+    state.mkdir()
+    (state / 'fail').write_text(json.dumps(list(fail)))
+    for name in ('sbatch', 'squeue', 'sacct', 'scancel'):
+        script = bin_dir / name
+        script.write_text(f'#!{sys.executable}\nimport sys\nsys.path.insert(0, {str(Path(__file__).parent)!r})\n'
+                          f'import fake_slurm\nfake_slurm.main({name!r})\n')
+        script.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setenv('FAKE_SLURM', str(state))
+    if run:
+        monkeypatch.setenv('FAKE_SLURM_RUN', '1')
+    return state
+
+def main(name):
+    state = Path(os.environ['FAKE_SLURM'])
+    #The manager runs these concurrently, so take turns with the job files
+    with open(state / 'lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        {'sbatch': _sbatch, 'squeue': _squeue, 'sacct': _sacct, 'scancel': _scancel}[name](state, sys.argv[1:])
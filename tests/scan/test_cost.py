@@ -0,0 +1,118 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.cost, with fits timed by runtime lines written into their logs
+
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pyshape import log_file
+from pyshape.mod.mod_io import modFile
+from pyshape.scan import cost, slurm
+from tests.scan import fake_slurm
+
+SAMPLES = Path(__file__).parents[1]
+
+#===Helpers===
+
+def make_fits(scan_dir, namecores, mod='sample_ellip.mod', seconds=None, cores=8):
+    '''Fits of the sample files in scan_dir, with a finished, timed log for each if given seconds'''
+    for sub in ('modfiles', 'obsfiles', 'logfiles', 'par'):
+        (scan_dir / sub).mkdir(parents=True, exist_ok=True)
+    (scan_dir / 'par' / 'fpar').write_text('maxiter 10\n')
+    (scan_dir / 'namecores.txt').write_text(''.join(f'{n} 0 0\n' for n in namecores))
+    for namecore in namecores:
+        shutil.copy(SAMPLES / 'mod' / mod, scan_dir / 'modfiles' / f'{namecore}.mod')
+        shutil.copy(SAMPLES / 'obs' / 'sample.obs', scan_dir / 'obsfiles' / f'{namecore}.obs')
+        if seconds is not None:
+            (scan_dir / 'logfiles' / f'{namecore}.log').write_text(
+                'ALLDATA a b 100.0 c 90 e f g h 1.50000\n' + log_file.runtime_line(seconds, cores))
+
+def features(**kwargs):
+    return cost.FitFeatures(**{'facets': 1000, 'frames': 10, 'free': 1, 'data_bytes': 0, 'par': 'p', **kwargs})
+
+#===Tests===
+
+def test_fit_features(tmp_path):
+    make_fits(tmp_path, ['fit01'])
+    (tmp_path / 'dd_frame_00.rdf').write_bytes(bytes(1000))
+    f = cost.fit_features(tmp_path, 'fit01', 'p')
+    #Two ellipsoids of 30 theta steps, and the five frames of sample.obs (only one exists here)
+    assert (f.facets, f.frames, f.data_bytes) == (2 * (2 * 1148 - 4), 5, 1000)
+
+    mod = modFile.from_file(tmp_path / 'modfiles' / 'fit01.mod')
+    assert cost.free_params(mod) == 0
+    mod.spinstate.freeze_params('f', ['angle0', 'angle1'])
+    mod.components[0].freeze_params('f', ['two_a'])
+    assert cost.free_params(mod) == 3
+
+def test_choose_resources():
+    #A short fit asks for the least, and a long one for the fewest cores that finish within the target
+    assert cost.choose_resources(600, features()) == cost.Resources(1, 30, 768)
+    r = cost.choose_resources(40 * 3600, features(), target_hours=12)
+    assert (r.cores, r.minutes) == (4, 960)
+    #Tasks running every angle2 subscan need the time of all of them, capped at the limit
+    assert cost.choose_resources(40 * 3600, features(), fits_per_task=10, max_cores=8).minutes == 24 * 60
+    assert cost.choose_resources(600, features(), cores=8) == cost.Resources(8, 30, 8 * 768)
+    #Each rank holds copies of the data
+    assert cost.choose_resources(600, features(data_bytes=200 * 2**20)).mem_mb == 1792
+    assert cost.Resources(4, 90, 3072).sbatch_args(pack=2) == ['--time=1:30:00', '--mem=6144M']
+
+def test_cost_model(tmp_path):
+    make_fits(tmp_path / 'old', ['fit01', 'fit02', 'cut03', 'none04', 'cont05', 'run06'], seconds=900, cores=8)
+    (tmp_path / 'old' / 'logfiles' / 'cut03.log.1').write_text('')
+    (tmp_path / 'old' / 'logfiles' / 'none04.log').write_text('ALLDATA a b 100.0 c 90 e f g h 1.50000\n')
+    (tmp_path / 'old' / 'modfiles' / 'cont05.cont.mod').write_text('')
+    (tmp_path / 'old' / 'logfiles' / 'run06.log.running').write_text('')
+    model = cost.CostModel.from_dirs([tmp_path / 'old'])
+
+    #Continued fits only time their last part, and unfinished (or still running) fits have no runtime
+    assert len(model.history) == 2
+    f = model.history[0][0]
+    assert model.core_seconds(f) == pytest.approx(7200)
+    assert model.core_seconds(features(facets=f.facets * 2, frames=f.frames, par='other')) == pytest.approx(14400)
+    assert cost.CostModel([]).core_seconds(f) is None
+
+def test_estimate_scan(tmp_path):
+    make_fits(tmp_path / 'old', ['fit01'], seconds=3 * 3600, cores=8)
+    make_fits(tmp_path / 'new', ['fit01', 'vert02'])
+    shutil.copy(SAMPLES / 'mod' / 'sample_vertex.mod', tmp_path / 'new' / 'modfiles' / 'vert02.mod')
+
+    resources = cost.estimate_scan(tmp_path / 'new', [tmp_path / 'old'])
+    #24 core-hours fits in 12 hours on 2 cores (asking for the 24 hour limit). The vertex model has about a fifth of the facets
+    assert resources['fit01'] == cost.Resources(2, 1440, 1536)
+    assert resources['vert02'] == cost.Resources(1, 480, 768)
+    assert cost.estimate_scan(tmp_path / 'new') is None
+
+def test_estimate_subscans(tmp_path):
+    '''Every subscan runs in one task, each costing as much as the largest'''
+    make_fits(tmp_path / 'old', ['fit01'], seconds=3 * 3600, cores=8)
+    make_fits(tmp_path / 'new', ['fit01'])
+    make_fits(tmp_path / 'new' / 'subscans' / '000', ['fit01'], mod='sample_vertex.mod')
+    make_fits(tmp_path / 'new' / 'subscans' / '010', ['fit01'])
+
+    #48 core-hours in 12 hours needs 4 cores. Sizing from the first (vertex) subscan would ask for less
+    resources = cost.estimate_scan(tmp_path / 'new', [tmp_path / 'old'], angle2s=['0', '10'])
+    assert resources['fit01'] == cost.Resources(4, 1440, 3072)
+
+def test_submit_with_resources(tmp_path, monkeypatch):
+    '''Tasks asking for the same resources share a job, and packs only hold fits asking for the same'''
+    fake = fake_slurm.install(tmp_path, monkeypatch)
+    (tmp_path / 'namecores.txt').write_text(''.join(f'fit{i:02d} 0 0\n' for i in range(5)))
+    small, big = cost.Resources(1, 30, 768), cost.Resources(4, 120, 3072)
+    resources = {f'fit{i:02d}': big if i % 2 else small for i in range(5)}
+    slurm.submit_scan(tmp_path, resources=resources)
+
+    jobs = [json.loads((fake / f'{job}.json').read_text()) for job in (1000, 1001)]
+    assert sorted(job['tasks'] for job in jobs) == [[1, 3, 5], [2, 4]]
+    argv = next(job['argv'] for job in jobs if job['tasks'] == [2, 4])
+    assert {'--time=2:00:00', '--mem=3072M', '--ntasks-per-node=4', '--export=ALL,CORES_PER_FIT=4'} <= set(argv)
+
+    slurm.submit_scan(tmp_path, pack=2, resources=resources)
+    packs = (tmp_path / slurm.PACK_FILE).read_text().splitlines()
+    assert packs[1:] == ['1 fit00', '1 fit02', '2 fit04', '3 fit01', '3 fit03']
+    #The two jobs are submitted at once, so find the one with the big pack
+    jobs = [json.loads((fake / f'{job}.json').read_text()) for job in (1002, 1003)]
+    argv = next(job['argv'] for job in jobs if job['tasks'] == [3])
+    assert {'--mem=6144M', '--ntasks-per-node=8'} <= set(argv)
@@ -0,0 +1,94 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.interp
+
+import numpy as np
+
+from pyshape.scan import interp
+
+#===Helpers===
+
+def polescan_layout(step=15):
+    '''Layout as run_grid writes a polescan, including lon 360 and every lon at the poles'''
+    lon, lat = np.meshgrid(np.arange(0, 361, step), np.arange(-90, 91, step))
+    return lon.ravel().astype(float), lat.ravel().astype(float)
+
+def smooth(lon, lat):
+    x, y, z = interp.lonlat_to_xyz(lon, lat).T
+    return 10 + x + 2*z
+
+#===Tests===
+
+def test_sphere_interpolation(tmp_path):
+    lon, lat = polescan_layout()
+    target_lon, target_lat = interp.healpix_plot_points(8)
+    interpolator = interp.healpix_interpolator(lon, lat, nside=8, cache_dir=tmp_path)
+    chi = interpolator(smooth(lon, lat))
+
+    assert np.all(np.isfinite(chi))
+    assert np.allclose(chi, smooth(target_lon, target_lat), atol=0.05)
+
+    #Seam and poles have one value each, whatever the lon
+    npix, no_rings = 12 * 8**2, 4*8 - 1
+    seam_0, seam_360 = chi[npix:npix+no_rings], chi[npix+no_rings:npix+2*no_rings]
+    assert np.all(target_lon[npix+no_rings:npix+2*no_rings] == 360)
+    assert np.allclose(seam_0, seam_360)
+    north = target_lat == 90
+    assert np.ptp(chi[north]) < 1e-12
+
+def test_nan_and_cache(tmp_path):
+    lon, lat = polescan_layout()
+    values = smooth(lon, lat)
+    values[(lat == 0) & (lon == 90)] = np.nan
+
+    interpolator = interp.healpix_interpolator(lon, lat, nside=8, cache_dir=tmp_path)
+    chi = interpolator(values)
+    assert np.all(np.isfinite(chi))
+
+    #Saved with the scan and reloaded for the same layout
+    saved = list((tmp_path / interp.CACHE_DIR).glob('sphere8_*.npz'))
+    assert len(saved) == 1
+    interp._interpolators.clear()
+    reloaded = interp.healpix_interpolator(lon, lat, nside=8, cache_dir=tmp_path)
+    assert np.allclose(reloaded(values), chi)
+
+def test_partial_coverage():
+    #Northern hemisphere only, so southern targets can't be interpolated
+    lon, lat = polescan_layout()
+    north = lat >= 0
+    target_lon, target_lat = interp.healpix_plot_points(8)
+    interpolator = interp.WeightInterpolator(
+        interp.sphere_weights(lon[north], lat[north], target_lon, target_lat))
+    chi = interpolator(smooth(lon[north], lat[north]))
+
+    assert np.all(np.isfinite(chi[target_lat > 1]))
+    assert np.all(np.isnan(chi[target_lat < -1]))
+
+def test_plane_matches_griddata(tmp_path):
+    from scipy.interpolate import griddata
+
+    rng = np.random.default_rng(1)
+    x, y = rng.uniform(0, 10, 60), rng.uniform(-5, 5, 60)
+    chi = 1 + (x - 4)**2 / 10 + y**2 / 20
+    grid_y, grid_x = np.meshgrid(np.arange(-5, 5.5, 0.5), np.arange(0, 10.5, 0.5))
+
+    interpolator = interp.grid_interpolator(x, y, grid_x, grid_y, cache_dir=tmp_path)
+    expected = griddata(np.column_stack([x, y]), chi, (grid_x, grid_y), method='linear')
+    assert np.allclose(interpolator(chi).reshape(grid_x.shape), expected, equal_nan=True)
+
+    #New chi values reuse the weights
+    assert interp.grid_interpolator(x, y, grid_x, grid_y, cache_dir=tmp_path) is interpolator
+    assert np.allclose(interpolator(2 * chi).reshape(grid_x.shape), 2 * expected, equal_nan=True)
+    assert len(list((tmp_path / interp.CACHE_DIR).glob('plane_*.npz'))) == 1
+
+def test_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(interp, 'MAX_CACHED', 2)
+    x, y = np.array([0., 1., 0., 1.]), np.array([0., 0., 1., 1.])
+    grid_y, grid_x = np.meshgrid(np.arange(0, 1.5, 0.5), np.arange(0, 1.5, 0.5))
+    first = interp.grid_interpolator(x, y, grid_x, grid_y, cache_dir=tmp_path)
+    for scale in (2, 3):
+        interp.grid_interpolator(scale * x, scale * y, grid_x, grid_y, cache_dir=tmp_path)
+
+    #The least recently used layout is removed, and rebuilt if it comes back
+    saved = list((tmp_path / interp.CACHE_DIR).glob('*.npz'))
+    assert len(saved) == 2
+    assert interp.grid_interpolator(x, y, grid_x, grid_y, cache_dir=tmp_path) is not first
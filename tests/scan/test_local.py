@@ -0,0 +1,110 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.local, using a stand-in shape executable
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+from pyshape import log_file
+from pyshape.errors import MissingFileError
+from pyshape.scan import local, run_grid, scan_io
+
+SAMPLES = Path(__file__).parents[1]
+
+#===Helpers===
+
+#Writes a log like SHAPE's last line, or fails for namecores starting with "bad"
+FAKE_SHAPE = '''#!{python}
+import sys
+from pathlib import Path
+par, mod, obs = sys.argv[1:4]
+if Path(mod).stem.startswith('bad'):
+    sys.exit(3)
+print(f'ALLDATA a b 100.0 c 90 e f g h 1.50000 {{Path(par).name}}')
+'''
+
+@pytest.fixture
+def fake_shape(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    shape = bin_dir / 'shape'
+    shape.write_text(FAKE_SHAPE.format(python=sys.executable))
+    shape.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+def make_scan(scan_dir, namecores, fit_dirs=('.',)):
+    (scan_dir / 'par').mkdir(parents=True)
+    (scan_dir / 'par' / 'fpar').write_text('')
+    (scan_dir / 'namecores.txt').write_text(''.join(f'{n} 0 0\n' for n in namecores))
+    for fit_dir in fit_dirs:
+        for sub in ('modfiles', 'obsfiles', 'logfiles'):
+            (scan_dir / fit_dir / sub).mkdir(parents=True, exist_ok=True)
+
+#===Tests===
+
+def test_fit_command():
+    assert local.fit_command('fpar', 'a.mod', 'a.obs') == ['shape', 'fpar', 'a.mod', 'a.obs']
+    assert local.fit_command('fpar', 'a.mod', 'a.obs', ranks=4)[:4] == ['mpirun', '-n', '4', 'pshape']
+
+def test_run_local(tmp_path, fake_shape):
+    make_scan(tmp_path, ['fit01', 'bad02', 'fit03'])
+    failed = local.run_local(tmp_path, jobs=2)
+
+    assert failed == [(tmp_path.resolve(), 'bad02')]
+    for namecore in ('fit01', 'fit03'):
+        lines = (tmp_path / 'logfiles' / f'{namecore}.log').read_text().splitlines()
+        assert lines[0].split()[-2:] == ['1.50000', 'fpar']
+        #Finished fits are timed, for the cost model
+        assert log_file.read_runtime(tmp_path / 'logfiles' / f'{namecore}.log')[1] == 1
+    assert log_file.read_runtime(tmp_path / 'logfiles' / 'bad02.log') is None
+
+def test_run_local_subscans(tmp_path, fake_shape):
+    make_scan(tmp_path, ['fit01'], fit_dirs=['subscans/000', 'subscans/010'])
+    assert local.run_local(tmp_path, angle2s=['0', '10']) == []
+    assert (tmp_path / 'subscans' / '000' / 'logfiles' / 'fit01.log').exists()
+    assert (tmp_path / 'subscans' / '010' / 'logfiles' / 'fit01.log').exists()
+
+def test_run_local_resume_subscans(tmp_path, fake_shape):
+    '''Resuming only runs the subscans of a namecore that haven't finished'''
+    make_scan(tmp_path, ['fit01'], fit_dirs=['subscans/000', 'subscans/010'])
+    assert local.run_local(tmp_path, angle2s=['0', '10']) == []
+    done = tmp_path / 'subscans' / '000' / 'logfiles' / 'fit01.log'
+    before = done.read_text()
+    (tmp_path / 'subscans' / '010' / 'logfiles' / 'fit01.log').unlink()
+    done.write_text(before + '\n')
+
+    assert local.run_local(tmp_path, angle2s=['0', '10'], resume=True) == []
+    assert done.read_text() == before + '\n'
+    assert scan_io.fit_complete(tmp_path / 'subscans' / '010' / 'logfiles' / 'fit01.log')
+
+def test_missing_par(tmp_path):
+    (tmp_path / 'namecores.txt').write_text('fit01 0 0\n')
+    with pytest.raises(MissingFileError):
+        local.run_local(tmp_path)
+
+def test_run_grid_resume(tmp_path, fake_shape, monkeypatch):
+    '''Only fits without a chi-square run again, and their files are kept'''
+    shutil.copy(SAMPLES / 'mod' / 'sample_ellip.mod', tmp_path / 'mod.template')
+    shutil.copy(SAMPLES / 'obs' / 'sample.obs', tmp_path / 'obs.template')
+    (tmp_path / 'par').mkdir()
+    (tmp_path / 'par' / 'fpar').write_text('')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    argv = ['run_grid', '-ps', '0', '90', '45', '0', '360', '90', '--backend', 'local', '-j', '1']
+    monkeypatch.setattr(sys, 'argv', argv)
+    run_grid.run_grid_scan(run_grid.validate_args(run_grid.parse_args()))
+
+    logs = sorted((tmp_path / 'logfiles').iterdir())
+    #Cut off part way through, after SHAPE had printed a few iterations
+    logs[0].write_text(''.join(f'ALLDATA a b 100.0 c 90 e f g h {chi:.5f}\n' for chi in (3, 2.5, 2.2)))
+    logs[1].unlink()
+    (tmp_path / 'modfiles' / logs[2].with_suffix('.mod').name).write_text('kept')
+    monkeypatch.setattr(sys, 'argv', argv + ['--resume'])
+    run_grid.run_grid_scan(run_grid.validate_args(run_grid.parse_args()))
+
+    assert (tmp_path / scan_io.RESUME_FILE).read_text().split()[::3] == [logs[0].stem, logs[1].stem]
+    assert all(scan_io.fit_complete(log) for log in logs)
+    assert (tmp_path / 'modfiles' / logs[2].with_suffix('.mod').name).read_text() == 'kept'
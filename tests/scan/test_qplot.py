@@ -0,0 +1,25 @@
+#Last modified 19/10/2026
+#Tests for the interpolated grid of pyshape.scan.qplot
+
+import numpy as np
+
+from pyshape.scan import interp, qplot
+
+def test_layout_kept_as_fits_land(tmp_path):
+    '''Unfinished fits are masked rather than dropped, so the grid and weights don't change as they finish'''
+    p2, p1 = np.meshgrid(np.arange(0., 30, 10), np.arange(0., 40, 10))
+    p1, p2 = p1.ravel(), p2.ravel()
+    chi = 1 + (p1 - 15)**2 / 100 + p2**2 / 200
+    partial = chi.copy()
+    partial[[0, 5]] = np.nan
+
+    grids = []
+    for values in (partial, chi):
+        p1_q, p2_q, chi_q, res = qplot._prepare_quick_scan(p1, p2, values, polescan=False)
+        grids.append(qplot._q_interpolate_chi_grid(p1_q, p2_q, chi_q, res=res, cache_dir=tmp_path))
+    assert len(list((tmp_path / interp.CACHE_DIR).glob('*.npz'))) == 1
+    (p1_a, p2_a, chi_a), (p1_b, p2_b, chi_b) = grids
+    assert np.array_equal(p1_a, p1_b) and np.array_equal(p2_a, p2_b)
+    #Only targets on an unfinished fit have no value, and those away from them are unchanged
+    assert np.array_equal(np.argwhere(np.isnan(chi_a)), [[0, 0], [2, 4]])
+    assert np.allclose(chi_a[-1], chi_b[-1])
@@ -0,0 +1,84 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.run_adaptive, running fits with a stand-in shape on the local backend
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pyshape.errors import ShapeRunError
+from pyshape.scan import local, run_adaptive, sampling, scan_io
+
+SAMPLES = Path(__file__).parents[1]
+
+#Chi-square grows with distance from a pole at lat 30, lon 100
+FAKE_SHAPE = '''#!{python}
+import re, sys
+from math import radians, degrees, sin, cos, acos
+lat, lon = map(float, re.search(r'lat([+-]\\d+)lon(\\d+)', sys.argv[2]).groups())
+lat, lon, lat0, lon0 = map(radians, [lat, lon, 30, 100])
+d = degrees(acos(min(1, sin(lat)*sin(lat0) + cos(lat)*cos(lat0)*cos(lon - lon0))))
+print(f'ALLDATA a b 100.0 c 90 e f g h {{1 + d/100:.5f}}')
+'''
+
+#===Tests===
+
+def test_level_steps():
+    assert run_adaptive.level_steps(20, 5) == [20, 10, 5]
+    assert run_adaptive.level_steps(30, 5) == [30, 15, 6, 5]
+    assert run_adaptive.level_steps(30, 6, factor=3) == [30, 10, 6]
+    assert run_adaptive.level_steps(10, 10) == [10]
+
+def test_refine_points():
+    lat = np.array([0., 0., 0.])
+    lon = np.array([0., 20., 40.])
+    chi = np.array([1.0, 1.05, 2.0])
+    cand_lat = np.array([0., 0., 0., 0., 10.])
+    cand_lon = np.array([10., 20., 30., 50., 0.])
+    keep = run_adaptive.refine_points(lat, lon, chi, cand_lat, cand_lon, radius=20, threshold=10)
+    #Near the two good fits and not already fit. lon 50 is only near the bad fit
+    assert list(keep) == [True, False, True, False, True]
+
+@pytest.fixture
+def scan_dir(tmp_path, monkeypatch):
+    '''Templates for a coarse local polescan, with the fake shape on the PATH'''
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'shape').write_text(FAKE_SHAPE.format(python=sys.executable))
+    (bin_dir / 'shape').chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+    scan_dir = tmp_path / 'scan'
+    (scan_dir / 'par').mkdir(parents=True)
+    (scan_dir / 'par' / 'fpar').write_text('')
+    shutil.copy(SAMPLES / 'mod' / 'sample_ellip.mod', scan_dir / 'mod.template')
+    shutil.copy(SAMPLES / 'obs' / 'sample.obs', scan_dir / 'obs.template')
+    monkeypatch.chdir(scan_dir)
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    monkeypatch.setattr(sys, 'argv', ['run_adaptive', '-ps', '-90', '90', '30', '0', '360', '30',
+                                      '--target', '6', '--threshold', '3', '--backend', 'local', '-j', '2'])
+    return scan_dir
+
+def test_adaptive_scan(scan_dir):
+    args = run_adaptive.validate_args(run_adaptive.parse_args())
+    run_adaptive.run_adaptive_scan(args)
+
+    lam, bet, chi, polescan = scan_io.scan_results(scan_dir)
+    assert polescan
+
+    #Same best fit as the full scan at the finest step, with far fewer fits
+    angle1, angle0 = run_adaptive.polescan_points(args, 6)
+    full_lat, full_lon = 90 - angle1, (angle0 - 90) % 360
+    full_best = np.argmin(sampling.angular_distance(full_lat, full_lon, [30], [100])[:, 0])
+    assert (lam[np.argmin(chi)], bet[np.argmin(chi)]) == (full_lon[full_best], full_lat[full_best])
+    assert len(chi) < len(angle1) / 3
+    assert sorted(p.name for p in (scan_dir / 'levels').iterdir()) == ['00', '01', '02']
+
+def test_no_fits_finished(scan_dir, monkeypatch):
+    monkeypatch.setattr(local, 'run_local', lambda *args, **kwargs: None)
+    args = run_adaptive.validate_args(run_adaptive.parse_args())
+    with pytest.raises(ShapeRunError, match='No fits finished'):
+        run_adaptive.run_adaptive_scan(args)
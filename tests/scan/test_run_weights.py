@@ -0,0 +1,70 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.run_weights
+
+from pathlib import Path
+
+from pyshape.obs.obs_io import obsFile
+from pyshape.scan import scan_io
+from pyshape.scan.run_weights import setup_weight_scan, SHARED_MOD
+
+#===Sample files===
+
+TESTS = Path(__file__).parents[1]
+SAMPLE_OBS = TESTS / "obs" / "sample.obs"
+SAMPLE_MOD = TESTS / "mod" / "sample_ellip.mod"
+
+#===Helpers===
+
+def make_scan_dir(tmp_path):
+    for d in ['modfiles', 'obsfiles', 'logfiles']:
+        (tmp_path / d).mkdir(parents=True)
+    return tmp_path
+
+def read_namecores(scan_dir):
+    return [l.split() for l in (scan_dir / 'namecores.txt').read_text().splitlines()]
+
+#===Tests===
+
+def test_weight_grid(tmp_path):
+    scan_dir = make_scan_dir(tmp_path)
+    no_files = setup_weight_scan({'cw': [1.0, 2.0], 'lc': [10.0]}, SAMPLE_MOD, SAMPLE_OBS, scan_dir, jobs=2)
+    namecores = read_namecores(scan_dir)
+    assert no_files == len(namecores) == 2
+
+    for namecore, cw_weight, lc_weight in namecores:
+        datasets = obsFile.from_file(scan_dir / 'obsfiles' / f'{namecore}.obs').datasets
+        assert all(f.weight == float(cw_weight) for f in datasets[1].frames)
+        assert all(f.weight == float(lc_weight) for f in datasets[2].frames)
+        assert all(f.weight == 1.0 for f in datasets[0].frames)
+
+        mod = scan_dir / 'modfiles' / f'{namecore}.mod'
+        assert mod.resolve() == (scan_dir / 'modfiles' / SHARED_MOD).resolve()
+
+def test_identical_files_linked(tmp_path):
+    scan_dir = make_scan_dir(tmp_path)
+    #Lightcurve only obs file, so changing dd weights gives identical files
+    text = SAMPLE_OBS.read_text()
+    header, lc_set = text[:text.index('{SET 0}')], text[text.index('{SET 2}'):]
+    lc_only = tmp_path / 'lc_only.obs'
+    lc_only.write_text(header.replace('3 {number of sets}', '1 {number of sets}') + lc_set.replace('SET 2', 'SET 0'))
+
+    setup_weight_scan({'dd': [1.0, 2.0]}, SAMPLE_MOD, lc_only, scan_dir, jobs=1)
+    obs_files = [scan_dir / 'obsfiles' / f'{n[0]}.obs' for n in read_namecores(scan_dir)]
+    assert obs_files[0].stat().st_ino == obs_files[1].stat().st_ino
+
+def test_scan_results_weight_types(tmp_path):
+    '''One set type gives p2 = 0, and three are read by their first two weights'''
+    scan_dir = make_scan_dir(tmp_path / 'one')
+    setup_weight_scan({'cw': [1.0, 2.0]}, SAMPLE_MOD, SAMPLE_OBS, scan_dir, jobs=1)
+    for i, (namecore, _) in enumerate(read_namecores(scan_dir)):
+        (scan_dir / 'logfiles' / f'{namecore}.log').write_text(f'ALLDATA a b 100.0 c 90 e f g h {i + 1:.5f}\n')
+    p1, p2, chi, polescan = scan_io.scan_results(scan_dir)
+    assert p1.tolist() == [1.0, 2.0] and p2.tolist() == [0, 0] and chi.tolist() == [1, 2]
+    assert not polescan
+
+    scan_dir = make_scan_dir(tmp_path / 'three')
+    setup_weight_scan({'cw': [1.0], 'dd': [2.0], 'lc': [3.0]}, SAMPLE_MOD, SAMPLE_OBS, scan_dir, jobs=1)
+    namecore = read_namecores(scan_dir)[0][0]
+    (scan_dir / 'logfiles' / f'{namecore}.log').write_text('ALLDATA a b 100.0 c 90 e f g h 1.50000\n')
+    p1, p2, chi, _ = scan_io.scan_results(scan_dir)
+    assert (p1.tolist(), p2.tolist(), chi.tolist()) == ([1.0], [2.0], [1.5])
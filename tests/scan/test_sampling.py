@@ -0,0 +1,35 @@
+#Last modified 19/10/2026
+#Tests for pole sampling in pyshape.scan.sampling and run_grid
+
+import numpy as np
+import pytest
+
+from pyshape.scan import sampling
+from pyshape.scan.run_grid import polescan_namecore
+
+#===Tests===
+
+@pytest.mark.parametrize('nside', [1, 2, 3, 8])
+def test_healpix_centres_match_healpy(nside):
+    hp = pytest.importorskip('healpy')
+    lat, lon = sampling.healpix_centres(nside)
+    theta, phi = hp.pix2ang(nside, np.arange(hp.nside2npix(nside)))
+    assert np.allclose(lat, 90 - np.rad2deg(theta))
+    assert np.allclose(lon, np.rad2deg(phi))
+
+@pytest.mark.parametrize('method', ['healpix', 'fibonacci'])
+def test_point_density(method):
+    '''About one pole per resolution^2 square degrees, with none repeated'''
+    angle1, angle0 = sampling.pole_directions(method, -90, 90, 0, 360, 10)
+    assert 0.9 < len(angle1) * 10**2 / sampling.SPHERE_AREA < 1.1
+    assert len(set(zip(angle1, angle0))) == len(angle1)
+
+def test_ranges():
+    angle1, angle0 = sampling.pole_directions('fibonacci', 0, 90, 0, 180, 5)
+    bet, lam = 90 - angle1, (angle0 - 90) % 360
+    assert bet.min() >= 0 and lam.max() <= 180
+
+def test_namecores():
+    assert polescan_namecore(-10, 350) == ('lat-10lon350', '+350 -10')
+    assert polescan_namecore(66.44, 45) == ('lat+66.4lon045.0', '45.0 +66.4')
+    assert polescan_namecore(-5.0, 22.5) == ('lat-05.0lon022.5', '22.5 -5.0')
@@ -0,0 +1,80 @@
+#Last modified 19/10/2026
+#Tests for reading scan results in pyshape.scan.scan_io
+
+import numpy as np
+import pytest
+
+from pyshape import log_file
+from pyshape.errors import AbortError, InputError
+from pyshape.scan import scan_io
+
+#===Helpers===
+
+def alldata(chi):
+    return f'ALLDATA a b 100.0 c 90 e f g h {chi:.5f}\n'
+
+def write_scan(scan_dir, chis):
+    '''Scan with a finished log for each {namecore: chi}. Missing chis are fits that haven't run'''
+    (scan_dir / 'logfiles').mkdir(parents=True)
+    with open(scan_dir / 'namecores.txt', 'w') as f:
+        for i, (namecore, chi) in enumerate(chis.items()):
+            f.write(f'{namecore} {i*10:+03d} {i*5:03d}\n')
+            if chi is not None:
+                (scan_dir / 'logfiles' / f'{namecore}.log').write_text(alldata(chi) + log_file.runtime_line(60, 8))
+
+#===Tests===
+
+def test_subscan_results(tmp_path):
+    write_scan(tmp_path / 'subscans' / '010', {'lat+00lon000': 2.0, 'lat+00lon010': 1.5})
+    write_scan(tmp_path / 'subscans' / '005', {'lat+00lon000': 1.2, 'lat+00lon010': None})
+    write_scan(tmp_path / 'subscans' / '015', {'lat+00lon000': None})
+    (tmp_path / 'subscans' / 'notes').mkdir()
+
+    assert [a2 for a2, _ in scan_io.subscan_dirs(tmp_path)] == [5, 10, 15]
+
+    #Subscan 15 has no results yet
+    results = scan_io.subscan_results(tmp_path)
+    assert [r[0] for r in results] == [5, 10]
+    assert all(r[4] for r in results)
+
+    angle2, best_p1, best_p2, best_chi = scan_io.best_fits(results)
+    assert np.array_equal(angle2, [5, 10])
+    assert np.array_equal(best_p1, [0, 10])
+    assert np.array_equal(best_chi, [1.2, 1.5])
+
+def test_incomplete_namecores(tmp_path):
+    write_scan(tmp_path, {'lat+00lon000': 2.0, 'lat+00lon010': None, 'lat+00lon020': 1.0})
+    #Cut off part way: SHAPE has printed chi-squares, but the fit never finished
+    (tmp_path / 'logfiles' / 'lat+00lon020.log').write_text(alldata(3.0) + alldata(2.5))
+    assert [line.split()[0] for line in scan_io.incomplete_namecores(tmp_path)] == ['lat+00lon010', 'lat+00lon020']
+    #Still running (or killed with it) under launch_fitting.sbatch
+    (tmp_path / 'logfiles' / 'lat+00lon000.log.running').write_text('')
+    assert len(scan_io.incomplete_namecores(tmp_path)) == 3
+    (tmp_path / 'logfiles' / 'lat+00lon000.log.running').unlink()
+
+    #With subscans, a namecore is only done once every angle2 is
+    scan_dir = tmp_path / 'a2scan'
+    write_scan(scan_dir / 'subscans' / '000', {'lat+00lon000': 2.0, 'lat+00lon010': 1.0})
+    write_scan(scan_dir / 'subscans' / '010', {'lat+00lon000': 2.0, 'lat+00lon010': None})
+    (scan_dir / 'namecores.txt').write_text('lat+00lon000 +00 000\nlat+00lon010 +10 005\n')
+    assert scan_io.incomplete_namecores(scan_dir, ['0']) == []
+    assert scan_io.incomplete_namecores(scan_dir, ['0', '10']) == ['lat+00lon010 +10 005\n']
+
+def test_unfinished_results(tmp_path):
+    write_scan(tmp_path, {'lat+00lon000': 2.0, 'lat+00lon010': None, 'lat+00lon020': 1.0})
+    p1, p2, chi, _ = scan_io.scan_results(tmp_path)
+    assert np.array_equal(p1, [0, 20])
+
+    #The full layout, with unfinished fits as NaN
+    p1, p2, chi, _ = scan_io.scan_results(tmp_path, unfinished=True)
+    assert np.array_equal(p1, [0, 10, 20]) and np.array_equal(p2, [0, 5, 10])
+    assert np.array_equal(chi, [2.0, np.nan, 1.0], equal_nan=True)
+
+def test_check_no_files(monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    scan_io.check_no_files(3)
+    with pytest.raises(InputError):
+        scan_io.check_no_files(0)
+    monkeypatch.setattr('builtins.input', lambda _: 'n')
+    with pytest.raises(AbortError):
+        scan_io.check_no_files(3, 'local')
@@ -0,0 +1,244 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.slurm, using the stand-ins in fake_slurm
+
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import time
+
+from pyshape import log_file
+from pyshape.scan import slurm
+from tests.scan import fake_slurm
+
+#===Helpers===
+
+def write_namecores(scan_dir, n):
+    scan_dir.mkdir(parents=True, exist_ok=True)
+    (scan_dir / 'namecores.txt').write_text(''.join(f'fit{i:02d} {i} 0\n' for i in range(n)))
+
+def manage(*scans, **kwargs):
+    manager = slurm.SlurmManager(scans, poll=0.01, max_poll=0.05, **kwargs)
+    asyncio.run(manager.run())
+
+#===Tests===
+
+def test_array_spec():
+    assert slurm.array_spec([8, 1, 2, 3, 5, 7]) == '1-3,5,7-8'
+    assert slurm.array_spec([4]) == '4'
+
+def test_parse_states():
+    states = slurm.parse_states('12_3|RUNNING\n12_[4-5,9%2]|PENDING\n12_3.batch|COMPLETED\n13_1|CANCELLED by 5\n')
+    assert states == {('12', 3): 'RUNNING', ('12', 4): 'PENDING', ('12', 5): 'PENDING',
+                      ('12', 9): 'PENDING', ('13', 1): 'CANCELLED'}
+
+def test_manage_until_done(tmp_path, monkeypatch):
+    fake = fake_slurm.install(tmp_path, monkeypatch)
+    write_namecores(tmp_path / 'scan', 3)
+    manage(slurm.ScanJobs.create(tmp_path / 'scan', args=['0', '5']))
+
+    scan = slurm.ScanJobs.load(tmp_path / 'scan')
+    assert scan.counts() == {'COMPLETED': 3}
+    job = json.loads((fake / '1000.json').read_text())
+    assert job['tasks'] == [1, 2, 3]
+    assert job['args'] == ['0', '5']
+
+def test_failed_tasks_resubmitted(tmp_path, monkeypatch):
+    fake = fake_slurm.install(tmp_path, monkeypatch, fail=[4, 5])
+    write_namecores(tmp_path / 'a', 3)
+    write_namecores(tmp_path / 'b', 5)
+    manage(slurm.ScanJobs.create(tmp_path / 'a'), slurm.ScanJobs.create(tmp_path / 'b'))
+
+    assert slurm.ScanJobs.load(tmp_path / 'a').counts() == {'COMPLETED': 3}
+    scan_b = slurm.ScanJobs.load(tmp_path / 'b')
+    assert scan_b.counts() == {'COMPLETED': 5}
+    assert [scan_b.tasks[i].attempts for i in range(1, 6)] == [1, 1, 1, 2, 2]
+    #Only the failed tasks were submitted again
+    assert json.loads((fake / '1002.json').read_text())['tasks'] == [4, 5]
+
+def test_retries_run_out(tmp_path, monkeypatch):
+    fake_slurm.install(tmp_path, monkeypatch, fail=[1])
+    write_namecores(tmp_path, 2)
+    manage(slurm.ScanJobs.create(tmp_path), max_retries=0)
+    assert slurm.ScanJobs.load(tmp_path).counts() == {'COMPLETED': 1, 'FAILED': 1}
+
+def test_packed_submission(tmp_path, monkeypatch):
+    fake = fake_slurm.install(tmp_path, monkeypatch)
+    write_namecores(tmp_path, 5)
+    slurm.submit_scan(tmp_path, pack=2, cores_per_fit=4)
+
+    job = json.loads((fake / '1000.json').read_text())
+    assert job['tasks'] == [1, 2, 3]
+    assert '--ntasks-per-node=8' in job['argv']
+    assert '--export=ALL,PACK_FILE=packs.txt,CORES_PER_FIT=4' in job['argv']
+    packs = (tmp_path / slurm.PACK_FILE).read_text().splitlines()
+    assert packs[1:] == ['1 fit00', '1 fit01', '2 fit02', '2 fit03', '3 fit04']
+    assert slurm.ScanJobs.load(tmp_path).tasks[2].namecore == 'fit02 fit03'
+
+def test_launch_script_runs_pack(tmp_path, monkeypatch):
+    '''launch_fitting.sbatch runs only its own task's fits from the manifest, in every angle2 subscan'''
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for name in ('module', 'srun', 'mpirun'):
+        (bin_dir / name).write_text(f'#!/bin/sh\necho {name} "$@"\n')
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+    (tmp_path / 'par').mkdir()
+    (tmp_path / 'par' / 'fpar').write_text('')
+    for a2 in ('000', '010'):
+        (tmp_path / 'subscans' / a2 / 'logfiles').mkdir(parents=True)
+    (tmp_path / 'packs.txt').write_text('#task namecore\n1 fit00\n1 fit01\n2 fit02\n2 fit03\n3 fit04\n')
+
+    env = {**os.environ, 'SLURM_ARRAY_TASK_ID': '2', 'PACK_FILE': 'packs.txt', 'CORES_PER_FIT': '4'}
+    subprocess.run(['bash', str(slurm.LAUNCH_SCRIPT), '0', '10'], cwd=tmp_path, env=env,
+                   check=True, capture_output=True)
+
+    logs = sorted(str(p.relative_to(tmp_path)) for p in tmp_path.glob('subscans/*/logfiles/*.log'))
+    assert logs == ['subscans/000/logfiles/fit02.log', 'subscans/000/logfiles/fit03.log',
+                    'subscans/010/logfiles/fit02.log', 'subscans/010/logfiles/fit03.log']
+    log = (tmp_path / 'subscans' / '010' / 'logfiles' / 'fit03.log').read_text().split()
+    assert log[:5] == ['srun', '--exact', '--ntasks=4', 'pshape', str(tmp_path / 'par' / 'fpar')]
+
+def test_resumed_submission(tmp_path, monkeypatch):
+    fake = fake_slurm.install(tmp_path, monkeypatch)
+    write_namecores(tmp_path, 5)
+    (tmp_path / 'resume.txt').write_text('fit01 1 0\nfit04 4 0\n')
+    slurm.submit_scan(tmp_path, namecore_file='resume.txt', continuation=True)
+
+    job = json.loads((fake / '1000.json').read_text())
+    assert job['tasks'] == [1, 2]
+    #As continuations, so finished fits are skipped and cut off ones carry on
+    assert '--export=ALL,NAMECORE_FILE=resume.txt,CONTINUATION=1' in job['argv']
+    assert [t.namecore for t in slurm.ScanJobs.load(tmp_path).tasks.values()] == ['fit01', 'fit04']
+
+def test_resumed_subscans(tmp_path, monkeypatch):
+    '''A resumed task (a continuation) only runs the subscans of its namecore that haven't finished'''
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for name in ('module', 'mpirun'):
+        (bin_dir / name).write_text(f'#!/bin/sh\necho {name} "$@"\n')
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    (tmp_path / 'par').mkdir()
+    (tmp_path / 'par' / 'fpar').write_text('')
+    for a2 in ('000', '010'):
+        (tmp_path / 'subscans' / a2 / 'logfiles').mkdir(parents=True)
+    finished = tmp_path / 'subscans' / '000' / 'logfiles' / 'fit01.log'
+    finished.write_text('ALLDATA a b 100.0 c 90 e f g h 1.50000\n' + log_file.runtime_line(60, 8))
+    (tmp_path / 'resume.txt').write_text('fit01 1 0\n')
+
+    env = {**os.environ, 'SLURM_ARRAY_TASK_ID': '1', 'NAMECORE_FILE': 'resume.txt', 'CONTINUATION': '1'}
+    subprocess.run(['bash', str(slurm.LAUNCH_SCRIPT), '0', '10'], cwd=tmp_path, env=env,
+                   check=True, capture_output=True)
+    assert finished.read_text().startswith('ALLDATA')
+    assert (tmp_path / 'subscans' / '010' / 'logfiles' / 'fit01.log').read_text().startswith('mpirun')
+
+def test_launch_script_reads_namecore_file(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for name in ('module', 'mpirun'):
+        (bin_dir / name).write_text(f'#!/bin/sh\necho {name} "$@"\n')
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    (tmp_path / 'logfiles').mkdir()
+    write_namecores(tmp_path, 5)
+    (tmp_path / 'resume.txt').write_text('fit01 1 0\nfit04 4 0\n')
+
+    env = {**os.environ, 'SLURM_ARRAY_TASK_ID': '2', 'NAMECORE_FILE': 'resume.txt'}
+    subprocess.run(['bash', str(slurm.LAUNCH_SCRIPT)], cwd=tmp_path, env=env, check=True, capture_output=True)
+    assert [p.name for p in (tmp_path / 'logfiles').iterdir()] == ['fit04.log']
+
+#Stands in for srun/mpirun running pshape. Writes a latest model, and the fit named in SLOW_FIT never finishes
+FAKE_MPI = '''#!/bin/sh
+for arg; do case $arg in *.mod) mod=$arg;; esac; done
+echo "fitted from $(cat $mod)" > $mod.fit
+echo "ALLDATA a b 100.0 c 90 e f g h 1.50000"
+case $mod in *"$SLOW_FIT"*) sleep 30;; esac
+'''
+
+def test_launch_script_continues_after_time_limit(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'module').write_text('#!/bin/sh\n')
+    (bin_dir / 'scontrol').write_text(f'#!/bin/sh\necho "$@" >> {tmp_path}/scontrol.txt\n')
+    (bin_dir / 'srun').write_text(FAKE_MPI)
+    for name in ('module', 'scontrol', 'srun'):
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+    (tmp_path / 'par').mkdir()
+    (tmp_path / 'par' / 'fpar').write_text('')
+    for sub in ('logfiles', 'modfiles'):
+        (tmp_path / sub).mkdir()
+    (tmp_path / 'modfiles' / 'fit00.mod').write_text('template')
+    #Linked to a model other fits share, as run_weights does
+    (tmp_path / 'modfiles' / 'shared.mod').write_text('template')
+    (tmp_path / 'modfiles' / 'fit01.mod').symlink_to('shared.mod')
+    (tmp_path / 'packs.txt').write_text('#task namecore\n1 fit00\n1 fit01\n')
+    logs = tmp_path / 'logfiles'
+
+    env = {**os.environ, 'SLURM_ARRAY_JOB_ID': '77', 'SLURM_ARRAY_TASK_ID': '1', 'PACK_FILE': 'packs.txt',
+           'SLOW_FIT': 'fit01'}
+    proc = subprocess.Popen(['bash', str(slurm.LAUNCH_SCRIPT)], cwd=tmp_path, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    #Signal once the first fit has finished and the slow one has started
+    slow_log = logs / 'fit01.log'
+    for _ in range(500):
+        if (logs / 'fit00.log').exists() and not (logs / 'fit00.log.running').exists() \
+           and slow_log.exists() and slow_log.stat().st_size:
+            break
+        time.sleep(0.01)
+    proc.send_signal(signal.SIGUSR1)
+    assert proc.wait(timeout=10) == 0
+
+    #The slow fit was stopped and the task requeued
+    assert (tmp_path / 'scontrol.txt').read_text().split() == ['requeue', '77_1']
+    assert (logs / 'fit01.log.running').exists()
+    finished_log = (logs / 'fit00.log').read_text()
+
+    #The requeued task skips the finished fit, and continues the other from its latest model
+    env = {**env, 'SLURM_RESTART_COUNT': '1', 'SLOW_FIT': 'none'}
+    subprocess.run(['bash', str(slurm.LAUNCH_SCRIPT)], cwd=tmp_path, env=env, check=True, capture_output=True)
+    assert (logs / 'fit00.log').read_text() == finished_log
+    assert not (logs / 'fit00.log.1').exists()
+    assert (logs / 'fit01.log.1').read_text().startswith('ALLDATA')
+    assert (logs / 'fit01.log').read_text().startswith('ALLDATA')
+    assert not (logs / 'fit01.log.running').exists()
+    #from a copy of the latest model, leaving the starting model (and what it links to) alone
+    assert (tmp_path / 'modfiles' / 'fit01.mod.fit').read_text() == 'fitted from fitted from template\n'
+    assert (tmp_path / 'modfiles' / 'shared.mod').read_text() == 'template'
+    assert (tmp_path / 'modfiles' / 'fit01.mod').is_symlink()
+
+def test_resubmitted_tasks_continue(tmp_path, monkeypatch):
+    fake = fake_slurm.install(tmp_path, monkeypatch, fail=[2])
+    write_namecores(tmp_path, 3)
+    manage(slurm.ScanJobs.create(tmp_path, sbatch_opts=slurm.sbatch_options(cores_per_fit=4)))
+
+    first, retry = (json.loads((fake / f'{job}.json').read_text())['argv'] for job in (1000, 1001))
+    assert '--export=ALL,CORES_PER_FIT=4' in first
+    assert '--export=ALL,CORES_PER_FIT=4,CONTINUATION=1' in retry
+    assert slurm.export_options([], 'CONTINUATION=1') == ['--export=ALL,CONTINUATION=1']
+
+def test_failed_fit_fails_task(tmp_path, monkeypatch):
+    '''A fit that fails makes its task FAILED, so the manager retries it, and the retry runs it again'''
+    fake_slurm.install(tmp_path, monkeypatch, run=True)
+    bin_dir = tmp_path / 'bin'
+    (bin_dir / 'module').write_text('#!/bin/sh\n')
+    #pshape fails the first time it runs fit01
+    (bin_dir / 'mpirun').write_text(f'#!/bin/sh\ncase "$*" in *fit01*) [ -e {tmp_path}/failed_once ] || '
+                                    f'{{ touch {tmp_path}/failed_once; exit 2; }};; esac\n'
+                                    'echo "ALLDATA a b 100.0 c 90 e f g h 1.50000"\n')
+    for name in ('module', 'mpirun'):
+        (bin_dir / name).chmod(0o755)
+    (tmp_path / 'par').mkdir()
+    (tmp_path / 'par' / 'fpar').write_text('')
+    (tmp_path / 'logfiles').mkdir()
+    write_namecores(tmp_path, 3)
+
+    scan = slurm.ScanJobs.create(tmp_path)
+    manage(scan)
+    assert scan.counts() == {'COMPLETED': 3}
+    assert [task.attempts for task in scan.tasks.values()] == [1, 2, 1]
+    assert log_file.read_runtime(tmp_path / 'logfiles' / 'fit01.log') is not None
@@ -0,0 +1,167 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.stage, with a temporary directory standing in for node-local storage
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from pyshape.errors import MissingFileError
+from pyshape.obs.obs_io import obsFile
+from pyshape.scan import local, slurm, stage
+
+SAMPLES = Path(__file__).parents[1]
+FRAMES = ['dd_frame_00.rdf', 'dd_frame_01.rdf', 'cw_frame_00.cw', 'cw_frame_01.cw', 'lc_00.dat']
+
+#Fails unless every input is in its (staged) working directory, then writes a log and a fitted model
+FAKE_SHAPE = '''#!{python}
+import os, sys
+from pathlib import Path
+par, mod, obs = sys.argv[-3:]
+frames = [l.split()[0] for l in open(obs) if l.split() and l.split()[0].endswith(('.rdf', '.cw', '.dat'))]
+missing = [f for f in [par, mod, obs, *frames] if not Path(f).exists()]
+if missing:
+    sys.exit(f'missing {{missing}}')
+Path(mod + '.fit').write_text(f'fitted in {{os.getcwd()}}')
+print('ALLDATA a b 100.0 c 90 e f g h 1.50000')
+'''
+
+@pytest.fixture
+def fit_dir(tmp_path):
+    '''A fit directory with the sample obs file and its frames, and one frame moved outside it'''
+    fit_dir = tmp_path / 'scan'
+    for sub in ('modfiles', 'obsfiles', 'logfiles', 'par'):
+        (fit_dir / sub).mkdir(parents=True)
+    (fit_dir / 'par' / 'fpar').write_text('')
+    shutil.copy(SAMPLES / 'mod' / 'sample_ellip.mod', fit_dir / 'modfiles' / 'fit01.mod')
+    for frame in FRAMES:
+        (fit_dir / frame).write_text(frame)
+
+    (tmp_path / 'shared').mkdir()
+    shutil.move(fit_dir / 'lc_00.dat', tmp_path / 'shared' / 'lc_00.dat')
+    obs = (SAMPLES / 'obs' / 'sample.obs').read_text()
+    obs = obs.replace('          lc_00.dat ', f' {tmp_path}/shared/lc_00.dat ')
+    (fit_dir / 'obsfiles' / 'fit01.obs').write_text(obs)
+    return fit_dir
+
+@pytest.fixture
+def fake_shape(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for name in ('shape', 'pshape'):
+        (bin_dir / name).write_text(FAKE_SHAPE.format(python=sys.executable))
+        (bin_dir / name).chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+#===Tests===
+
+def test_stage_in(fit_dir, tmp_path):
+    node = tmp_path / 'node'
+    staged = stage.stage_in(fit_dir, 'fit01', fit_dir / 'par' / 'fpar', node)
+
+    assert {p.relative_to(node).as_posix() for p in staged} == {
+        'fpar', 'modfiles/fit01.mod', 'obsfiles/fit01.obs', *FRAMES[:4], 'data/1_lc_00.dat'}
+    #Only the frame from outside the fit directory is renamed
+    frames = [f.fname for ds in obsFile.from_file(node / 'obsfiles' / 'fit01.obs').datasets for f in ds.frames]
+    assert frames == [*FRAMES[:4], 'data/1_lc_00.dat']
+    assert (node / 'data' / '1_lc_00.dat').read_text() == 'lc_00.dat'
+
+def test_stage_in_missing_frame(fit_dir, tmp_path):
+    (fit_dir / 'cw_frame_01.cw').unlink()
+    with pytest.raises(MissingFileError):
+        stage.stage_in(fit_dir, 'fit01', fit_dir / 'par' / 'fpar', tmp_path / 'node')
+
+def test_run_staged(fit_dir, tmp_path, fake_shape):
+    node = tmp_path / 'node'
+    node.mkdir()
+    template = (fit_dir / 'modfiles' / 'fit01.mod').read_text()
+    assert stage.run_staged(fit_dir, 'fit01', fit_dir / 'par' / 'fpar', ['shape'], scratch=node) == 0
+
+    #Outputs are copied back, inputs are left alone and the scratch directory is removed
+    assert (fit_dir / 'logfiles' / 'fit01.log').read_text().startswith('ALLDATA')
+    assert (fit_dir / 'modfiles' / 'fit01.mod.fit').read_text().startswith(f'fitted in {node}')
+    assert (fit_dir / 'modfiles' / 'fit01.mod').read_text() == template
+    assert not (fit_dir / 'data').exists()
+    assert list(node.iterdir()) == []
+    assert not list(fit_dir.rglob('*.tmp'))
+
+def test_scratch_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('NODE_SCRATCH', str(tmp_path))
+    assert stage.scratch_dir('$NODE_SCRATCH') == tmp_path
+    monkeypatch.delenv('NODE_SCRATCH')
+    assert stage.scratch_dir('$NODE_SCRATCH').is_dir()
+
+def test_run_local_staged(fit_dir, tmp_path, fake_shape):
+    node = tmp_path / 'node'
+    node.mkdir()
+    (fit_dir / 'namecores.txt').write_text('fit01 0 0\n')
+    assert local.run_local(fit_dir, jobs=1, stage=node) == []
+    assert (fit_dir / 'modfiles' / 'fit01.mod.fit').read_text().startswith(f'fitted in {node}')
+
+def test_launch_script_stages(fit_dir, tmp_path, fake_shape):
+    '''launch_fitting.sbatch runs the fit through pyshape.scan.stage when STAGE_DIR is set'''
+    (tmp_path / 'bin' / 'module').write_text('#!/bin/sh\n')
+    (tmp_path / 'bin' / 'mpirun').write_text('#!/bin/sh\nshift 2\nexec "$@"\n')
+    for name in ('module', 'mpirun'):
+        (tmp_path / 'bin' / name).chmod(0o755)
+    (fit_dir / 'namecores.txt').write_text('fit01 0 0\n')
+    node = tmp_path / 'node'
+    node.mkdir()
+
+    opts = slurm.sbatch_options(stage='$NODE_SCRATCH')
+    assert opts == [f'--export=ALL,STAGE_DIR=$NODE_SCRATCH,STAGE_PYTHON={sys.executable}']
+    env = {**os.environ, 'SLURM_ARRAY_TASK_ID': '1', 'STAGE_DIR': '$NODE_SCRATCH', 'NODE_SCRATCH': str(node),
+           'STAGE_PYTHON': sys.executable, 'PYTHONPATH': str(Path(__file__).parents[2])}
+    subprocess.run(['bash', str(slurm.LAUNCH_SCRIPT)], cwd=fit_dir, env=env, check=True, capture_output=True)
+
+    assert (fit_dir / 'logfiles' / 'fit01.log').read_text().startswith('ALLDATA')
+    assert (fit_dir / 'modfiles' / 'fit01.mod.fit').read_text().startswith(f'fitted in {node}')
+    assert not (fit_dir / 'logfiles' / 'fit01.log.running').exists()
+
+def test_launch_script_stages_at_time_limit(fit_dir, tmp_path, fake_shape):
+    '''A staged fit stopped near the time limit has its results so far copied back before the task is requeued'''
+    bin_dir = tmp_path / 'bin'
+    (bin_dir / 'module').write_text('#!/bin/sh\n')
+    (bin_dir / 'scontrol').write_text(f'#!/bin/sh\necho "$@" >> {tmp_path}/scontrol.txt\n')
+    #Runs the fit, then keeps going, and takes a while to stop
+    (bin_dir / 'mpirun').write_text('#!/bin/sh\nshift 2\ntrap "sleep 1; exit 143" TERM\n"$@"\nsleep 30 &\nwait\n')
+    for name in ('module', 'scontrol', 'mpirun'):
+        (bin_dir / name).chmod(0o755)
+    (fit_dir / 'namecores.txt').write_text('fit01 0 0\n')
+    node = tmp_path / 'node'
+    node.mkdir()
+
+    env = {**os.environ, 'SLURM_ARRAY_JOB_ID': '77', 'SLURM_ARRAY_TASK_ID': '1', 'STAGE_DIR': str(node),
+           'STAGE_PYTHON': sys.executable, 'PYTHONPATH': str(Path(__file__).parents[2])}
+    proc = subprocess.Popen(['bash', str(slurm.LAUNCH_SCRIPT)], cwd=fit_dir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(1000):
+        if list(node.glob('*/modfiles/fit01.mod.fit')):
+            break
+        time.sleep(0.01)
+    proc.send_signal(signal.SIGUSR1)
+    assert proc.wait(timeout=20) == 0
+
+    assert (tmp_path / 'scontrol.txt').read_text().split() == ['requeue', '77_1']
+    assert (fit_dir / 'logfiles' / 'fit01.log').read_text().startswith('ALLDATA')
+    assert (fit_dir / 'modfiles' / 'fit01.mod.fit').read_text().startswith(f'fitted in {node}')
+    assert (fit_dir / 'logfiles' / 'fit01.log.running').exists()
+    assert list(node.iterdir()) == []
+
+def test_run_fit_from_other_model(fit_dir, tmp_path, fake_shape):
+    '''A fit started from another model (e.g. a warm start) still leaves its fitted model at modfiles/NAMECORE.mod.fit'''
+    node = tmp_path / 'node'
+    node.mkdir()
+    template = (fit_dir / 'modfiles' / 'fit01.mod').read_text()
+    shutil.copy(fit_dir / 'modfiles' / 'fit01.mod', fit_dir / 'modfiles' / 'fit01.warm.mod')
+    for scratch in (None, node):
+        assert local.run_fit(fit_dir, 'fit01', fit_dir / 'par' / 'fpar', stage=scratch, mod='modfiles/fit01.warm.mod') == 0
+        assert (fit_dir / 'modfiles' / 'fit01.mod.fit').exists()
+        assert not (fit_dir / 'modfiles' / 'fit01.warm.mod.fit').exists()
+        (fit_dir / 'modfiles' / 'fit01.mod.fit').unlink()
+    assert (fit_dir / 'modfiles' / 'fit01.mod').read_text() == template
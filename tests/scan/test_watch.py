@@ -0,0 +1,105 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.watch, with stand-in shape and scancel executables
+
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from pyshape.scan import local, slurm, watch
+from tests.scan import fake_slurm
+from tests.scan.test_local import make_scan
+
+#===Helpers===
+
+def alldata(chi):
+    return f'ALLDATA a b 100.0 c 90 e f g h {chi:.5f}\n'
+
+def converging(start, floor, n, ratio=0.7):
+    '''Chi-squares of a fit whose improvements shrink by ratio every iteration'''
+    return list(floor + (start - floor) * ratio ** np.arange(n))
+
+#Prints a chi-square every iteration. "slow" fits converge towards 5 over many iterations, others to 1
+FAKE_SHAPE = '''#!{python}
+import sys, time
+from pathlib import Path
+slow = Path(sys.argv[2]).stem.startswith('slow')
+for k in range(400 if slow else 10):
+    chi = (5 if slow else 1) + 4 * 0.9**k
+    print(f'ALLDATA a b 100.0 c 90 e f g h {{chi:.5f}}', flush=True)
+    time.sleep(0.02 if slow else 0.01)
+'''
+
+#===Tests===
+
+def test_log_tail(tmp_path):
+    log = tmp_path / 'fit.log'
+    log.write_text('# header\n' + alldata(3) + 'delay a b c\n' + alldata(2)[:20])
+    tail = watch.LogTail(log)
+    assert tail.read() == [3]
+    #The partial line is finished by the next write
+    with open(log, 'a') as f:
+        f.write(alldata(2)[20:] + alldata(1.5))
+    assert tail.read() == [3, 2, 1.5]
+    #A new attempt rewrites the log
+    log.write_text(alldata(4))
+    assert tail.read() == [4]
+
+def test_projected_floor():
+    assert watch.projected_floor(converging(10, 3, 8)) == pytest.approx(3, rel=1e-3)
+    assert watch.projected_floor([5, 4, 4, 4]) == 4
+    assert watch.projected_floor([5, 4, 3, 2]) == -np.inf
+
+def test_fit_watcher(tmp_path):
+    logs = {name: tmp_path / f'{name}.log' for name in ('good', 'bad', 'short')}
+    logs['good'].write_text(''.join(map(alldata, converging(5, 1, 8))))
+    logs['bad'].write_text(''.join(map(alldata, converging(9, 2, 8))))
+    logs['short'].write_text(''.join(map(alldata, [9, 8])))
+    watcher = watch.FitWatcher(margin=50)
+    watcher.update(logs.values())
+    assert watcher.best() == pytest.approx(converging(5, 1, 8)[-1], abs=1e-5)
+    assert watcher.hopeless(logs.values()) == [logs['bad']]
+    assert watch.FitWatcher(margin=150).hopeless([]) == []
+
+def test_local_fits_stopped(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'shape').write_text(FAKE_SHAPE.format(python=sys.executable))
+    (bin_dir / 'shape').chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    monkeypatch.setattr(local, 'WATCH_INTERVAL', 0.05)
+
+    make_scan(tmp_path, ['fast', 'slow'])
+    failed = local.run_local(tmp_path, jobs=2, watcher=watch.FitWatcher(margin=20))
+
+    #Stopped fits aren't failures, and keep the log up to when they were stopped
+    assert failed == []
+    assert (tmp_path / 'logfiles' / 'fast.log').read_text().count('ALLDATA') == 10
+    assert len((tmp_path / 'logfiles' / 'slow.log').read_text().splitlines()) < 400
+
+def test_slurm_tasks_cancelled(tmp_path, monkeypatch):
+    fake = fake_slurm.install(tmp_path, monkeypatch)
+    (tmp_path / 'logfiles').mkdir()
+    (tmp_path / 'namecores.txt').write_text('good 0 0\nbad 0 0\nworse 0 0\nmixed 0 0\n')
+    scan = slurm.ScanJobs.create(tmp_path, pack=2)
+    for task in scan.tasks.values():
+        task.job, task.state = '1000', 'RUNNING'
+    scan.save()
+    for name, chis in [('good', converging(5, 1, 8)), ('bad', converging(9, 3, 8)),
+                       ('worse', converging(9, 4, 8)), ('mixed', converging(5, 1.1, 8))]:
+        (tmp_path / 'logfiles' / f'{name}.log').write_text(''.join(map(alldata, chis)))
+
+    checks = iter([False, True])
+    asyncio.run(watch.watch_slurm(tmp_path, watch.FitWatcher(margin=50), interval=0.01,
+                                  done=lambda: next(checks)))
+    #Task 1 (good, bad) still has a good fit running. Task 2 (worse, mixed) does too, until mixed is bad
+    assert not (fake / 'cancelled').exists()
+
+    (tmp_path / 'logfiles' / 'mixed.log').write_text(''.join(map(alldata, converging(9, 4, 8))))
+    checks = iter([False, True])
+    asyncio.run(watch.watch_slurm(tmp_path, watch.FitWatcher(margin=50), interval=0.01,
+                                  done=lambda: next(checks)))
+    assert json.loads((fake / 'cancelled').read_text()) == ['1000_2']
@@ -0,0 +1,89 @@
+#Last modified 19/10/2026
+#Tests for pyshape.scan.wavefront, running fits with a stand-in shape on the local backend
+
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pyshape.mod.mod_io import modFile
+from pyshape.scan import run_grid, wavefront
+from pyshape.scan.sampling import angular_distance
+
+SAMPLES = Path(__file__).parents[1]
+
+#Writes a fitted model with spin 1 one higher than it started, so warm-started fits
+#count how many fits they follow on from. Chi-square grows with distance from lat 30, lon 100
+FAKE_SHAPE = '''#!{python}
+import re, sys
+from math import radians, degrees, sin, cos, acos
+mod = open(sys.argv[2]).read()
+spin1 = float(re.search(r'(\\S+) {{spin 1', mod).group(1))
+open(sys.argv[2] + '.fit', 'w').write(mod.replace(f'{{spin1:.10f}} {{{{spin 1', f'{{spin1 + 1:.10f}} {{{{spin 1'))
+lat, lon = map(float, re.search(r'lat([+-]\\d+)lon(\\d+)', sys.argv[2]).groups())
+lat, lon, lat0, lon0 = map(radians, [lat, lon, 30, 100])
+d = degrees(acos(min(1, sin(lat)*sin(lat0) + cos(lat)*cos(lat0)*cos(lon - lon0))))
+print(f'ALLDATA a b 100.0 c 90 e f g h {{1 + d/100:.5f}}')
+'''
+
+#===Tests===
+
+def test_order_and_neighbours():
+    lat = np.zeros(6)
+    lon = np.arange(6) * 10.
+    distances = angular_distance(lat, lon, lat, lon)
+    seeds = wavefront.seed_indices(distances, 2)
+    assert seeds == [0, 5]
+    assert list(wavefront.wavefront_order(distances, seeds)) == [0, 5, 1, 4, 2, 3]
+    near = wavefront.neighbours(distances)
+    assert list(np.flatnonzero(near[2])) == [1, 3]
+
+def test_warm_started_polescan(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'shape').write_text(FAKE_SHAPE.format(python=sys.executable))
+    (bin_dir / 'shape').chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+    scan_dir = tmp_path / 'scan'
+    (scan_dir / 'par').mkdir(parents=True)
+    (scan_dir / 'par' / 'fpar').write_text('')
+    shutil.copy(SAMPLES / 'mod' / 'sample_ellip.mod', scan_dir / 'mod.template')
+    shutil.copy(SAMPLES / 'obs' / 'sample.obs', scan_dir / 'obs.template')
+    monkeypatch.chdir(scan_dir)
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    monkeypatch.setattr(sys, 'argv', ['run_grid', '-ps', '0', '90', '30', '0', '360', '30',
+                                      '--backend', 'local', '-j', '2', '--warm-start', '--seeds', '2'])
+    run_grid.run_grid_scan(run_grid.validate_args(run_grid.parse_args()))
+
+    namecores, lat, lon = wavefront.read_poles(scan_dir)
+    starts = {}
+    for namecore, bet, lam in zip(namecores, lat, lon):
+        #The template's model is left alone, and warm-started fits start from a copy
+        assert modFile.from_file(scan_dir / 'modfiles' / f'{namecore}.mod').spinstate.spin1 == 0
+        warm = scan_dir / 'modfiles' / f'{namecore}{wavefront.WARM_SUFFIX}'
+        spinstate = modFile.from_file(warm if warm.exists() else scan_dir / 'modfiles' / f'{namecore}.mod').spinstate
+        #Each fit keeps its own pole, frozen
+        assert (spinstate.lam, spinstate.bet) == pytest.approx((lam, bet))
+        assert spinstate.angle0_freeze == spinstate.angle1_freeze == 'c'
+        assert (scan_dir / 'logfiles' / f'{namecore}.log').exists()
+        assert (scan_dir / 'modfiles' / f'{namecore}.mod.fit').exists()
+        assert not (scan_dir / 'modfiles' / f'{namecore}{wavefront.WARM_SUFFIX}.fit').exists()
+        starts[namecore] = spinstate.spin1
+
+    #Only the seeds start from the template, the rest follow on from a neighbour
+    assert sum(spin1 == 0 for spin1 in starts.values()) == 2
+    assert max(starts.values()) > 1
+
+@pytest.mark.parametrize('argv', [['--warm-start'],
+                                  ['--backend', 'local', '--seeds', '3']])
+def test_warm_start_args(tmp_path, monkeypatch, argv):
+    (tmp_path / 'mod.template').write_text('')
+    (tmp_path / 'obs.template').write_text('')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['run_grid', '-ps', '-90', '90', '10', '0', '360', '10', *argv])
+    with pytest.raises(SystemExit):
+        run_grid.validate_args(run_grid.parse_args())
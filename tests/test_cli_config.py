@@ -0,0 +1,68 @@
+#Last modified 19/10/2026
+#Tests for library and command line modes of pyshape.cli_config
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from pyshape import cli_config
+
+ROOT = Path(__file__).parents[1]
+
+#===Helpers===
+
+def run_python(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                          capture_output=True, text=True)
+
+#===Tests===
+
+def test_library_import_is_quiet():
+    result = run_python("import logging, sys\n"
+                        "import pyshape.mod.mod_io, pyshape.obs.obs_io\n"
+                        "from pyshape.cli_config import logger\n"
+                        "logger.warning('not shown')\n"
+                        "print(len(logging.getLogger().handlers), 'rich' in sys.modules)")
+    assert result.stdout.split() == ['0', 'False']
+    assert result.stderr == ''
+
+def test_cli_main_sets_up_logging():
+    result = run_python("import logging, sys\n"
+                        "from pyshape.cli_config import cli_main, logger\n"
+                        "@cli_main\n"
+                        "def main():\n"
+                        "    logger.warning('shown')\n"
+                        "main(); main()\n"
+                        "print(len(logging.getLogger().handlers), 'rich' in sys.modules)")
+    assert 'shown' in result.stdout
+    assert result.stdout.split()[-2:] == ['1', 'True']
+
+def test_error_exit_in_library_mode():
+    if cli_config._cli_ready:
+        pytest.skip('Console logging already set up in this process')
+    with pytest.raises(SystemExit) as e:
+        cli_config.error_exit('bad file')
+    assert e.value.code == 'Error: bad file'
+
+def test_cli_main_exits_on_library_error():
+    result = run_python("from pyshape.cli_config import cli_main\n"
+                        "from pyshape.utils import check_file\n"
+                        "@cli_main\n"
+                        "def main():\n"
+                        "    check_file('no_such_file.mod')\n"
+                        "main()")
+    assert result.returncode == 1
+    assert 'File does not exist: no_such_file.mod' in result.stdout
+    assert 'Traceback' not in result.stdout + result.stderr
+
+def test_cli_main_exits_cleanly_on_abort():
+    result = run_python("from pyshape.cli_config import cli_main\n"
+                        "from pyshape.errors import AbortError\n"
+                        "@cli_main\n"
+                        "def main():\n"
+                        "    raise AbortError('Aborting.')\n"
+                        "main()")
+    assert result.returncode == 0
+    assert 'Aborting.' in result.stdout
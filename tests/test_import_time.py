@@ -0,0 +1,52 @@
+#Last modified 19/10/2026
+#Start-up cost of the command line tools. Heavy scientific imports should only happen when used
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parents[1]
+
+#Seconds for "python -m pyshape.scan.rank -h". Well above the expected ~0.1 s, so that only
+#a heavy import creeping back in fails it. Can be changed with PYSHAPE_IMPORT_BUDGET
+BUDGET = float(os.environ.get('PYSHAPE_IMPORT_BUDGET', 0.75))
+
+HEAVY = ['astropy', 'matplotlib', 'scipy', 'cartopy', 'healpy', 'cmasher', 'trimesh']
+
+#===Helpers===
+
+def run_help(module):
+    return subprocess.run([sys.executable, '-m', module, '-h'], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+
+def modules_after_help(module):
+    '''Heavy modules imported by running module with -h'''
+    code = (f"import runpy, sys\n"
+            f"sys.argv = ['{module}', '-h']\n"
+            f"try:\n    runpy.run_module('{module}', run_name='__main__')\n"
+            f"except SystemExit:\n    pass\n"
+            f"print(' '.join(m for m in {HEAVY!r} if m in sys.modules), file=sys.stderr)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return result.stderr.split()
+
+#===Tests===
+
+def test_rank_help_budget():
+    run_help('pyshape.scan.rank')  #Warm the bytecode cache
+    best = min(_timed(run_help, 'pyshape.scan.rank') for _ in range(3))
+    assert best < BUDGET, f'rank -h took {best:.2f} s (budget {BUDGET} s)'
+
+@pytest.mark.parametrize('module', ['pyshape.scan.rank', 'pyshape.scan.qplot', 'pyshape.scan.pplot',
+                                    'pyshape.scan.run_grid', 'pyshape.scan.run_weights'])
+def test_no_heavy_imports(module):
+    assert modules_after_help(module) == []
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
@@ -0,0 +1,72 @@
+#Last modified 19/10/2026
+#Tests for incremental builds in pyshape.jinja_env
+
+import os
+
+import pytest
+
+from pyshape.jinja_env import PdfBuild, render_and_compile_pdf, render_and_compile_pdfs
+
+#===Helpers===
+
+@pytest.fixture
+def fake_pdflatex(tmp_path, monkeypatch):
+    '''pdflatex that copies the tex to the pdf and counts its calls'''
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    calls = tmp_path / 'calls'
+    script = bin_dir / 'pdflatex'
+    script.write_text(f'#!/bin/sh\necho "$1" >> {calls}\ncp "$1" "${{1%.tex}}.pdf"\n')
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    calls.touch()
+    return calls
+
+def make_dirs(tmp_path):
+    work, dest = tmp_path / 'work', tmp_path / 'dest'
+    work.mkdir()
+    dest.mkdir()
+    return work, dest
+
+#===Tests===
+
+def test_skips_unchanged(tmp_path, fake_pdflatex):
+    work, dest = make_dirs(tmp_path)
+    fig = work / 'CW_fit_01_00.pdf'
+    fig.write_text('fit')
+    cw_list = [{'cw_pdf': fig, 'pos_pdf': fig}]
+
+    def build():
+        return render_and_compile_pdf('pub_cw_plots.tex.j2', {'cw_list': cw_list}, 'PubCW', work, dest)
+
+    assert build() == dest / 'PubCW.pdf'
+    build()
+    assert len(fake_pdflatex.read_text().splitlines()) == 1
+
+    #Figures found in the tex are part of the build
+    fig.write_text('new fit')
+    build()
+    assert len(fake_pdflatex.read_text().splitlines()) == 2
+
+    #As is the output
+    (dest / 'PubCW.pdf').unlink()
+    build()
+    assert len(fake_pdflatex.read_text().splitlines()) == 3
+
+def test_depends_and_concurrent(tmp_path, fake_pdflatex):
+    work, dest = make_dirs(tmp_path)
+    lc = work / 'ArtLC_01_fix.pdf'
+    lc.write_text('lc')
+    builds = [PdfBuild('concat_lc_plots.tex.j2', {'lightcurve_nos': [1]}, 'PubLC', work, dest, depends=[lc]),
+              PdfBuild('pub_cw_plots.tex.j2', {'cw_list': []}, 'PubCW', work, dest)]
+
+    assert render_and_compile_pdfs(builds, jobs=2) == [dest / 'PubLC.pdf', dest / 'PubCW.pdf']
+
+    #Figures named through a macro are only seen through depends
+    lc.write_text('new lc')
+    render_and_compile_pdfs(builds, jobs=2)
+    assert sorted(fake_pdflatex.read_text().splitlines()) == ['PubCW.tex', 'PubLC.tex', 'PubLC.tex']
+
+    #Without incremental builds everything is compiled
+    render_and_compile_pdfs(builds, incremental=False)
+    assert len(fake_pdflatex.read_text().splitlines()) == 5
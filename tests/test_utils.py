@@ -0,0 +1,81 @@
+#Last modified 19/10/2026
+#Tests for pyshape.utils
+
+import logging
+
+import pytest
+from astropy.time import Time, TimeDelta
+
+from pyshape.errors import InputError, MissingFileError
+from pyshape.utils import (time_shape2astropy, time_astropy2shape,
+                           times_shape2astropy, times_astropy2shape,
+                           check_file, check_type, for_each_file, plot_pool)
+
+#===Sample times===
+
+SHAPE_TIMES = [
+    '2019 12 20  4 10 22',
+    '2020  1  1  0  0  0',
+    '2019 12 20  4 10 22',  #Repeated epoch
+    '2024  2 29 23 59 59',
+]
+
+#===Tests===
+
+class TestTimeConversion:
+
+    def test_batch_matches_single(self):
+        times = times_shape2astropy(SHAPE_TIMES)
+        for t_str, t in zip(SHAPE_TIMES, times):
+            assert t == time_shape2astropy(t_str)
+
+    def test_batch_round_trip(self):
+        times = times_shape2astropy(SHAPE_TIMES)
+        assert times_astropy2shape(times) == SHAPE_TIMES
+
+    def test_batch_format_matches_single(self):
+        times = Time(['2019-12-20 04:10:22', '2001-03-04 05:06:07'], scale='utc')
+        assert times_astropy2shape(times) == [time_astropy2shape(t) for t in times]
+
+    def test_sub_second_rounding_matches_single(self):
+        '''Both round to the nearest second, carrying over minute and year boundaries'''
+        base = Time('2019-12-31 23:59:59', scale='utc')
+        times = base + TimeDelta([0, 0.2, 0.4999, 0.5001, 0.7, 0.9999997], format='sec')
+        assert times_astropy2shape(times) == [time_astropy2shape(t) for t in times]
+        assert times_astropy2shape(times)[::5] == ['2019 12 31 23 59 59', '2020  1  1  0  0  0']
+
+    def test_cached_times_are_independent(self):
+        t = time_shape2astropy(SHAPE_TIMES[0])
+        t.format = 'jd'
+        assert time_shape2astropy(SHAPE_TIMES[0]).format == 'iso'
+        assert time_shape2astropy(SHAPE_TIMES[0]) is not time_shape2astropy(SHAPE_TIMES[0])
+
+    def test_whitespace_is_normalised(self):
+        times = times_shape2astropy(['2019 12 20 4 10 22', '2019 12 20  4 10 22'])
+        assert times[0] == times[1]
+
+    def test_empty(self):
+        assert times_astropy2shape(times_shape2astropy([])) == []
+
+class TestErrors:
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(MissingFileError):
+            check_file(tmp_path / 'missing.mod')
+
+    def test_bad_type(self):
+        with pytest.raises(InputError):
+            check_type('ten', '--top', int)
+
+    def test_for_each_file_skips_failures(self, tmp_path):
+        good = tmp_path / 'good.mod'
+        good.write_text('')
+        files = [good, tmp_path / 'missing.mod', good]
+        assert for_each_file(check_file, files) == [files[1]]
+
+def test_plot_pool_logging(monkeypatch):
+    '''Spawned workers log at the level set in the parent (e.g. by -v)'''
+    logger = logging.getLogger('pyshape')
+    monkeypatch.setattr(logger, 'level', logging.DEBUG)
+    with plot_pool(1) as pool:
+        assert pool.submit(logger.getEffectiveLevel).result() == logging.DEBUG
@@ -0,0 +1,27 @@
+#Last modified 19/10/2026
+#Tests for rendering the CW frames of write_pub
+
+import numpy as np
+
+import write_pub
+
+def test_render_cw_frames_in_pool(tmp_path):
+    '''Frames rendered by plot_pool workers, as write_pub -cw -j does'''
+    dop_info = (64, 0.5, 32)
+    bins = np.arange(dop_info[0])
+    obs = np.exp(-((bins - 32) / 4)**2) * 10
+    tasks = []
+    for frameno in range(2):
+        fit = tmp_path / f'fit_01_{frameno:02d}.dat'
+        np.savetxt(fit, np.column_stack([bins, obs, obs * 0.9, obs * 0.1]))
+        ppm = tmp_path / f'sky_01_{frameno:02d}.ppm'
+        ppm.write_bytes(b'P6\n4 3\n255\n' + bytes(range(36)))
+        tasks.append((fit, ppm, dop_info, f'Frame {frameno}',
+                      tmp_path / f'CW_fit_01_{frameno:02d}.pdf', tmp_path / f'CW_pos_01_{frameno:02d}.pdf'))
+
+    outputs = write_pub.render_cw_frames(tasks, jobs=2)
+    #In the order given, whichever worker finished first
+    assert outputs == [task[4:] for task in tasks]
+    for fit_pdf, pos_pdf in outputs:
+        assert fit_pdf.read_bytes().startswith(b'%PDF')
+        assert pos_pdf.read_bytes().startswith(b'%PDF')
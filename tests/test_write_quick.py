@@ -0,0 +1,91 @@
+#Last modified 19/10/2026
+#Tests for write_quick, with a fake shape writing the images and fit files of the moments and write actions
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+import write_quick
+
+SAMPLES = Path(__file__).parent
+
+#Writes what the actions would for sample.obs (one frame of each set type), into the directory it is run in.
+#Fails for obsfiles named bad*
+FAKE_SHAPE = '''#!{python}
+import sys
+from pathlib import Path
+par, mod, obs = map(Path, sys.argv[1:4])
+if obs.name.startswith('bad'):
+    sys.exit('bad obsfile')
+def pnm(name, magic, channels):
+    Path(name).write_bytes(f'{{magic}}\\n4 3\\n255\\n'.encode() + bytes(range(12 * channels)))
+if par.name == 'mpar':
+    for i in range(3):
+        pnm(f'mom_{{i}}_pos.ppm', 'P6', 3)
+        pnm(f'mom_{{i}}_neg.ppm', 'P6', 3)
+else:
+    for kind in ('obs', 'fit', 'res'):
+        pnm(f'{{kind}}_00_00.pgm', 'P5', 1)
+    pnm('sky_00_00.ppm', 'P6', 3)
+    Path('fit_01_00.dat').write_text(''.join(f'{{b}} {{b % 5}} {{b % 4}} 0\\n' for b in range(20)))
+    Path('fit_02.dat').write_text(''.join(f'{{2458800 + t / 10}} {{t % 3}} {{t % 2}} 0 0\\n' for t in range(10)))
+print(f'{{par.name}} done')
+'''
+
+@pytest.fixture
+def fit_dir(tmp_path, monkeypatch):
+    '''Working directory with par files, two fits of the sample files and a fake shape on the PATH'''
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'shape').write_text(FAKE_SHAPE.format(python=sys.executable))
+    (bin_dir / 'shape').chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+    fit_dir = tmp_path / 'scan'
+    for sub in ('modfiles', 'obsfiles', 'par', 'out'):
+        (fit_dir / sub).mkdir(parents=True)
+    for par in ('mpar', 'wpar'):
+        (fit_dir / 'par' / par).write_text('')
+    for namecore in ('fit01', 'fit02', 'bad03'):
+        (fit_dir / 'modfiles' / f'{namecore}.mod').write_text((SAMPLES / 'mod' / 'sample_ellip.mod').read_text())
+        (fit_dir / 'obsfiles' / f'{namecore}.obs').write_text((SAMPLES / 'obs' / 'sample.obs').read_text())
+    monkeypatch.chdir(fit_dir)
+    return fit_dir
+
+def fit_files(namecore):
+    return Path('modfiles') / f'{namecore}.mod', Path('obsfiles') / f'{namecore}.obs'
+
+#===Tests===
+
+def test_run_fit_actions(fit_dir):
+    temp = fit_dir / 'waction' / 'temp' / 'fit01'
+    temp.mkdir(parents=True)
+    (temp / 'stale.ppm').write_text('')
+
+    assert write_quick.run_fit_actions(*fit_files('fit01')) == temp
+    #Each fit runs in its own emptied temp directory, with a log per action
+    assert not (temp / 'stale.ppm').exists()
+    assert len(list(temp.glob('mom_*.ppm'))) == 6 and (temp / 'fit_02.dat').exists()
+    assert (fit_dir / 'waction' / 'fit01.mpar.log').read_text() == 'mpar done\n'
+    assert (fit_dir / 'waction' / 'fit01.wpar.log').read_text() == 'wpar done\n'
+
+def test_collate_fit(fit_dir):
+    modfile, obsfile = fit_files('fit01')
+    temp = write_quick.run_fit_actions(modfile, obsfile)
+    pdf = write_quick.collate_fit(modfile, obsfile, fit_dir / 'out', no_cols=2, res=True, temp_path=temp)
+
+    assert pdf == fit_dir / 'out' / 'fit01.pdf'
+    assert pdf.read_bytes().startswith(b'%PDF')
+    #One jpg for each of mpar, delay-doppler, lightcurve and doppler
+    assert [f.name for f in sorted(temp.glob('*.jpg'))] == ['1_mpar.jpg', '2_dd_fits.jpg', '3_lc_fits.jpg', '4_cw_fits.jpg']
+
+def test_write_all(fit_dir):
+    fits = [fit_files(namecore) for namecore in ('fit01', 'bad03', 'fit02')]
+    failed = write_quick.write_all(fits, Path('par/mpar'), Path('par/wpar'), fit_dir / 'out', jobs=2)
+
+    assert failed == [fit_files('bad03')]
+    assert sorted(f.name for f in (fit_dir / 'out').glob('*.pdf')) == ['fit01.pdf', 'fit02.pdf']
+    #Temp directories of finished fits are removed
+    assert [d.name for d in (fit_dir / 'waction' / 'temp').iterdir()] == ['bad03']
@@ -1,30 +1,38 @@
 #Last modified by @recannon on 11/01/2026
 
 import argparse
+import functools
 import logging
+import os
 from pathlib import Path
-import subprocess
 from pyshape.obs.obs_io import obsFile
-from pyshape.cli_config import logger, error_exit
+from pyshape.cli_config import logger, error_exit, cli_main
 import pyshape.plotting.pub_routines as pp
-from pyshape.utils import check_file, check_dir, empty_dir, run_shape
-from pyshape.jinja_env import render_and_compile_pdf
+from pyshape.utils import check_type, check_file, check_dir, empty_dir, run_shape, plot_pool
+import pyshape.plotting.image_stack as ims
+from pyshape.jinja_env import render_and_compile_pdfs, PdfBuild
 from pyshape.mod.mod_io import modFile
-from pyshape.plotting import artificial_lightcurves
+from pyshape.plotting.figure_cache import FigureCache, figure_key, file_stamps, source_file
 from dataclasses import dataclass
 
 def write_pub(modfile,outdir,
-              model_args,cw_args,lc_args):
+              model_args,cw_args,lc_args,use_cache=True,clear_cache=False):
     
     #Setting up paths
     current_path = Path.cwd()
     waction_path = current_path / 'waction'
     temp_path    = waction_path / 'temp'
     pub_path     = waction_path / 'pub'
+    cache_path   = waction_path / 'cache'
     #Makes sure waction/temp and waction/pub exist (and by extension waction)
     temp_path.mkdir(parents=True, exist_ok=True)
     pub_path.mkdir(parents=True, exist_ok=True)
     modfile = Path(modfile).resolve()
+    #Previously rendered figures are reused when nothing they are drawn from has changed
+    if clear_cache:
+        FigureCache(cache_path).clear()
+    cache = FigureCache(cache_path) if use_cache else None
+    pdf_builds = []
 
     #Identifier for output pdfs
     if cw_args:
@@ -43,14 +51,14 @@ def write_pub(modfile,outdir,
         if not cw_sets: #If there aren't any
             logger.warning('Skipping CWs, none found in obsfile')
         else:
-            #Empty waction and pub folders (not recursively)
-            empty_dir(temp_path)
-            empty_dir(pub_path)
-            #Run write action for data files
-            run_shape([wparfile, modfile, obsfile],
-                    run_dir=temp_path, out_log=waction_path / f'{identifier}.wpar.log')
-            
+            #Everything the write action depends on, so the frames it produces share this key.
+            #Data frames are named in the obsfile (relative to where SHAPE runs), and only their size and mtime are hashed
+            frame_files = [temp_path / frame.fname for ds in obs_sets for frame in getattr(ds, 'frames', None) or []]
+            write_key = figure_key(modfile, obsfile, wparfile, file_stamps(frame_files))
+
             cw_list = []
+            frame_tasks = []
+            frame_keys = []
             for cw in cw_sets:
                 setno = cw.set_no
                 dop_info = cw.dop_info
@@ -59,18 +67,17 @@ def write_pub(modfile,outdir,
                     #Files (hopefully) created by write
                     fit = temp_path / f"fit_{setno:02d}_{frameno:02d}.dat"
                     ppm = temp_path / f"sky_{setno:02d}_{frameno:02d}.ppm"
-                    if not fit.exists():
-                        raise FileNotFoundError(f"Missing {fit}")
-                    if not ppm.exists():
-                        raise FileNotFoundError(f"Missing {ppm}")
 
                     fig_title = fr"{len(cw_list)+1:d} $\bullet$ {frame.date.isot.split('T')[0]} $\bullet$ {frame.date.jd:.3f}"
 
-                    logger.info(f"Plotting {fit.name}")
                     fit_pdf = pub_path / f"CW_fit_{setno:02d}_{frameno:02d}.pdf"
                     pos_pdf = pub_path / f"CW_pos_{setno:02d}_{frameno:02d}.pdf"
-                    pp.pub_doppler(fit, dop_info, fig_title, save=fit_pdf)
-                    subprocess.run(["convert", ppm, pos_pdf], check=True)
+                    fit_key = figure_key('cw_fit', source_file(pp.pub_doppler), write_key,
+                                         setno, frameno, dop_info, fig_title)
+                    pos_key = figure_key('cw_pos', source_file(ims.save_image), write_key, setno, frameno)
+                    if not (cache and cache.fetch(fit_key, fit_pdf) and cache.fetch(pos_key, pos_pdf)):
+                        frame_tasks.append((fit, ppm, dop_info, fig_title, fit_pdf, pos_pdf))
+                        frame_keys.append((fit_key, pos_key))
 
                     cw_list.append({
                         "setno": setno,
@@ -79,9 +86,31 @@ def write_pub(modfile,outdir,
                         "pos_pdf": pos_pdf,
                     })
 
+            if not frame_tasks:
+                logger.info('All CW frames cached, skipping write action')
+            else:
+                logger.info(f'Rendering {len(frame_tasks)} of {len(cw_list)} CW frames')
+                #Empty waction folder (not recursively)
+                empty_dir(temp_path)
+                #Run write action for data files
+                run_shape([wparfile, modfile, obsfile],
+                        run_dir=temp_path, out_log=waction_path / f'{identifier}.wpar.log')
+                for fit, ppm, *_ in frame_tasks:
+                    if not fit.exists():
+                        raise FileNotFoundError(f"Missing {fit}")
+                    if not ppm.exists():
+                        raise FileNotFoundError(f"Missing {ppm}")
+
+                render_cw_frames(frame_tasks, cw_args.jobs)
+
+                if cache:
+                    for (*_, fit_pdf, pos_pdf), (fit_key, pos_key) in zip(frame_tasks, frame_keys):
+                        cache.store(fit_key, fit_pdf)
+                        cache.store(pos_key, pos_pdf)
+
             out_stem = f'PubCW_{identifier}'
-            render_and_compile_pdf("pub_cw_plots.tex.j2", {"cw_list": cw_list},
-                                out_stem, pub_path, outdir)
+            pdf_builds.append(PdfBuild("pub_cw_plots.tex.j2", {"cw_list": cw_list},
+                                       out_stem, pub_path, outdir))
         
     #Both model and lc_toggle require reading of the modfile, do this together
     if lc_args or model_args:
@@ -91,6 +120,8 @@ def write_pub(modfile,outdir,
         V,F,FN,FNa = mod_vx.vertices, mod_vx.facets, mod_vx.FN, mod_vx.FNa
         
         if lc_args:
+            #Imports trimesh, so only when needed
+            from pyshape.plotting import artificial_lightcurves
             #Assume there is only one optical scattering law
             #Though test for if it exists (More likely to have 0 than 2+)
             try:
@@ -103,6 +134,10 @@ def write_pub(modfile,outdir,
             t0,P = mod_ss.t0.jd, mod_ss.P
             lam,bet,phi = mod_ss.lam, mod_ss.bet, mod_ss.phi+90
 
+            #Remove figures from earlier runs, which may have had more lightcurves
+            for old_pdf in pub_path.glob('ArtLC*.pdf'):
+                old_pdf.unlink()
+
             #Create plots and output results dictionary (not done)
             artificial_lightcurves.pub_lightcurve_generator(pub_path, lc_args.lc_file,
                                                             t0, lam, bet, phi, P,
@@ -110,11 +145,12 @@ def write_pub(modfile,outdir,
                                                             scattering_law=scattering_law,
                                                             scattering_params=scattering_params,
                                                             shadowing=True,
-                                                            plot=True, show_plot=False)
+                                                            plot=True, show_plot=False,
+                                                            cache=cache)
 
             #Combine the figures
             out_stem = f'PubLC_{identifier}'
-            artificial_lightcurves.concat_lc_plots(pub_path,outdir,out_stem)        
+            pdf_builds.append(artificial_lightcurves.lc_pdf_build(pub_path,outdir,out_stem))
     
         if model_args:
         
@@ -133,18 +169,52 @@ def write_pub(modfile,outdir,
             lims = model_args.lims
             
             out_stem = f'{outdir}/PubModel_{identifier}'
-            pp.pub_model(V,F,FN,
-                        red_list=red_facets,yellow_list=yellow_facets,
-                        lims=lims,ticks=ticks,out_stem=out_stem)
+            model_kwargs = dict(red_list=red_facets,yellow_list=yellow_facets,
+                                lims=lims,ticks=ticks,out_stem=out_stem)
+            if cache:
+                from pyshape.plotting.model.plot_model_projection import plot_model_projection
+                model_key = figure_key('model', source_file(pp.pub_model), source_file(plot_model_projection),
+                                       V, F, FN, red_facets, yellow_facets, lims, ticks)
+                if cache.render(model_key, Path(f'{out_stem}.pdf'), pp.pub_model, V, F, FN, **model_kwargs):
+                    logger.info(f'Reused cached model projection for {out_stem}.pdf')
+            else:
+                pp.pub_model(V,F,FN,**model_kwargs)
+
+    #The LaTeX pdfs are independent, so compile them together
+    #Unchanged pdfs are only rebuilt if the cache is disabled
+    render_and_compile_pdfs(pdf_builds, incremental=use_cache)
+    if cache:
+        cache.prune()
 
     return True
 
+#===CW frame rendering===
+def render_cw_frame(fit, ppm, dop_info, fig_title, fit_pdf, pos_pdf, show=True):
+    '''Plots one CW fit and converts its plane-of-sky ppm to pdf'''
+    logger.info(f"Plotting {fit.name}")
+    pp.pub_doppler(fit, dop_info, fig_title, show=show, save=fit_pdf)
+    ims.save_image(ims.read_pnm(ppm), pos_pdf)
+    return fit_pdf, pos_pdf
+
+def render_cw_frames(frame_tasks, jobs=1):
+    '''
+    Renders frames with jobs worker processes. Outputs are only used through the
+    names already in cw_list, so frame ordering for the template is unaffected.
+    Frames are only shown when rendered here, as workers have no display
+    '''
+    if jobs == 1 or len(frame_tasks) <= 1:
+        return [render_cw_frame(*task) for task in frame_tasks]
+    with plot_pool(min(jobs, len(frame_tasks))) as pool:
+        #map returns in submission order, and re-raises the first error from a worker
+        return list(pool.map(functools.partial(render_cw_frame, show=False), *zip(*frame_tasks)))
+
 #===Functions for parsing below this point===
 
 @dataclass
 class CWArgs:
     obsfile: Path
     wparfile: Path
+    jobs: int = 1
 @dataclass  
 class LCArgs:
     lc_file: Path
@@ -173,6 +243,14 @@ def parse_args():
     cw_group.add_argument("--obsfile", type=str, help="obsfile (compulsory)")
     cw_group.add_argument("--wparfile", type=Path, default='./par/wpar',
                           help="wpar file to use. Default cwd/par/wpar")
+    cw_group.add_argument("-j", "--jobs", default=None,
+                          help="Number of processes used to plot frames. Default: all cores")
+
+    cache_group = parser.add_argument_group('Figure cache')
+    cache_group.add_argument("--no-cache", action="store_true",
+                             help="Re-render every figure rather than reusing unchanged ones from waction/cache")
+    cache_group.add_argument("--clear-cache", action="store_true",
+                             help="Empty waction/cache before rendering. It is otherwise pruned to the most recently used figures")
 
     lc_group = parser.add_argument_group('Lightcurve plots (-lc)')
     lc_group.add_argument("-lc", action="store_true", help="Plot lightcurve data")
@@ -210,7 +288,10 @@ def validate_args(args):
             error_exit('Must provide obsfile when using -cw')
         args.obsfile = check_file(args.obsfile)
         args.wparfile = check_file(args.wparfile)
-        args.cw_args = CWArgs(obsfile=args.obsfile, wparfile=args.wparfile)
+        args.jobs = check_type(args.jobs, '--jobs', int) if args.jobs else os.cpu_count()
+        if args.jobs < 1:
+            error_exit('--jobs must be at least 1')
+        args.cw_args = CWArgs(obsfile=args.obsfile, wparfile=args.wparfile, jobs=args.jobs)
     else:
         args.cw_args = None
 
@@ -239,13 +320,15 @@ def validate_args(args):
     
     return args
 
+@cli_main
 def main():
     args = parse_args()
     args = validate_args(args)    
     
     logger.info(f"Processing: {args.modfile}")
     write_pub(args.modfile, args.outdir,
-              args.model_args,args.cw_args,args.lc_args)
+              args.model_args,args.cw_args,args.lc_args,
+              use_cache=not args.no_cache, clear_cache=args.clear_cache)
 
 if __name__ == "__main__":
     main()
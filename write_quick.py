@@ -1,19 +1,24 @@
 #Last modified by @recannon on 11/01/2026
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+import os
 from pathlib import Path
-import subprocess
+import shutil
+import threading
 from pyshape.obs.obs_io import obsFile
-from pyshape.cli_config import logger, error_exit
-from pyshape.utils import check_type, check_file, check_dir, empty_dir, run_shape
+from pyshape.cli_config import logger, error_exit, cli_main
+from pyshape.utils import check_type, check_file, check_dir, empty_dir, run_shape, plot_pool
 from pyshape.plotting import quick_routines as qp
+from pyshape.plotting import image_stack as ims
 
 #python /path/to/write_fit.py modfile obsfile
 #python /path/to/write_fit.py lat lon (if pole scan, give values as strings, e.g +40 060. Files expected in mod/obsfiles) 
 #python /path/to/write_fit.py --all (runs fit for all files in namecores, looking in modfiles/obsfiles) 
+#python /path/to/write_fit.py --all -j 8 (overlaps up to 8 fits at once)
 
-def write_fit(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',outdir='.',no_cols=3,res=False):
+def write_fit(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',outdir='.',no_cols=3,res=False,temp_path=None):
     """
     Run shape model fitting and post-processing.
 
@@ -27,26 +32,39 @@ def write_fit(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',outdir='.'
         wparfile (Path): Path to wpar parameter file
         no_cols  (int): Number of columns for delay-doppler stacking
         res (bool): Include residuals in output stacking
+        temp_path (Path): Directory SHAPE is run in. Default waction/temp/{identifier}
     """
-    
-    #Identifier to call pdf/log files
-    identifier = f'{modfile.stem}__{obsfile.stem}' if modfile.stem != obsfile.stem else modfile.stem
+    temp_path = run_fit_actions(modfile, obsfile, mparfile, wparfile, temp_path)
+    collate_fit(modfile, obsfile, outdir, no_cols, res, temp_path)
+    return True
+
+def fit_identifier(modfile,obsfile):
+    '''Identifier to call pdf/log files'''
+    modfile,obsfile = Path(modfile),Path(obsfile)
+    return f'{modfile.stem}__{obsfile.stem}' if modfile.stem != obsfile.stem else modfile.stem
+
+def run_fit_actions(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',temp_path=None):
+    '''Runs the shape moments and write actions in the fit's own temp directory, which is returned'''
+
+    identifier = fit_identifier(modfile,obsfile)
 
     #Paths
     current_path = Path.cwd()
     waction_path = current_path / 'waction'
-    temp_path    = current_path / 'waction/temp'
-    maction_log  = waction_path / f'{identifier}.wpar.log'
+    if temp_path is None:
+        temp_path = waction_path / 'temp' / identifier
+    temp_path    = Path(temp_path).resolve()
+    maction_log  = waction_path / f'{identifier}.mpar.log'
     waction_log  = waction_path / f'{identifier}.wpar.log'
     
-    #Changes filepaths to absolute paths. Needed as shape functions are run from ./waction, not ./
+    #Changes filepaths to absolute paths. Needed as shape functions are run from the temp directory, not ./
     modfile,obsfile = Path(modfile).resolve(),Path(obsfile).resolve()
     mparfile,wparfile = Path(mparfile).resolve(),Path(wparfile).resolve()
 
-    #Makes sure both waction and waction/temp exist. Creates if not
+    #Makes sure both waction and the temp directory exist. Creates if not
     temp_path.mkdir(parents=True, exist_ok=True)
 
-    #Empty waction folder without trying to remove directories
+    #Empty temp folder without trying to remove directories
     #Ignore errors as there should not be anything of importance in temp
     empty_dir(temp_path, remove_dirs=False, ignore_errors=True)
 
@@ -56,22 +74,22 @@ def write_fit(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',outdir='.'
     run_shape([wparfile, modfile, obsfile],
               run_dir=temp_path, out_log=waction_log)
 
+    return temp_path
+
+def collate_fit(modfile,obsfile,outdir,no_cols,res,temp_path):
+    '''Creates figures from the shape output in temp_path and collates them into a pdf'''
+
+    identifier = fit_identifier(modfile,obsfile)
+    temp_path  = Path(temp_path)
+
     logger.info('Creating jpgs')
 
     #Collage mpar figures
     pos_files = sorted((temp_path).glob('*pos.ppm'))
     neg_files = sorted((temp_path).glob('*neg.ppm'))    
-    mpar_ppm  = temp_path / 'mpar.ppm'
     mpar_jpg  = temp_path / '1_mpar.jpg'
-    
-    #ppmstack and ffmpeg to merge then convert ppm->jpg
-    ppmstack_cmd = ['ppmstack', '3', '1', '1'] + [str(f) for f in pos_files + neg_files] + [str(mpar_ppm)]
-    ffmpeg_cmd = ['ffmpeg','-loglevel', 'error', '-hide_banner', '-i', str(mpar_ppm), str(mpar_jpg)]
-    with open(waction_path / 'mpar_stack.log', 'w') as log:
-        logger.debug(f'Running: {" ".join(ppmstack_cmd)}')
-        subprocess.run(ppmstack_cmd, cwd=temp_path, stdout=log, stderr=subprocess.STDOUT, check=True)
-        logger.debug(f'Running: {" ".join(ffmpeg_cmd)}')
-        subprocess.run(ffmpeg_cmd, cwd=temp_path, stdout=log, stderr=subprocess.STDOUT, check=True)
+    mpar_img  = ims.grid([ims.read_pnm(f) for f in pos_files + neg_files], no_cols=3)
+    ims.save_image(mpar_img, mpar_jpg)
 
     #Read obsfile to check for which data types are present
     obs_sets  = obsFile.from_file(obsfile).datasets
@@ -83,31 +101,18 @@ def write_fit(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',outdir='.'
         obs_frames = sorted((temp_path).glob("obs_*.pgm"))
         fit_frames = sorted((temp_path).glob("fit_*.pgm"))
         res_frames = sorted((temp_path).glob("res_*.pgm"))
-        sky_frames = [str(name).replace('obs_', 'sky_').replace('.pgm', '.ppm') for name in obs_frames]        
-        temp_frames = [str(name).replace('sky_','temp_') for name in sky_frames]
-        no_frames  = len(temp_frames)
-        no_rows    = no_frames//no_cols + int(no_frames % no_cols != 0)
+        sky_frames = [name.with_name(name.name.replace('obs_', 'sky_')).with_suffix('.ppm') for name in obs_frames]
 
-        with open(temp_path / 'dd_stack.sh','w') as f:
-            
-            for i in range(len(temp_frames)):
-                parts = [obs_frames[i], fit_frames[i]]
-                if res:
-                    parts.append(res_frames[i])
-                parts.append(sky_frames[i])
-                parts.append(temp_frames[i])
-                f.write(f'ppmstack {len(parts)-1} 1 1 {" ".join(map(str, parts[:-1]))} {str(parts[-1])}\n')
-                
-            #Stack columns
-            column_files = [Path(temp_frames[0]).parent / f'temp_{i:02}.ppm' for i in range(no_cols)]            
-            for i in range(no_cols):
-                f.write(f'ppmstack 1 1 1 {" ".join(map(str, temp_frames[i*no_rows:(i+1)*no_rows]))} {column_files[i]}\n')
-
-            #Group columns together
-            f.write(f'ppmstack {no_cols} 1 1 {" ".join(map(str, column_files))} {current_path}/waction/temp/dd_fits.ppm\n')
-            f.write(f'ffmpeg -loglevel error -hide_banner -i {current_path}/waction/temp/dd_fits.ppm {current_path}/waction/temp/2_dd_fits.jpg\n')
-
-        subprocess.run(f'bash {current_path}/waction/temp/dd_stack.sh > dd_stack.log',shell=True,check=True,cwd='waction')
+        #Each frame is a row of obs/fit/(res)/sky, then frames fill columns top to bottom
+        frame_imgs = []
+        for i in range(len(obs_frames)):
+            parts = [obs_frames[i], fit_frames[i]]
+            if res:
+                parts.append(res_frames[i])
+            parts.append(sky_frames[i])
+            frame_imgs.append(ims.hstack([ims.read_pnm(f) for f in parts]))
+
+        ims.save_image(ims.column_grid(frame_imgs, no_cols), temp_path / '2_dd_fits.jpg')
 
     #lc and cw can be plotted with functions
     if 'lightcurve' in set_types:
@@ -122,11 +127,63 @@ def write_fit(modfile,obsfile,mparfile='par/mpar',wparfile='par/wpar',outdir='.'
 
     #Stack jpg files into a pdf
     jpg_files = sorted(temp_path.glob("*.jpg"))
-    output_name = outdir / f"{identifier}.pdf"
-    script_dir = Path(__file__).resolve().parent
-    subprocess.run(["bash", script_dir / "bash_scripts/create_pdf.sh", output_name, *map(str, jpg_files)], check=True)
+    output_name = Path(outdir) / f"{identifier}.pdf"
+    ims.images_to_pdf(jpg_files, output_name)
+    logger.info(f'Created single-page PDF: {output_name}')
     
-    return True
+    return output_name
+
+#===Pipelined --all mode===
+def write_all(fits,mparfile,wparfile,outdir,no_cols=3,res=False,jobs=1,keep_temp=False):
+    '''
+    Runs write_fit for a list of (modfile, obsfile) pairs, overlapping fits.
+    The shape actions run in a pool of threads (they are subprocesses), and as each fit
+    finishes it is handed to a pool of processes for stacking, plotting and pdf creation.
+    The two pools share jobs slots, so at most jobs shape runs and plots are busy at once.
+    Each fit has its own temp directory, removed after its pdf is made unless keep_temp.
+    Returns the list of fits that failed.
+    '''
+    failed = []
+    slots = threading.BoundedSemaphore(jobs)
+
+    def run_actions(modfile, obsfile):
+        with slots:
+            return run_fit_actions(modfile, obsfile, mparfile, wparfile)
+
+    with ThreadPoolExecutor(max_workers=jobs) as shape_pool, \
+         plot_pool(jobs) as fit_plot_pool:
+
+        shape_futures = {shape_pool.submit(run_actions, modfile, obsfile): (modfile, obsfile)
+                         for modfile, obsfile in fits}
+
+        plot_futures = {}
+        for future in as_completed(shape_futures):
+            modfile, obsfile = shape_futures[future]
+            try:
+                temp_path = future.result()
+            except Exception as e:
+                logger.warning(f'Shape actions failed for {fit_identifier(modfile, obsfile)}: {e}')
+                failed.append((modfile, obsfile))
+                continue
+            #Released when the plot finishes, whether or not it succeeds
+            slots.acquire()
+            plot_future = fit_plot_pool.submit(collate_fit, modfile, obsfile, outdir, no_cols, res, temp_path)
+            plot_future.add_done_callback(lambda _: slots.release())
+            plot_futures[plot_future] = (modfile, obsfile, temp_path)
+
+        for i, future in enumerate(as_completed(plot_futures), start=1):
+            modfile, obsfile, temp_path = plot_futures[future]
+            try:
+                output_name = future.result()
+                logger.info(f'[{i}/{len(plot_futures)}] Created {output_name}')
+            except Exception as e:
+                logger.warning(f'Post-processing failed for {fit_identifier(modfile, obsfile)}: {e}')
+                failed.append((modfile, obsfile))
+                continue
+            if not keep_temp:
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+    return failed
 
 def parse_args():
     """Parse command-line arguments."""
@@ -139,6 +196,10 @@ def parse_args():
     input_group.add_argument('obsfile', type=str, nargs='?', help='obsfile to write.')
     input_group.add_argument('--all', action='store_true',
                         help='Run write_fit for all files in namecores.txt')
+    input_group.add_argument('-j', '--jobs', default=None,
+                        help='Number of fits to process at once with --all. Default: all cores')
+    input_group.add_argument('--keep-temp', action='store_true',
+                        help='Keep each fit\'s waction/temp directory with --all')
     
     filedir_group = parser.add_argument_group('Specify default paths')
     filedir_group.add_argument('-m', '--mparfile', type=Path, default='./par/mpar',
@@ -165,6 +226,7 @@ def validate_args(args):
 
     #Check optional inputs
     args.no_cols = check_type(args.no_cols,'--no-cols',int)        
+    args.jobs = check_type(args.jobs,'--jobs',int) if args.jobs else os.cpu_count()
     args.mparfile = check_file(args.mparfile)
     args.wparfile = check_file(args.wparfile)
     args.outdir = check_dir(args.outdir, create=True)
@@ -197,6 +259,7 @@ def validate_args(args):
 
     return args
 
+@cli_main
 def main():
     args = parse_args()
     args = validate_args(args)    
@@ -204,8 +267,9 @@ def main():
     if args.all:
         logger.info("Running in --all mode. Processing all files from namecores.txt")
         with open('./namecores.txt') as f:
-            namecores = [line.strip() for line in f if line.strip()]
+            namecores = [line.split()[0] for line in f if line.strip()]
 
+        fits = []
         for namecore in namecores:
             modfile = Path("modfiles") / f"{namecore}.mod"
             obsfile = Path("obsfiles") / f"{namecore}.obs"
@@ -215,11 +279,14 @@ def main():
                 continue
             if not obsfile.is_file():
                 logger.warning(f'Cannot find {obsfile}. Skipping')
-            
-            logger.info(f"Processing: {modfile} and {obsfile}")
-            write_fit(modfile, obsfile,
-                      args.mparfile, args.wparfile, args.outdir,
-                      args.no_cols, args.residuals)
+                continue
+            fits.append((modfile, obsfile))
+
+        logger.info(f"Processing {len(fits)} fits with {args.jobs} workers")
+        failed = write_all(fits, args.mparfile, args.wparfile, args.outdir,
+                           args.no_cols, args.residuals, args.jobs, args.keep_temp)
+        if failed:
+            logger.warning(f'{len(failed)} fits failed: {" ".join(fit_identifier(*fit) for fit in failed)}')
 
     elif args.modfile and args.obsfile:
         